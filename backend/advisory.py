@@ -0,0 +1,215 @@
+"""
+修复公告索引
+功能：入库时按 (发行版, CVE, 包) 累积 Vuls 扫描结果中的修复版本（FixedIn），
+离线生成锁定版本的 apt/yum/dnf/zypper 修复命令，无法解析的 CVE 才交给 LLM
+"""
+
+import re
+import threading
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+from loguru import logger
+
+from models import Advisory
+from metrics import ADVISORY_LOOKUPS
+
+
+APT_FAMILIES = {"debian", "ubuntu", "raspbian"}
+RPM_FAMILIES = {"redhat", "centos", "rocky", "alma", "almalinux", "oracle", "amazon", "fedora"}
+ZYPPER_FAMILIES = {
+    "suse", "sles", "opensuse", "opensuse.leap", "opensuse.tumbleweed",
+    "suse.linux.enterprise.server", "suse.linux.enterprise.desktop"
+}
+
+# 只接受包管理器参数里合法的包名/版本字符，避免扫描结果中的内容被拼进 Shell 命令
+SAFE_TOKEN_RE = re.compile(r"^[A-Za-z0-9][A-Za-z0-9.+_:~-]*$")
+
+# 每次 IN 查询的 CVE 数（低于 SQLite 变量上限）
+QUERY_CHUNK = 500
+
+
+def split_os(os_info: Optional[str]) -> Tuple[str, str]:
+    """把 Host.os（如 "ubuntu 22.04"）拆成 (family, release)"""
+    parts = (os_info or "").strip().lower().split(None, 1)
+    if not parts or parts[0] == "unknown":
+        return "", ""
+    return parts[0], parts[1] if len(parts) > 1 else ""
+
+
+def release_stream(family: str, release: str) -> str:
+    """
+    修复版本通用的发行版流
+
+    RPM 系同一主版本共用一套更新（el8_6、el8_8 的修复包相同），按主版本归并；
+    Debian/Ubuntu/SUSE 各版本的修复版本号不同，保留完整版本号。
+    """
+    if family in RPM_FAMILIES and family != "fedora":
+        return release.split(".", 1)[0]
+    return release
+
+
+def package_manager(family: str, release: str) -> Optional[str]:
+    """发行版对应的包管理器，未知发行版返回 None"""
+    if family in APT_FAMILIES:
+        return "apt"
+    if family in ZYPPER_FAMILIES or family.startswith("suse"):
+        return "zypper"
+    if family in RPM_FAMILIES:
+        if family == "fedora":
+            return "dnf"
+        major = release.split(".", 1)[0]
+        if family == "amazon":
+            return "dnf" if major.isdigit() and int(major) >= 2022 else "yum"
+        return "dnf" if major.isdigit() and int(major) >= 8 else "yum"
+    return None
+
+
+def pinned_command(manager: str, packages: List[Tuple[str, str]]) -> str:
+    """
+    生成锁定版本的升级命令
+
+    Args:
+        manager: apt / yum / dnf / zypper
+        packages: [(包名, 修复版本)]
+    """
+    if manager == "apt":
+        args = " ".join(f"{name}={version}" for name, version in packages)
+        return f"apt-get update && apt-get install -y --only-upgrade {args}"
+    if manager in ("yum", "dnf"):
+        args = " ".join(f"{name}-{version}" for name, version in packages)
+        return f"{manager} upgrade -y {args}"
+    if manager == "zypper":
+        args = " ".join(f"{name}={version}" for name, version in packages)
+        return f"zypper --non-interactive refresh && zypper --non-interactive install {args}"
+    raise ValueError(f"Unknown package manager: {manager}")
+
+
+def advisory_rows(result: Dict[str, Any]) -> List[Dict[str, str]]:
+    """从一台主机的解析结果中提取修复版本记录"""
+    family = result.get("family") or ""
+    release = result.get("release") or ""
+    if not family:
+        family, release = split_os(result.get("os"))
+    if package_manager(family, release) is None:
+        return []
+
+    stream = release_stream(family, release)
+    return [
+        {
+            "family": family,
+            "release": stream,
+            "cve": issue["cve"],
+            "package": pkg["name"],
+            "fixed_version": pkg["fixed_in"]
+        }
+        for issue in result.get("issues", [])
+        for pkg in issue.get("packages", [])
+        if pkg.get("fixed_in")
+    ]
+
+
+def upsert_advisories(db: Session, rows: List[Dict[str, str]]) -> int:
+    """
+    写入修复版本记录（不提交事务），已有记录的版本变化时更新
+
+    Returns:
+        新增或更新的记录数
+    """
+    latest = {(row["family"], row["release"], row["cve"], row["package"]): row for row in rows}
+    if not latest:
+        return 0
+
+    cves = sorted({key[2] for key in latest})
+    changed = 0
+    now = datetime.utcnow()
+    for start in range(0, len(cves), QUERY_CHUNK):
+        for advisory in db.query(Advisory).filter(Advisory.cve.in_(cves[start:start + QUERY_CHUNK])):
+            key = (advisory.family, advisory.release, advisory.cve, advisory.package)
+            row = latest.pop(key, None)
+            if row is not None and row["fixed_version"] != advisory.fixed_version:
+                advisory.fixed_version = row["fixed_version"]
+                advisory.updated_at = now
+                changed += 1
+
+    if latest:
+        db.execute(insert(Advisory), [{**row, "updated_at": now} for row in latest.values()])
+    return changed + len(latest)
+
+
+class AdvisoryIndex:
+    """
+    修复版本的内存索引
+
+    启动时从 advisories 表加载，入库批次提交后增量合并；
+    resolve 只做字典查找，不访问数据库也不调用 LLM。
+    """
+
+    def __init__(self, session_factory: Callable[[], Session]):
+        self.session_factory = session_factory
+        # (family, release_stream, cve) -> {package: fixed_version}
+        self._entries: Dict[Tuple[str, str, str], Dict[str, str]] = {}
+        self._lock = threading.Lock()
+        self.logger = logger
+
+    def load(self) -> int:
+        """从数据库加载全部记录"""
+        entries: Dict[Tuple[str, str, str], Dict[str, str]] = {}
+        db = self.session_factory()
+        try:
+            query = db.query(
+                Advisory.family, Advisory.release, Advisory.cve, Advisory.package, Advisory.fixed_version
+            )
+            for family, release, cve, package, fixed_version in query.yield_per(5000):
+                entries.setdefault((family, release, cve), {})[package] = fixed_version
+        finally:
+            db.close()
+
+        with self._lock:
+            self._entries = entries
+        self.logger.info(f"Loaded advisory index: {len(entries)} (release, CVE) entries")
+        return len(entries)
+
+    def add(self, rows: Iterable[Dict[str, str]]):
+        """合并新入库的记录"""
+        with self._lock:
+            for row in rows:
+                key = (row["family"], row["release"], row["cve"])
+                self._entries.setdefault(key, {})[row["package"]] = row["fixed_version"]
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def fixed_version(self, family: str, release: str, cve: str, package: str) -> Optional[str]:
+        return self._entries.get((family, release_stream(family, release), cve), {}).get(package)
+
+    def resolve(self, os_info: Optional[str], cve: str, packages: List[Dict[str, Any]]) -> Optional[str]:
+        """
+        为一个漏洞生成锁定版本的修复命令
+
+        Args:
+            os_info: 主机操作系统（Host.os）
+            cve: CVE 编号
+            packages: 受影响包 [{"name", "fixed_in"}]；扫描结果缺少 FixedIn 时查索引
+
+        Returns:
+            修复命令；发行版未知、没有受影响包或任一包缺少修复版本时返回 None
+        """
+        family, release = split_os(os_info)
+        manager = package_manager(family, release)
+        if manager is None or not packages:
+            ADVISORY_LOOKUPS.labels("unresolved").inc()
+            return None
+
+        pinned = []
+        for pkg in packages:
+            name = pkg.get("name") or ""
+            version = pkg.get("fixed_in") or self.fixed_version(family, release, cve, name)
+            if not version or not SAFE_TOKEN_RE.match(name) or not SAFE_TOKEN_RE.match(version):
+                ADVISORY_LOOKUPS.labels("unresolved").inc()
+                return None
+            pinned.append((name, version))
+
+        ADVISORY_LOOKUPS.labels("resolved").inc()
+        return pinned_command(manager, pinned)
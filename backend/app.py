@@ -3,56 +3,68 @@ FixPilot Backend API
 主要功能：提供 REST API 接口，管理主机、漏洞和修复任务
 """
 
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
-from sqlalchemy import create_engine, Column, Integer, String, Float, DateTime, Text
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, Session
-from pydantic import BaseModel
-from typing import List, Optional
+from fastapi.responses import FileResponse, Response, StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from pydantic import BaseModel, ConfigDict
+from typing import Any, Callable, List, Optional, Dict
 from datetime import datetime
 import os
 import json
+import time
+import asyncio
 from loguru import logger
 
+from models import engine, SessionLocal, Host, Issue, IssuePackage, IssueStatusHistory, init_db
 from parser import VulsParser
-from llm_client import LLMClient
+from llm_client import LLMClient, is_failed_fix_command
 from playbook_gen import PlaybookGenerator
+from playbook_validator import PlaybookValidator
+from ingest import IngestPipeline
+from watcher import ResultsWatcher
+from search import IssueSearchIndex
+from advisory import AdvisoryIndex
+from export import EXPORT_FORMATS, PYARROW_AVAILABLE, export_issues
+from cache import ResponseCache
+from transitions import TransitionError, transition_issues
+from host_stats import COUNT_FIELDS, ensure_indexes, fleet_summary, hosts_with_counts_statement
+from responses import FastJSONResponse, CompressionMiddleware, rows_json, dumps
+from events import EventBroker, severity_of
+from metrics import (
+    REGISTRY, CONTENT_TYPE, MetricsMiddleware, instrument_engine,
+    FIX_CACHE_HIT, FIX_CACHE_MISS, RESPONSE_CACHE_LOOKUPS, RESPONSE_CACHE_ENTRIES,
+    PLAYBOOK_STREAM_FIRST_RESULT_SECONDS
+)
+from profiling import RequestProfiler, ProfilingMiddleware, track_statements
 
-# 数据库配置
-DATABASE_URL = "sqlite:///./fixpilot.db"
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-Base = declarative_base()
-
-# 数据模型
-class Host(Base):
-    __tablename__ = "hosts"
-    
-    id = Column(Integer, primary_key=True, index=True)
-    ip = Column(String, unique=True, index=True)
-    hostname = Column(String)
-    os = Column(String)
-    last_scan = Column(DateTime)
-    risk_score = Column(Float, default=0.0)
-
-class Issue(Base):
-    __tablename__ = "issues"
-    
-    id = Column(Integer, primary_key=True, index=True)
-    host_id = Column(Integer)
-    cve = Column(String, index=True)
-    summary = Column(Text)
-    cvss = Column(Float)
-    package = Column(String)
-    patchable = Column(String)
-    status = Column(String, default="open")  # open, fixing, fixed, failed
-    fix_command = Column(Text)
-    created_at = Column(DateTime, default=datetime.utcnow)
+# 扫描结果目录
+RESULTS_DIR = os.getenv("SCAN_RESULTS_DIR", "./results")
+RESULTS_WATCH_ENABLED = os.getenv("RESULTS_WATCH_ENABLED", "true").lower() == "true"
+# 多 worker 部署时只有拿到该文件锁的进程监听结果目录
+RESULTS_WATCH_LOCK = os.getenv("RESULTS_WATCH_LOCK", os.path.join(RESULTS_DIR, ".watcher.lock"))
+# /hosts?ids= 单次最多查询的主机数
+HOSTS_IDS_LIMIT = 500
+# /playbook/stream 同时进行的修复命令生成数
+PLAYBOOK_STREAM_CONCURRENCY = max(1, int(os.getenv("PLAYBOOK_STREAM_CONCURRENCY", "8")))
 
 # Pydantic 模型
-class HostResponse(BaseModel):
+class IssueCounts(BaseModel):
+    # 按状态的漏洞数
+    open_count: int = 0
+    fixing_count: int = 0
+    fixed_count: int = 0
+    failed_count: int = 0
+    # 未修复漏洞按严重程度的数量
+    critical_count: int = 0
+    high_count: int = 0
+    medium_count: int = 0
+    low_count: int = 0
+
+class HostResponse(IssueCounts):
+    model_config = ConfigDict(from_attributes=True)
+
     id: int
     ip: str
     hostname: Optional[str]
@@ -60,7 +72,16 @@ class HostResponse(BaseModel):
     last_scan: Optional[datetime]
     risk_score: float
 
+class HostCounts(IssueCounts):
+    host_id: int
+
+class HostSummaryResponse(BaseModel):
+    hosts: List[HostCounts]
+    totals: IssueCounts
+
 class IssueResponse(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
     id: int
     host_id: int
     cve: str
@@ -72,12 +93,84 @@ class IssueResponse(BaseModel):
     fix_command: Optional[str]
     created_at: datetime
 
+class IssueSearchResponse(BaseModel):
+    total: int
+    items: List[IssueResponse]
+    facets: Dict[str, Dict[str, int]]
+
+class AffectedCVE(BaseModel):
+    issue_id: int
+    cve: str
+    cvss: Optional[float]
+    status: Optional[str]
+    version: Optional[str]
+    new_version: Optional[str]
+    fixed_in: Optional[str]
+
+class PackageHostResponse(BaseModel):
+    host_id: int
+    ip: str
+    hostname: Optional[str]
+    os: Optional[str]
+    cves: List[AffectedCVE]
+
 class PlaybookRequest(BaseModel):
     host_id: int
     cvss_threshold: float = 7.0
+    # 生成后执行 ansible-playbook --syntax-check，结果放在 validation 字段
+    syntax_check: bool = False
+
+class PlaybookValidateRequest(BaseModel):
+    # 不指定时校验 playbooks 目录下的所有文件
+    filenames: Optional[List[str]] = None
+
+class IssueTransitionRequest(BaseModel):
+    to_status: str
+    # 只变更处于这些状态的漏洞（乐观检查），默认所有允许流转到 to_status 的状态
+    from_status: Optional[List[str]] = None
+    # ID 列表与筛选条件至少给出一项，同时给出时取交集
+    ids: Optional[List[int]] = None
+    host_id: Optional[int] = None
+    cve: Optional[str] = None
+    cvss_min: Optional[float] = None
+    note: Optional[str] = None
+
+class IssueTransitionResponse(BaseModel):
+    batch_id: str
+    to_status: str
+    matched: int
+    updated: int
+    skipped: int
+    by_from_status: Dict[str, int]
+    hosts_affected: int
+
+class IssueStatusHistoryResponse(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    issue_id: int
+    host_id: Optional[int]
+    from_status: Optional[str]
+    to_status: str
+    batch_id: Optional[str]
+    note: Optional[str]
+    changed_at: datetime
 
 # 创建表
-Base.metadata.create_all(bind=engine)
+init_db()
+ensure_indexes(engine)
+search_index = IssueSearchIndex(engine)
+search_index.ensure()
+instrument_engine(engine)
+track_statements(engine)
+
+# 请求剖析（默认关闭；开启后按请求头/查询参数或采样率触发）
+profiler = RequestProfiler(
+    report_dir=os.getenv("PROFILE_DIR", "./profiles"),
+    max_reports=int(os.getenv("PROFILE_MAX_REPORTS", "50")),
+    sample_rate=float(os.getenv("PROFILE_SAMPLE_RATE", "0")),
+    mode=os.getenv("PROFILE_MODE", "cprofile"),
+    enabled=os.getenv("PROFILING_ENABLED", "false").lower() == "true"
+)
 
 # FastAPI 应用
 app = FastAPI(
@@ -95,6 +188,14 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+app.add_middleware(ProfilingMiddleware, profiler=profiler)
+
+# 完整响应体按 Accept-Encoding 做 br/gzip 压缩（流式响应透传）
+app.add_middleware(CompressionMiddleware)
+
+# 请求耗时与按路由的数据库耗时统计（长连接的 SSE、流式 Playbook 和批量导出不计入）
+app.add_middleware(MetricsMiddleware, skip_paths=("/metrics", "/events", "/playbook/stream", "/export"))
+
 # 依赖注入
 def get_db():
     db = SessionLocal()
@@ -105,8 +206,105 @@ def get_db():
 
 # 初始化组件
 parser = VulsParser()
-llm_client = LLMClient()
+llm_client = LLMClient(provider=os.getenv("LLM_PROVIDER", "auto"))
+# 扫描结果自带修复版本的 CVE 直接生成锁定版本的命令，不调用 LLM
+advisory_index = AdvisoryIndex(SessionLocal)
+advisory_index.load()
 playbook_gen = PlaybookGenerator()
+playbook_validator = PlaybookValidator()
+response_cache = ResponseCache(
+    ttl_seconds=float(os.getenv("CACHE_TTL_SECONDS", "60")),
+    max_entries=int(os.getenv("CACHE_MAX_ENTRIES", "512")),
+    max_bytes=int(os.getenv("CACHE_MAX_BYTES", str(64 * 1024 * 1024))),
+    backend=os.getenv("CACHE_BACKEND", "memory"),
+    redis_url=os.getenv("REDIS_URL"),
+    engine=engine
+)
+# 多 worker 部署需 EVENTS_BACKEND=redis：入库只在持有监听锁的进程中进行，事件经 Redis 转发给所有 worker
+event_broker = EventBroker(
+    history_size=int(os.getenv("EVENTS_HISTORY_SIZE", "1000")),
+    queue_size=int(os.getenv("EVENTS_QUEUE_SIZE", "256")),
+    redis_url=os.getenv("REDIS_URL") if os.getenv("EVENTS_BACKEND", "memory") == "redis" else None
+)
+
+
+def on_ingest_commit(info: Dict[str, Any]):
+    """入库批次提交后：使响应缓存失效并发布主机变更事件"""
+    response_cache.bump_generation()
+    for change in info["hosts"]:
+        event_broker.publish(
+            "host.updated",
+            host_id=change["host_id"],
+            severity=severity_of(change["max_new_cvss"]),
+            ip=change["ip"],
+            risk_score=change["risk_score"],
+            new_issues=change["new_issues"]
+        )
+
+
+def collect_cache_metrics():
+    """抓取 /metrics 前同步响应缓存统计"""
+    stats = response_cache.stats()
+    RESPONSE_CACHE_LOOKUPS.labels("hit").set(stats["hits"])
+    RESPONSE_CACHE_LOOKUPS.labels("miss").set(stats["misses"])
+    RESPONSE_CACHE_ENTRIES.set(stats["entries"] or 0)
+
+
+REGISTRY.add_collector(collect_cache_metrics)
+
+ingest_pipeline = IngestPipeline(
+    SessionLocal,
+    parser,
+    batch_size=int(os.getenv("INGEST_BATCH_SIZE", "50")),
+    queue_size=int(os.getenv("INGEST_QUEUE_SIZE", "200")),
+    workers=int(os.getenv("INGEST_WORKERS", "4")),
+    on_commit=on_ingest_commit,
+    advisory_index=advisory_index
+)
+results_watcher = None
+
+
+def ingest_result_file(file_path: str):
+    """解析单个结果文件并入库（结果目录监听器回调；失败时抛出异常，由监听器退避重试）"""
+    stats = ingest_pipeline.run([file_path])
+    if stats["files_failed"]:
+        raise RuntimeError(f"Failed to ingest {file_path}")
+
+
+@app.on_event("startup")
+async def attach_event_broker():
+    """事件代理绑定到服务的事件循环（后台线程发布的事件经此投递给订阅者）"""
+    event_broker.attach_loop(asyncio.get_running_loop())
+
+
+@app.on_event("startup")
+async def start_results_watcher():
+    """启动结果目录监听，扫描结果落盘即入库（多个 worker 进程中只有一个监听）"""
+    global results_watcher
+    if not RESULTS_WATCH_ENABLED:
+        return
+
+    watcher = ResultsWatcher(
+        RESULTS_DIR,
+        ingest_result_file,
+        ingest_existing=True,
+        settle_seconds=float(os.getenv("RESULTS_WATCH_SETTLE_SECONDS", "2")),
+        poll_interval=float(os.getenv("RESULTS_WATCH_POLL_INTERVAL", "5")),
+        lock_path=RESULTS_WATCH_LOCK
+    )
+    if watcher.start():
+        results_watcher = watcher
+
+
+@app.on_event("shutdown")
+async def stop_results_watcher():
+    if results_watcher is not None:
+        results_watcher.stop()
+
+
+@app.on_event("shutdown")
+async def close_event_broker():
+    event_broker.close()
 
 @app.get("/")
 async def root():
@@ -117,149 +315,600 @@ async def root():
         "description": "自动化漏洞修复系统"
     }
 
+# 列表接口按列直接查询，结果行用 orjson 序列化，不构建 ORM 对象也不经 Pydantic 校验；
+# 列取自响应模型的字段，输出与 HostResponse/IssueResponse 一致
+HOST_COLUMNS = [getattr(Host, name) for name in HostResponse.model_fields if name not in COUNT_FIELDS]
+ISSUE_COLUMNS = [getattr(Issue, name) for name in IssueResponse.model_fields]
+
+
+def cached_json(request: Request, params: Dict[str, Any], build: Callable[[], bytes]) -> Response:
+    """
+    读接口响应缓存：命中时直接返回缓存体，If-None-Match 匹配时返回 304
+    
+    Args:
+        request: 当前请求
+        params: 规范化后的查询参数（参与缓存键）
+        build: 未命中时生成 JSON 响应体
+    """
+    key = response_cache.make_key(request.url.path, params)
+    entry = response_cache.get(key)
+    if entry is None:
+        entry = response_cache.set(key, build())
+    
+    headers = {"ETag": entry.etag, "Cache-Control": "no-cache"}
+    if response_cache.etag_matches(request.headers.get("if-none-match"), entry.etag):
+        return Response(status_code=304, headers=headers)
+    return FastJSONResponse(entry.body, headers=headers)
+
 @app.get("/hosts", response_model=List[HostResponse])
-async def get_hosts(db: Session = Depends(get_db)):
-    """获取所有主机列表"""
-    hosts = db.query(Host).all()
-    return hosts
+async def get_hosts(
+    request: Request,
+    ids: Optional[str] = Query(None, description="逗号分隔的主机 ID，只返回这些主机"),
+    db: Session = Depends(get_db)
+):
+    """获取主机列表（含按状态、严重程度的漏洞数）"""
+    host_ids = None
+    if ids:
+        try:
+            host_ids = sorted({int(value) for value in ids.split(",") if value.strip()})
+        except ValueError:
+            raise HTTPException(status_code=400, detail="ids must be comma-separated integers")
+        if len(host_ids) > HOSTS_IDS_LIMIT:
+            raise HTTPException(status_code=400, detail=f"At most {HOSTS_IDS_LIMIT} ids per request")
+    
+    def build() -> bytes:
+        return rows_json(db.execute(hosts_with_counts_statement(HOST_COLUMNS, host_ids)))
+    
+    params = {"ids": ",".join(map(str, host_ids)) if host_ids else None}
+    return cached_json(request, params, build)
+
+@app.get("/hosts/summary", response_model=HostSummaryResponse)
+async def get_hosts_summary(request: Request, db: Session = Depends(get_db)):
+    """每台主机的漏洞计数（不含主机信息）及全体合计，用于刷新列表计数和总览"""
+    def build() -> bytes:
+        rows = db.execute(hosts_with_counts_statement([Host.id.label("host_id")])).mappings()
+        return dumps(fleet_summary([dict(row) for row in rows]))
+    
+    return cached_json(request, {}, build)
 
 @app.get("/hosts/{host_id}", response_model=HostResponse)
-async def get_host(host_id: int, db: Session = Depends(get_db)):
+async def get_host(host_id: int, request: Request, db: Session = Depends(get_db)):
     """获取指定主机信息"""
-    host = db.query(Host).filter(Host.id == host_id).first()
-    if not host:
-        raise HTTPException(status_code=404, detail="Host not found")
-    return host
+    def build() -> bytes:
+        host = db.execute(hosts_with_counts_statement(HOST_COLUMNS, [host_id])).mappings().first()
+        if not host:
+            raise HTTPException(status_code=404, detail="Host not found")
+        return dumps(dict(host))
+    
+    return cached_json(request, {}, build)
 
 @app.get("/issues", response_model=List[IssueResponse])
 async def get_issues(
+    request: Request,
     host_id: Optional[int] = None,
     cvss_min: Optional[float] = None,
     status: Optional[str] = None,
     db: Session = Depends(get_db)
 ):
     """获取漏洞列表，支持筛选"""
-    query = db.query(Issue)
+    def build() -> bytes:
+        query = select(*ISSUE_COLUMNS)
+        
+        if host_id:
+            query = query.where(Issue.host_id == host_id)
+        if cvss_min:
+            query = query.where(Issue.cvss >= cvss_min)
+        if status:
+            query = query.where(Issue.status == status)
+        
+        return rows_json(db.execute(query))
+    
+    params = {"host_id": host_id or None, "cvss_min": cvss_min or None, "status": status or None}
+    return cached_json(request, params, build)
+
+@app.get("/export")
+def export_issue_data(
+    format: str = Query("ndjson", pattern="^(ndjson|csv|parquet)$"),
+    host_id: Optional[int] = None,
+    cvss_min: Optional[float] = None,
+    status: Optional[str] = None
+):
+    """
+    批量导出漏洞（含主机 IP/主机名/系统），筛选条件同 /issues
+    
+    按块从数据库游标读取并流式输出，不分页、不经过 ORM 和响应缓存；
+    Parquet 按行组写出（需要 pyarrow）。
+    """
+    if format == "parquet" and not PYARROW_AVAILABLE:
+        raise HTTPException(status_code=501, detail="Parquet export requires pyarrow")
+    
+    media_type, extension = EXPORT_FORMATS[format]
+    filename = f"fixpilot-issues-{datetime.utcnow().strftime('%Y%m%d%H%M%S')}.{extension}"
+    return StreamingResponse(
+        export_issues(engine, format, host_id=host_id, cvss_min=cvss_min, status=status),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+@app.get("/issues/search", response_model=IssueSearchResponse)
+async def search_issues(
+    request: Request,
+    q: Optional[str] = None,
+    host_id: Optional[int] = None,
+    status: Optional[str] = None,
+    os: Optional[str] = None,
+    severity: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=500),
+    offset: int = Query(0, ge=0),
+    db: Session = Depends(get_db)
+):
+    """
+    全文检索漏洞（CVE 编号、描述、包名），返回按状态/系统/严重程度的分面统计
+
+    结果（含整表的分面统计）按响应缓存代数缓存，入库或状态变更后失效
+    """
+    def build() -> bytes:
+        result = search_index.search(
+            db, q=q, host_id=host_id, status=status, os=os, severity=severity,
+            limit=limit, offset=offset
+        )
+        return IssueSearchResponse.model_validate(result).model_dump_json().encode("utf-8")
+    
+    params = {
+        "q": q, "host_id": host_id, "status": status, "os": os, "severity": severity,
+        "limit": limit, "offset": offset
+    }
+    return cached_json(request, params, build)
+
+@app.post("/issues/transitions", response_model=IssueTransitionResponse)
+def transition_issue_status(request: IssueTransitionRequest, db: Session = Depends(get_db)):
+    """
+    批量变更漏洞状态（如 Playbook 执行完成后 fixing -> fixed，或全网某 CVE 重新打开）
+
+    每个源状态一条集合式 UPDATE，不符合源状态的漏洞计入 skipped；变更与历史记录在同一事务中提交
+    """
+    try:
+        result = transition_issues(
+            db, request.to_status,
+            from_status=request.from_status, ids=request.ids,
+            host_id=request.host_id, cve=request.cve, cvss_min=request.cvss_min,
+            note=request.note
+        )
+    except TransitionError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    db.commit()
+    
+    if result["updated"]:
+        response_cache.bump_generation()
+        for host_id, change in result["hosts"].items():
+            event_broker.publish(
+                "issues.status_changed",
+                host_id=host_id,
+                severity=severity_of(change["max_cvss"]),
+                to_status=result["to_status"],
+                updated=change["updated"],
+                batch_id=result["batch_id"]
+            )
+    
+    hosts = result.pop("hosts")
+    return {**result, "hosts_affected": len(hosts)}
+
+@app.get("/issues/{issue_id}/history", response_model=List[IssueStatusHistoryResponse])
+async def get_issue_history(issue_id: int, db: Session = Depends(get_db)):
+    """漏洞的状态变更历史（按时间顺序）"""
+    if db.query(Issue.id).filter(Issue.id == issue_id).first() is None:
+        raise HTTPException(status_code=404, detail="Issue not found")
+    return db.query(IssueStatusHistory).filter(
+        IssueStatusHistory.issue_id == issue_id
+    ).order_by(IssueStatusHistory.id).all()
+
+@app.get("/packages/{name}/hosts", response_model=List[PackageHostResponse])
+async def get_package_hosts(
+    name: str,
+    status: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    """查询受指定包影响的所有主机及对应 CVE"""
+    query = db.query(
+        IssuePackage.host_id, IssuePackage.issue_id, IssuePackage.version,
+        IssuePackage.new_version, IssuePackage.fixed_in,
+        Issue.cve, Issue.cvss, Issue.status,
+        Host.ip, Host.hostname, Host.os
+    ).join(Issue, Issue.id == IssuePackage.issue_id).join(
+        Host, Host.id == IssuePackage.host_id
+    ).filter(IssuePackage.name == name)
     
-    if host_id:
-        query = query.filter(Issue.host_id == host_id)
-    if cvss_min:
-        query = query.filter(Issue.cvss >= cvss_min)
     if status:
         query = query.filter(Issue.status == status)
     
-    issues = query.all()
-    return issues
+    hosts = {}
+    for row in query.order_by(IssuePackage.host_id, Issue.cvss.desc()):
+        host = hosts.setdefault(row.host_id, {
+            "host_id": row.host_id,
+            "ip": row.ip,
+            "hostname": row.hostname,
+            "os": row.os,
+            "cves": []
+        })
+        host["cves"].append({
+            "issue_id": row.issue_id,
+            "cve": row.cve,
+            "cvss": row.cvss,
+            "status": row.status,
+            "version": row.version,
+            "new_version": row.new_version,
+            "fixed_in": row.fixed_in
+        })
+    
+    return FastJSONResponse(list(hosts.values()))
+
+def load_playbook_issues(db: Session, request: PlaybookRequest):
+    """
+    查询主机、待修复的高风险漏洞及每个漏洞的全部受影响包
+
+    Returns:
+        (host, issues, {issue_id: [{"name", "fixed_in"}]})
+
+    Raises:
+        HTTPException: 主机不存在
+    """
+    host = db.query(Host).filter(Host.id == request.host_id).first()
+    if not host:
+        raise HTTPException(status_code=404, detail="Host not found")
+    
+    issues = db.query(Issue).filter(
+        Issue.host_id == request.host_id,
+        Issue.cvss >= request.cvss_threshold,
+        Issue.status == "open"
+    ).all()
+    
+    issue_packages = {}
+    if issues:
+        for issue_id, pkg_name, fixed_in in db.query(
+            IssuePackage.issue_id, IssuePackage.name, IssuePackage.fixed_in
+        ).filter(IssuePackage.issue_id.in_([issue.id for issue in issues])):
+            issue_packages.setdefault(issue_id, []).append({"name": pkg_name, "fixed_in": fixed_in})
+    return host, issues, issue_packages
+
+def resolve_known_fixes(host: Host, issues: List[Issue], issue_packages: Dict[int, List[Dict[str, Any]]]):
+    """
+    不调用 LLM 能确定的修复命令：已保存的命令，或修复公告索引中有修复版本的
+
+    Returns:
+        (本次新解析出的漏洞, 仍需 LLM 生成的漏洞)
+    """
+    generated = []
+    missing = []
+    for issue in issues:
+        if issue.fix_command and not is_failed_fix_command(issue.fix_command):
+            FIX_CACHE_HIT.inc()
+            continue
+        FIX_CACHE_MISS.inc()
+        command = advisory_index.resolve(host.os, issue.cve, issue_packages.get(issue.id, []))
+        if command:
+            issue.fix_command = command
+            generated.append(issue)
+        else:
+            missing.append(issue)
+    return generated, missing
+
+def manual_review_command(cve: str) -> str:
+    return f"# Manual review required: no fix command could be generated for {cve}"
+
+def fix_command_entry(issue: Issue, command: str, issue_packages: Dict[int, List[Dict[str, Any]]]) -> Dict[str, Any]:
+    return {
+        "cve": issue.cve,
+        "command": command,
+        "package": issue.package,
+        "packages": [pkg["name"] for pkg in issue_packages.get(issue.id, [])]
+    }
+
+def finish_playbook(
+    db: Session,
+    host: Host,
+    issues: List[Issue],
+    fix_commands: List[Dict[str, Any]],
+    generated: List[Issue]
+) -> Dict[str, Any]:
+    """保存新生成的修复命令、渲染并写入 Playbook 文件，发布事件"""
+    if generated:
+        db.commit()
+        response_cache.bump_generation()
+        for issue in generated:
+            event_broker.publish(
+                "issue.fix_generated",
+                host_id=issue.host_id,
+                severity=severity_of(issue.cvss),
+                issue_id=issue.id,
+                cve=issue.cve
+            )
+    
+    playbook_content = playbook_gen.generate_playbook(host.ip, fix_commands)
+    
+    filename = f"fix_{host.ip.replace('.', '_')}.yml"
+    filepath = f"./playbooks/{filename}"
+    os.makedirs("./playbooks", exist_ok=True)
+    
+    with open(filepath, "w", encoding="utf-8") as f:
+        f.write(playbook_content)
+    
+    event_broker.publish(
+        "playbook.generated",
+        host_id=host.id,
+        severity=severity_of(max(issue.cvss or 0.0 for issue in issues)),
+        filename=filename,
+        issues_count=len(issues)
+    )
+    return {"filename": filename, "issues_count": len(issues), "playbook": playbook_content}
 
 @app.post("/playbook")
+@profiler.profiled
 async def generate_playbook(
     request: PlaybookRequest,
     db: Session = Depends(get_db)
 ):
     """生成 Ansible Playbook"""
     try:
-        # 获取主机信息
-        host = db.query(Host).filter(Host.id == request.host_id).first()
-        if not host:
-            raise HTTPException(status_code=404, detail="Host not found")
-        
-        # 获取高风险漏洞
-        issues = db.query(Issue).filter(
-            Issue.host_id == request.host_id,
-            Issue.cvss >= request.cvss_threshold,
-            Issue.status == "open"
-        ).all()
-        
+        host, issues, issue_packages = load_playbook_issues(db, request)
         if not issues:
             return {"message": "No high-risk issues found", "playbook": None}
         
-        # 生成修复命令
-        fix_commands = []
-        for issue in issues:
-            if not issue.fix_command:
-                # 使用 LLM 生成修复命令
-                fix_cmd = await llm_client.generate_fix_command(issue.cve, issue.summary)
-                issue.fix_command = fix_cmd
-                db.commit()
-            fix_commands.append({
-                "cve": issue.cve,
-                "command": issue.fix_command,
-                "package": issue.package
-            })
-        
-        # 生成 Playbook
-        playbook_content = playbook_gen.generate_playbook(host.ip, fix_commands)
+        generated, missing = resolve_known_fixes(host, issues, issue_packages)
         
-        # 保存 Playbook 文件
-        filename = f"fix_{host.ip.replace('.', '_')}.yml"
-        filepath = f"./playbooks/{filename}"
-        os.makedirs("./playbooks", exist_ok=True)
+        # 使用 LLM 生成缺失的修复命令（LLM_BATCH_SIZE > 1 时多个 CVE 合并为一次请求）
+        generations = {}
+        if missing:
+            generations = await llm_client.generate_batch(
+                [{"cve": issue.cve, "summary": issue.summary, "package": issue.package or ""} for issue in missing],
+                os_info=host.os
+            )
         
-        with open(filepath, "w", encoding="utf-8") as f:
-            f.write(playbook_content)
+        fix_commands = []
+        for issue in issues:
+            command = issue.fix_command
+            if issue in missing:
+                generation = generations.get(issue.cve)
+                if generation is None:
+                    command = manual_review_command(issue.cve)
+                else:
+                    command = generation.command
+                    # 回退提供方的结果只用于本次 Playbook，不写入缓存
+                    if not generation.degraded:
+                        issue.fix_command = command
+                        generated.append(issue)
+            fix_commands.append(fix_command_entry(issue, command, issue_packages))
         
-        return {
-            "message": "Playbook generated successfully",
-            "filename": filename,
-            "issues_count": len(issues),
-            "playbook": playbook_content
-        }
+        result = finish_playbook(db, host, issues, fix_commands, generated)
+        if request.syntax_check:
+            result["validation"] = (await playbook_validator.validate(result["playbook"])).to_dict()
+        return {"message": "Playbook generated successfully", **result}
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error generating playbook: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.post("/scan/parse")
-async def parse_scan_results(db: Session = Depends(get_db)):
-    """解析 Vuls 扫描结果"""
+def ndjson(event: Dict[str, Any]) -> bytes:
+    return json.dumps(event, ensure_ascii=False).encode("utf-8") + b"\n"
+
+async def stream_playbook_events(request: PlaybookRequest):
+    """
+    /playbook/stream 的事件流（NDJSON，每行一个事件）
+
+    start → 已知命令的 fix → LLM 生成中的 token/reset 与完成的 fix（按完成顺序）→ playbook；
+    出错时以 error 结束。
+    """
+    started = time.perf_counter()
+    db = SessionLocal()
+    tasks = []
+    first_result = True
+    
+    def fix_event(issue: Issue, command: str, provider: Optional[str], degraded: bool) -> bytes:
+        nonlocal first_result
+        if first_result:
+            first_result = False
+            PLAYBOOK_STREAM_FIRST_RESULT_SECONDS.observe(time.perf_counter() - started)
+        return ndjson({
+            "type": "fix", "issue_id": issue.id, "cve": issue.cve,
+            "command": command, "provider": provider, "degraded": degraded
+        })
+    
     try:
-        # 解析扫描结果
-        results = parser.parse_results("./results")
+        host, issues, issue_packages = load_playbook_issues(db, request)
+        if not issues:
+            yield ndjson({"type": "playbook", "message": "No high-risk issues found", "playbook": None})
+            return
         
-        # 更新数据库
-        for result in results:
-            # 更新或创建主机记录
-            host = db.query(Host).filter(Host.ip == result["ip"]).first()
-            if not host:
-                host = Host(
-                    ip=result["ip"],
-                    hostname=result.get("hostname"),
-                    os=result.get("os"),
-                    last_scan=datetime.utcnow(),
-                    risk_score=result.get("risk_score", 0.0)
-                )
-                db.add(host)
-                db.flush()
-            else:
-                host.last_scan = datetime.utcnow()
-                host.risk_score = result.get("risk_score", 0.0)
-            
-            # 添加漏洞记录
-            for issue in result.get("issues", []):
-                existing_issue = db.query(Issue).filter(
-                    Issue.host_id == host.id,
-                    Issue.cve == issue["cve"]
-                ).first()
-                
-                if not existing_issue:
-                    new_issue = Issue(
-                        host_id=host.id,
-                        cve=issue["cve"],
-                        summary=issue["summary"],
-                        cvss=issue["cvss"],
-                        package=issue.get("package"),
-                        patchable=issue.get("patchable"),
-                        status="open"
+        generated, missing = resolve_known_fixes(host, issues, issue_packages)
+        yield ndjson({"type": "start", "host_id": host.id, "issues_count": len(issues), "pending": len(missing)})
+        
+        commands = {}
+        pending = set(missing)
+        for issue in issues:
+            if issue not in pending:
+                commands[issue.id] = issue.fix_command
+                yield fix_event(issue, issue.fix_command, "advisory" if issue in generated else "stored", False)
+        
+        # 逐条生成（不合批），每个 CVE 完成即输出；LLM 的增量文本作为 token 事件转发
+        events: "asyncio.Queue" = asyncio.Queue()
+        semaphore = asyncio.Semaphore(PLAYBOOK_STREAM_CONCURRENCY)
+        
+        async def generate(issue: Issue):
+            generation = None
+            try:
+                async with semaphore:
+                    generation = await llm_client.generate(
+                        issue.cve, issue.summary,
+                        on_token=lambda delta: events.put_nowait(("token", issue, delta)),
+                        package=issue.package or "", os=host.os
                     )
-                    db.add(new_issue)
+            except Exception as e:
+                logger.error(f"Fix generation failed for {issue.cve}: {e}")
+            events.put_nowait(("fix", issue, generation))
         
-        db.commit()
-        return {"message": "Scan results parsed successfully"}
+        tasks = [asyncio.ensure_future(generate(issue)) for issue in missing]
+        remaining = len(tasks)
+        while remaining:
+            kind, issue, value = await events.get()
+            if kind == "token":
+                if value is None:
+                    yield ndjson({"type": "reset", "cve": issue.cve})
+                else:
+                    yield ndjson({"type": "token", "cve": issue.cve, "text": value})
+                continue
+            
+            remaining -= 1
+            if value is None:
+                commands[issue.id] = manual_review_command(issue.cve)
+                yield fix_event(issue, commands[issue.id], None, True)
+                continue
+            commands[issue.id] = value.command
+            # 回退提供方的结果只用于本次 Playbook，不写入缓存
+            if not value.degraded:
+                issue.fix_command = value.command
+                generated.append(issue)
+            yield fix_event(issue, value.command, value.provider, value.degraded)
+        
+        fix_commands = [fix_command_entry(issue, commands[issue.id], issue_packages) for issue in issues]
+        result = finish_playbook(db, host, issues, fix_commands, generated)
+        if request.syntax_check:
+            result["validation"] = (await playbook_validator.validate(result["playbook"])).to_dict()
+        yield ndjson({"type": "playbook", "message": "Playbook generated successfully", **result})
+    
+    except Exception as e:
+        logger.error(f"Error streaming playbook: {e}")
+        yield ndjson({"type": "error", "detail": str(e)})
+    finally:
+        # 客户端断开时停止尚未完成的生成（已合并给其他请求的调用不受影响）
+        for task in tasks:
+            task.cancel()
+        db.close()
+
+@app.post("/playbook/stream")
+async def stream_playbook(request: PlaybookRequest, db: Session = Depends(get_db)):
+    """
+    流式生成 Ansible Playbook（NDJSON）
+
+    每个 CVE 的修复命令生成后立即输出，最后输出完整 Playbook。
+    """
+    if not db.query(Host.id).filter(Host.id == request.host_id).first():
+        raise HTTPException(status_code=404, detail="Host not found")
+    return StreamingResponse(
+        stream_playbook_events(request),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.post("/scan/parse")
+@profiler.profiled
+def parse_scan_results(force: bool = False):
+    """解析 Vuls 扫描结果（已入库且未变化的文件会被跳过，force=true 时全部重新入库）"""
+    try:
+        stats = ingest_pipeline.run(parser.list_result_files(RESULTS_DIR), force=force)
+        return {"message": "Scan results parsed successfully", "stats": stats}
         
     except Exception as e:
         logger.error(f"Error parsing scan results: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/events")
+async def stream_events(
+    request: Request,
+    host_id: Optional[int] = None,
+    severity: Optional[str] = Query(None, pattern="^(low|medium|high|critical)$"),
+    since: Optional[str] = None
+):
+    """
+    订阅变更事件（SSE）
+    
+    断线重连时浏览器自动携带 Last-Event-ID 续传；也可用 since 显式指定恢复令牌。
+    收到 reset 事件时客户端应全量重新加载。
+    """
+    last_event_id = request.headers.get("last-event-id") or since
+    return StreamingResponse(
+        event_broker.stream(host_id=host_id, severity=severity, last_event_id=last_event_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.get("/events/stats")
+async def get_event_stats():
+    """事件代理统计"""
+    return event_broker.stats()
+
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus 文本格式的运行指标"""
+    return Response(REGISTRY.render(), media_type=CONTENT_TYPE)
+
+@app.get("/cache/stats")
+async def get_cache_stats():
+    """响应缓存统计（命中率、内存占用）"""
+    return response_cache.stats()
+
+@app.get("/llm/health")
+async def get_llm_health():
+    """LLM 提供方健康检查（含共享 SecGPT 推理服务的队列深度）"""
+    return await llm_client.health()
+
+@app.get("/llm/stats")
+async def get_llm_stats():
+    """LLM 回退链状态（熔断器、延迟分位数、负缓存）"""
+    return llm_client.stats()
+
+@app.get("/admin/profiles")
+async def list_profiles():
+    """列出剖析报告（新的在前）"""
+    return profiler.list_reports()
+
+@app.get("/admin/profiles/{report_id}")
+async def get_profile(report_id: str):
+    """查看剖析报告（函数耗时排行、SQL 统计、采样栈）"""
+    path = profiler.report_path(report_id)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, media_type="application/json")
+
+@app.get("/admin/profiles/{report_id}/prof")
+async def download_profile(report_id: str):
+    """下载 cProfile 原始数据（可用 snakeviz / pstats 打开）"""
+    path = profiler.report_path(report_id, ".prof")
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, media_type="application/octet-stream", filename=f"{report_id}.prof")
+
+@app.post("/playbooks/validate")
+async def validate_playbooks(request: PlaybookValidateRequest):
+    """
+    校验已生成的 Playbook 语法（ansible-playbook --syntax-check）
+
+    多个文件合并为一次 ansible 调用，结果按内容缓存；未安装 ansible 时状态为 skipped。
+    """
+    playbook_dir = "./playbooks"
+    if request.filenames is None:
+        filenames = sorted(
+            name for name in (os.listdir(playbook_dir) if os.path.isdir(playbook_dir) else [])
+            if name.endswith((".yml", ".yaml"))
+        )
+    else:
+        filenames = request.filenames
+    
+    contents = []
+    for filename in filenames:
+        filepath = os.path.join(playbook_dir, filename)
+        if os.path.basename(filename) != filename or not os.path.isfile(filepath):
+            raise HTTPException(status_code=404, detail=f"Playbook not found: {filename}")
+        with open(filepath, "r", encoding="utf-8") as f:
+            contents.append(f.read())
+    
+    results = await playbook_validator.validate_many(contents)
+    return {
+        "valid": all(result.valid for result in results),
+        "results": {filename: result.to_dict() for filename, result in zip(filenames, results)},
+        "stats": playbook_validator.stats()
+    }
+
 @app.get("/playbooks/{filename}")
 async def download_playbook(filename: str):
     """下载生成的 Playbook 文件"""
@@ -0,0 +1,9 @@
+"""
+性能基准
+功能：确定性的 Vuls 扫描结果生成器与各环节（解析、入库、查询、Playbook 渲染、模板 LLM）的基准套件
+
+在 backend 目录下运行：
+    python -m benchmarks run --hosts 200 --cves 40
+    python -m benchmarks compare benchmark-results/<旧>.json benchmark-results/<新>.json
+    python -m benchmarks generate ./results --hosts 50 --layout multi
+"""
@@ -0,0 +1,441 @@
+"""
+基准命令行入口
+用法（在 backend 目录下）：
+    python -m benchmarks run [--hosts N] [--cves N] [--layout single|multi] [--filter 名称] [--out 目录]
+    python -m benchmarks compare 基线.json 当前.json [--threshold 0.1]
+    python -m benchmarks generate 输出目录 [--hosts N] [--cves N] [--layout single|multi]
+    python -m benchmarks loadtest [--hosts N] [--concurrency N] [--duration 秒] [--mix hosts=40,...] [--slo 文件] [--baseline 报告.json]
+    python -m benchmarks mock-llm [--port 8900] [--latency-ms 300] [--error-rate 0.01] [--rate-limit-rate 0.05]
+    python -m benchmarks llm [--calls 200] [--concurrency 16] [--url 已运行的模拟服务] [模拟服务参数...]
+    python -m benchmarks advisory [--hosts N] [--unfixed-ratio 0.2]
+    python -m benchmarks llm-batch [--batch-sizes 1,4,8,16] [--hosts 20] [--malformed-rate 0.1] [模拟服务参数...]
+    python -m benchmarks secgpt [--modes fp32,int8-bounded,...] [--prompts 20] [--threads N] [--model-path 路径]
+"""
+
+import os
+import sys
+import json
+import shutil
+import argparse
+import tempfile
+
+
+DEFAULT_SLO = os.path.join(os.path.dirname(os.path.abspath(__file__)), "slo.yaml")
+
+
+def add_generator_args(parser: argparse.ArgumentParser):
+    parser.add_argument("--hosts", type=int, default=100, help="主机数")
+    parser.add_argument("--cves", type=int, default=40, help="每台主机的 CVE 数")
+    parser.add_argument("--layout", choices=["single", "multi"], default="single", help="文件布局")
+    parser.add_argument("--hosts-per-file", type=int, default=50, help="multi 布局下每个文件的主机数")
+    parser.add_argument("--summary-words", type=int, default=40, help="漏洞描述单词数")
+    parser.add_argument("--packages-per-cve", type=int, default=2, help="每个 CVE 影响的包数")
+    parser.add_argument("--unfixed-ratio", type=float, default=0.0, help="尚无修复版本的受影响包比例")
+    parser.add_argument("--seed", type=int, default=42, help="随机种子")
+
+
+def make_generator(args):
+    from benchmarks.generator import VulsFleetGenerator
+
+    return VulsFleetGenerator(
+        hosts=args.hosts,
+        cves_per_host=args.cves,
+        layout=args.layout,
+        hosts_per_file=args.hosts_per_file,
+        summary_words=args.summary_words,
+        packages_per_cve=args.packages_per_cve,
+        unfixed_ratio=args.unfixed_ratio,
+        seed=args.seed
+    )
+
+
+def cmd_run(args) -> int:
+    work_dir = tempfile.mkdtemp(prefix="fixpilot-bench-")
+
+    # 在导入任何后端模块之前指向临时数据库，并关闭结果目录监听
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(work_dir, 'bench.db')}"
+    os.environ["RESULTS_WATCH_ENABLED"] = "false"
+    os.environ.setdefault("LLM_PROVIDER", "template")
+
+    from loguru import logger
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+
+    from benchmarks.runner import run_benchmarks, save_results
+    from benchmarks.suites import build_benchmarks
+
+    generator = make_generator(args)
+    try:
+        print(f"Generating fleet: {generator.spec()}")
+        benchmarks = build_benchmarks(generator, work_dir, repeat=args.repeat)
+        results = run_benchmarks(benchmarks, pattern=args.filter)
+        path = save_results(results, {**generator.spec(), "repeat": args.repeat}, args.out)
+        print(f"Results saved to {path}")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return 0
+
+
+def cmd_loadtest(args) -> int:
+    work_dir = tempfile.mkdtemp(prefix="fixpilot-load-")
+    results_dir = os.path.join(work_dir, "results")
+
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(work_dir, 'load.db')}"
+    os.environ["SCAN_RESULTS_DIR"] = results_dir
+    os.environ["RESULTS_WATCH_ENABLED"] = "false"
+    os.environ["LLM_PROVIDER"] = "template"
+
+    from loguru import logger
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+
+    from benchmarks.loadtest import LoadTest, parse_mix, print_report, check_slo, save_report
+
+    # 接口会在工作目录下写 playbooks/，切换到临时目录避免污染仓库
+    out_path = os.path.abspath(args.out) if args.out else None
+    cwd = os.getcwd()
+    os.chdir(work_dir)
+    try:
+        generator = make_generator(args)
+        print(f"Seeding database: {generator.spec()}")
+        paths = generator.write(results_dir)
+
+        import app as app_module
+        app_module.ingest_pipeline.run(paths, force=True)
+
+        load_test = LoadTest(
+            app_module,
+            host_count=generator.hosts,
+            concurrency=args.concurrency,
+            duration=args.duration,
+            mix=parse_mix(args.mix),
+            llm_latency=args.llm_latency,
+            seed=args.seed
+        )
+        report = load_test.run()
+        report["params"] = generator.spec()
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    print_report(report)
+    if out_path:
+        save_report(report, out_path)
+        print(f"Report saved to {out_path}")
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    violations = check_slo(report, args.slo, baseline) if args.slo else []
+    for violation in violations:
+        print(f"SLO VIOLATION: {violation}")
+    if args.slo and not violations:
+        print("SLO check passed")
+    return 1 if violations else 0
+
+
+def add_mock_llm_args(parser: argparse.ArgumentParser):
+    parser.add_argument("--latency-ms", type=float, default=300.0, help="基础延迟（毫秒）")
+    parser.add_argument("--latency-distribution", choices=["fixed", "uniform", "lognormal"], default="lognormal")
+    parser.add_argument("--latency-sigma", type=float, default=0.5, help="lognormal sigma / uniform 相对抖动")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="500 错误比例")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="429 限流比例")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="429 的 Retry-After（秒）")
+    parser.add_argument("--tokens-per-second", type=float, default=0.0, help="生成速度，0 表示不按 token 计延迟")
+    parser.add_argument("--max-concurrency", type=int, default=0, help="并发上限，超出返回 429")
+    parser.add_argument("--malformed-rate", type=float, default=0.0, help="批量请求返回截断 JSON 的比例")
+
+
+def make_mock_config(args):
+    from benchmarks.mock_llm import MockLLMConfig
+
+    return MockLLMConfig(
+        latency_ms=args.latency_ms,
+        latency_distribution=args.latency_distribution,
+        latency_sigma=args.latency_sigma,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        retry_after=args.retry_after,
+        tokens_per_second=args.tokens_per_second,
+        max_concurrency=args.max_concurrency,
+        malformed_rate=args.malformed_rate,
+        seed=args.seed
+    )
+
+
+def cmd_mock_llm(args) -> int:
+    import uvicorn
+    from benchmarks.mock_llm import create_mock_app
+
+    print(f"Mock LLM listening on http://{args.host}:{args.port}/v1 (set OPENAI_BASE_URL to this)")
+    uvicorn.run(create_mock_app(make_mock_config(args)), host=args.host, port=args.port, log_level="warning")
+    return 0
+
+
+def cmd_llm(args) -> int:
+    import asyncio
+    import httpx
+    from loguru import logger
+    logger.remove()
+    logger.add(sys.stderr, level="ERROR")
+
+    from benchmarks.mock_llm import create_mock_app
+    from benchmarks.server import BackgroundServer
+    from benchmarks.llm_bench import build_requests, run_fanout, print_fanout
+
+    server = None
+    base_url = args.url
+    if not base_url:
+        server = BackgroundServer(create_mock_app(make_mock_config(args)))
+        base_url = server.start() + "/v1"
+
+    os.environ["OPENAI_BASE_URL"] = base_url
+    os.environ.setdefault("OPENAI_API_KEY", "mock-key")
+    try:
+        from llm_client import LLMClient
+
+        # 关闭规则第一层，所有调用都经过 OpenAI 客户端
+        llm_client = LLMClient(provider="openai", rules_first_tier=False)
+        requests = build_requests(make_generator(args), args.calls, args.duplicate_ratio, args.seed)
+        report = asyncio.run(run_fanout(llm_client, requests, args.concurrency))
+        stats = llm_client.stats()
+        report["providers"] = stats["providers"]
+        report["coalesced"] = stats["coalesced"]
+        if server is not None:
+            report["server"] = httpx.get(base_url.rsplit("/v1", 1)[0] + "/stats").json()
+    finally:
+        if server is not None:
+            server.stop()
+
+    print_fanout(report)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"Report saved to {args.out}")
+    return 0
+
+
+def cmd_llm_batch(args) -> int:
+    import asyncio
+    import httpx
+    from loguru import logger
+    logger.remove()
+    logger.add(sys.stderr, level="ERROR")
+
+    from benchmarks.mock_llm import create_mock_app
+    from benchmarks.server import BackgroundServer
+    from benchmarks.llm_bench import build_host_items, run_batch_mode, print_batch_comparison
+
+    server = BackgroundServer(create_mock_app(make_mock_config(args)))
+    root_url = server.start()
+    os.environ["OPENAI_BASE_URL"] = root_url + "/v1"
+    os.environ["OPENAI_API_KEY"] = "mock-key"
+    try:
+        from llm_client import LLMClient
+
+        groups = build_host_items(make_generator(args), args.hosts)
+        reports = []
+        for batch_size in (int(size) for size in args.batch_sizes.split(",")):
+            reports.append(asyncio.run(run_batch_mode(
+                lambda: LLMClient(provider="openai", hedge_delay="0", rules_first_tier=False),
+                groups,
+                batch_size,
+                args.concurrency,
+                lambda: httpx.get(root_url + "/stats").json()
+            )))
+    finally:
+        server.stop()
+
+    print_batch_comparison(reports)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(reports, f, ensure_ascii=False, indent=2)
+        print(f"Report saved to {args.out}")
+    return 0
+
+
+def cmd_advisory(args) -> int:
+    work_dir = tempfile.mkdtemp(prefix="fixpilot-advisory-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(work_dir, 'advisory.db')}"
+
+    from loguru import logger
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+
+    from benchmarks.advisory_bench import advisory_report, print_advisory_report
+
+    try:
+        report = advisory_report(make_generator(args), os.path.join(work_dir, "results"))
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    print_advisory_report(report)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"Report saved to {args.out}")
+    return 0
+
+
+def cmd_payload(args) -> int:
+    work_dir = tempfile.mkdtemp(prefix="fixpilot-payload-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(work_dir, 'payload.db')}"
+
+    from loguru import logger
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+
+    from benchmarks.payload_bench import payload_report, print_payload_report
+
+    try:
+        report = payload_report(make_generator(args), os.path.join(work_dir, "results"), repeat=args.repeat)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    print_payload_report(report)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"Report saved to {args.out}")
+    return 0
+
+
+def cmd_secgpt(args) -> int:
+    from loguru import logger
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+
+    from benchmarks.secgpt_bench import (
+        SECGPT_MODES, build_prompts, run_mode, run_secgpt_modes, print_secgpt_comparison
+    )
+    from llm_client import TRANSFORMERS_AVAILABLE
+
+    if not TRANSFORMERS_AVAILABLE:
+        print("transformers and torch are required for the SecGPT benchmark", file=sys.stderr)
+        return 2
+
+    if args.child:
+        report = run_mode(args.child, build_prompts(make_generator(args), args.prompts), args.model_path, args.threads)
+        print(json.dumps(report, ensure_ascii=False))
+        return 0
+
+    modes = [mode.strip() for mode in args.modes.split(",") if mode.strip()]
+    unknown = [mode for mode in modes if mode not in SECGPT_MODES]
+    if unknown:
+        print(f"Unknown modes: {', '.join(unknown)}; available: {', '.join(SECGPT_MODES)}", file=sys.stderr)
+        return 2
+
+    generator_args = ["--hosts", str(args.hosts), "--cves", str(args.cves), "--seed", str(args.seed)]
+    reports = run_secgpt_modes(modes, args.prompts, args.model_path, args.threads, generator_args)
+    print_secgpt_comparison(reports)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump({"modes": reports}, f, ensure_ascii=False, indent=2)
+        print(f"Report saved to {args.out}")
+    return 0 if len(reports) == len(modes) else 1
+
+
+def cmd_compare(args) -> int:
+    from benchmarks.runner import compare_results
+
+    regressions = compare_results(args.baseline, args.current, threshold=args.threshold)
+    return 1 if regressions else 0
+
+
+def cmd_generate(args) -> int:
+    paths = make_generator(args).write(args.out_dir)
+    print(f"Wrote {len(paths)} files to {args.out_dir}")
+    return 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="FixPilot 性能基准")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run = subparsers.add_parser("run", help="运行基准并保存结果")
+    add_generator_args(run)
+    run.add_argument("--repeat", type=int, default=5, help="每个基准的重复轮数")
+    run.add_argument("--filter", help="只运行名称包含该字符串的基准")
+    run.add_argument("--out", default="./benchmark-results", help="结果输出目录")
+    run.set_defaults(func=cmd_run)
+
+    compare = subparsers.add_parser("compare", help="对比两次基准结果")
+    compare.add_argument("baseline")
+    compare.add_argument("current")
+    compare.add_argument("--threshold", type=float, default=0.10, help="回归判定阈值（比例）")
+    compare.set_defaults(func=cmd_compare)
+
+    generate = subparsers.add_parser("generate", help="只生成合成扫描结果")
+    generate.add_argument("out_dir")
+    add_generator_args(generate)
+    generate.set_defaults(func=cmd_generate)
+
+    loadtest = subparsers.add_parser("loadtest", help="进程内 HTTP 压测并检查延迟 SLO")
+    add_generator_args(loadtest)
+    loadtest.add_argument("--concurrency", type=int, default=16, help="并发连接数")
+    loadtest.add_argument("--duration", type=float, default=20.0, help="压测时长（秒）")
+    loadtest.add_argument("--mix", help="流量配比，如 hosts=40,issues=40,playbook=10,parse=10")
+    loadtest.add_argument("--llm-latency", type=float, default=0.2, help="模拟 LLM 的单次延迟（秒）")
+    loadtest.add_argument("--slo", default=DEFAULT_SLO, help="SLO 容差文件，传空字符串跳过检查")
+    loadtest.add_argument("--baseline", help="基线压测报告（JSON），按容差检查相对退化")
+    loadtest.add_argument("--out", help="保存压测报告（JSON）")
+    loadtest.set_defaults(func=cmd_loadtest)
+
+    mock_llm = subparsers.add_parser("mock-llm", help="启动 OpenAI 兼容的模拟 LLM 服务")
+    mock_llm.add_argument("--host", default="127.0.0.1")
+    mock_llm.add_argument("--port", type=int, default=8900)
+    mock_llm.add_argument("--seed", type=int, default=42, help="随机种子")
+    add_mock_llm_args(mock_llm)
+    mock_llm.set_defaults(func=cmd_mock_llm)
+
+    llm = subparsers.add_parser("llm", help="并发调用 OpenAI 客户端，测量修复命令生成链路")
+    add_generator_args(llm)
+    add_mock_llm_args(llm)
+    llm.add_argument("--url", help="已运行的 OpenAI 兼容服务地址（含 /v1），不指定时在进程内启动模拟服务")
+    llm.add_argument("--calls", type=int, default=200, help="调用次数")
+    llm.add_argument("--concurrency", type=int, default=16, help="并发数")
+    llm.add_argument("--duplicate-ratio", type=float, default=0.0, help="重复 CVE 的比例")
+    llm.add_argument("--out", help="保存报告（JSON）")
+    llm.set_defaults(func=cmd_llm)
+
+    advisory = subparsers.add_parser("advisory", help="统计修复公告索引可离线解析的漏洞比例（省下的 LLM 调用）")
+    add_generator_args(advisory)
+    advisory.set_defaults(unfixed_ratio=0.2)
+    advisory.add_argument("--out", help="保存报告（JSON）")
+    advisory.set_defaults(func=cmd_advisory)
+
+    llm_batch = subparsers.add_parser("llm-batch", help="对比逐条与多 CVE 批量生成的 token 和耗时")
+    add_generator_args(llm_batch)
+    add_mock_llm_args(llm_batch)
+    llm_batch.set_defaults(hosts=20)
+    llm_batch.add_argument("--batch-sizes", default="1,4,8,16", help="逗号分隔的批大小，1 为逐条")
+    llm_batch.add_argument("--concurrency", type=int, default=4, help="同时处理的主机数")
+    llm_batch.add_argument("--out", help="保存报告（JSON）")
+    llm_batch.set_defaults(func=cmd_llm_batch)
+
+    payload = subparsers.add_parser("payload", help="对比 /issues 响应的序列化方式与压缩编码（传输字节数和 CPU 时间）")
+    add_generator_args(payload)
+    payload.set_defaults(hosts=500)
+    payload.add_argument("--repeat", type=int, default=5, help="每项测量的重复次数")
+    payload.add_argument("--out", help="保存报告（JSON）")
+    payload.set_defaults(func=cmd_payload)
+
+    secgpt = subparsers.add_parser("secgpt", help="对比 SecGPT 本地推理模式的延迟和内存（需要 transformers/torch）")
+    add_generator_args(secgpt)
+    secgpt.set_defaults(hosts=10)
+    secgpt.add_argument("--modes", default="fp32,fp32-bounded,int8-bounded,int8-bounded-prefix", help="逗号分隔的推理模式")
+    secgpt.add_argument("--prompts", type=int, default=20, help="每种模式生成的条数")
+    secgpt.add_argument("--threads", type=int, default=int(os.getenv("SECGPT_THREADS") or 0), help="torch 计算线程数，0 为默认")
+    secgpt.add_argument("--model-path", default=None, help="模型路径，默认 SECGPT_MODEL_PATH")
+    secgpt.add_argument("--child", help=argparse.SUPPRESS)
+    secgpt.add_argument("--out", help="保存报告（JSON）")
+    secgpt.set_defaults(func=cmd_secgpt)
+
+    args = parser.parse_args()
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
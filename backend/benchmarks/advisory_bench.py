@@ -0,0 +1,88 @@
+"""
+修复公告索引覆盖率报告
+功能：把合成主机群入库后，统计有多少漏洞可由 AdvisoryIndex 离线生成修复命令（即省下的 LLM 调用），
+以及单次解析耗时
+
+导入本模块前需设置 DATABASE_URL 指向临时数据库（__main__ 中完成）。
+"""
+
+import time
+from typing import Any, Dict, List
+
+from benchmarks.generator import VulsFleetGenerator
+
+
+def advisory_report(generator: VulsFleetGenerator, results_dir: str) -> Dict[str, Any]:
+    """
+    生成数据、入库并逐条解析所有漏洞
+
+    Args:
+        generator: 扫描结果生成器
+        results_dir: 结果文件输出目录
+    """
+    from models import SessionLocal, Base, engine, Host, Issue, IssuePackage
+    from parser import VulsParser
+    from ingest import IngestPipeline
+    from advisory import AdvisoryIndex, split_os
+
+    Base.metadata.create_all(bind=engine)
+    paths = generator.write(results_dir)
+
+    index = AdvisoryIndex(SessionLocal)
+    t0 = time.perf_counter()
+    IngestPipeline(SessionLocal, VulsParser(), advisory_index=index).run(paths, force=True)
+    ingest_seconds = time.perf_counter() - t0
+
+    # 重启场景：从数据库重新加载索引
+    t0 = time.perf_counter()
+    index.load()
+    load_seconds = time.perf_counter() - t0
+
+    db = SessionLocal()
+    try:
+        issues = db.query(Issue.id, Issue.cve, Host.os).join(Host, Host.id == Issue.host_id).all()
+        packages: Dict[int, List[Dict[str, Any]]] = {}
+        for issue_id, name, fixed_in in db.query(IssuePackage.issue_id, IssuePackage.name, IssuePackage.fixed_in):
+            packages.setdefault(issue_id, []).append({"name": name, "fixed_in": fixed_in})
+    finally:
+        db.close()
+
+    by_family: Dict[str, Dict[str, int]] = {}
+    resolved = 0
+    t0 = time.perf_counter()
+    for issue_id, cve, os_info in issues:
+        ok = index.resolve(os_info, cve, packages.get(issue_id, [])) is not None
+        family = split_os(os_info)[0] or "unknown"
+        counts = by_family.setdefault(family, {"issues": 0, "resolved": 0})
+        counts["issues"] += 1
+        counts["resolved"] += ok
+        resolved += ok
+    resolve_seconds = time.perf_counter() - t0
+
+    total = len(issues)
+    return {
+        "params": generator.spec(),
+        "issues": total,
+        "resolved": resolved,
+        "llm_calls": total - resolved,
+        "llm_calls_avoided_ratio": round(resolved / total, 4) if total else 0.0,
+        "index_entries": len(index),
+        "ingest_seconds": round(ingest_seconds, 3),
+        "index_load_seconds": round(load_seconds, 4),
+        "resolve_us_per_issue": round(resolve_seconds * 1e6 / total, 2) if total else 0.0,
+        "by_family": by_family
+    }
+
+
+def print_advisory_report(report: Dict[str, Any], log=print):
+    log(
+        f"{report['issues']} issues, {report['resolved']} resolved offline, "
+        f"{report['llm_calls']} need the LLM: {report['llm_calls_avoided_ratio']:.1%} of LLM calls avoided"
+    )
+    log(
+        f"index: {report['index_entries']} entries, loaded in {report['index_load_seconds']}s; "
+        f"resolve {report['resolve_us_per_issue']}us per issue"
+    )
+    for family, counts in sorted(report["by_family"].items()):
+        share = counts["resolved"] / counts["issues"] if counts["issues"] else 0.0
+        log(f"  {family:<10} {counts['resolved']:>7}/{counts['issues']:<7} {share:.1%}")
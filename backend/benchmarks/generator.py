@@ -0,0 +1,221 @@
+"""
+Vuls 扫描结果生成器
+功能：按种子确定性地生成接近真实的 Vuls JSON（主机数、每主机 CVE 数、单/多主机文件布局、描述长度可配置）
+"""
+
+import os
+import json
+import random
+from typing import Any, Dict, List, Tuple
+
+
+# (Family, Release, Kernel)
+OS_RELEASES = [
+    ("ubuntu", "20.04", "5.4.0-150-generic"),
+    ("ubuntu", "22.04", "5.15.0-89-generic"),
+    ("debian", "11", "5.10.0-26-amd64"),
+    ("debian", "12", "6.1.0-13-amd64"),
+    ("centos", "7.9.2009", "3.10.0-1160.el7.x86_64"),
+    ("rocky", "8.8", "4.18.0-477.10.1.el8_8.x86_64"),
+]
+
+PACKAGE_NAMES = [
+    "openssl", "libssl1.1", "openssh-server", "openssh-client", "curl", "libcurl4",
+    "nginx", "apache2", "bash", "sudo", "glibc", "libc6", "zlib1g", "libxml2",
+    "python3", "python3.8", "perl", "git", "vim", "systemd", "libsystemd0", "dbus",
+    "bind9", "postgresql", "mysql-server", "redis-server", "tar", "gzip", "libpng16-16",
+    "libjpeg-turbo8", "libexpat1", "libsqlite3-0", "libgnutls30", "libnss3", "ntp",
+    "linux-image-generic", "linux-headers-generic", "policykit-1", "cups", "samba",
+]
+
+SUMMARY_WORDS = (
+    "a remote attacker could exploit a buffer overflow heap use-after-free integer "
+    "overflow in the parser when processing crafted input leading to denial of service "
+    "arbitrary code execution information disclosure privilege escalation via a "
+    "specially crafted request in the library component of the server daemon package "
+    "kernel memory corruption out-of-bounds read write null pointer dereference"
+).split()
+
+CVSS_VECTORS = [
+    "CVSS:3.1/AV:N/AC:L/PR:N/UI:N/S:U/C:H/I:H/A:H",
+    "CVSS:3.1/AV:N/AC:H/PR:N/UI:R/S:U/C:H/I:N/A:N",
+    "CVSS:3.1/AV:L/AC:L/PR:L/UI:N/S:U/C:H/I:H/A:H",
+    "CVSS:3.1/AV:N/AC:L/PR:N/UI:N/S:U/C:N/I:N/A:H",
+]
+
+
+class VulsFleetGenerator:
+    """
+    合成主机群扫描结果生成器
+
+    相同参数和种子生成的内容逐字节一致，保证不同提交之间的基准可比。
+    """
+
+    def __init__(
+        self,
+        hosts: int = 100,
+        cves_per_host: int = 40,
+        layout: str = "single",
+        hosts_per_file: int = 50,
+        summary_words: int = 40,
+        packages_per_cve: int = 2,
+        unfixed_ratio: float = 0.0,
+        seed: int = 42
+    ):
+        """
+        Args:
+            hosts: 主机数
+            cves_per_host: 每台主机的 CVE 数
+            layout: single（每个文件一台主机）或 multi（每个文件 hosts_per_file 台）
+            hosts_per_file: multi 布局下每个文件的主机数
+            summary_words: 漏洞描述的单词数
+            packages_per_cve: 每个 CVE 影响的包数
+            unfixed_ratio: 尚无修复版本（NotFixedYet）的受影响包比例
+            seed: 随机种子
+        """
+        if layout not in ("single", "multi"):
+            raise ValueError(f"Unknown layout: {layout}")
+
+        self.hosts = hosts
+        self.cves_per_host = cves_per_host
+        self.layout = layout
+        self.hosts_per_file = max(1, hosts_per_file)
+        self.summary_words = summary_words
+        self.packages_per_cve = max(1, packages_per_cve)
+        self.unfixed_ratio = unfixed_ratio
+        self.seed = seed
+
+        # CVE 池按主机数的一定比例生成，多台主机共享同一 CVE（与真实环境一致）
+        pool_size = max(cves_per_host * 3, 50)
+        rng = random.Random(seed)
+        self.cve_pool = [self._make_cve(rng, n) for n in range(pool_size)]
+
+        # 独立的随机序列，unfixed_ratio=0 时生成内容与旧版本一致
+        if unfixed_ratio > 0:
+            fix_rng = random.Random(seed + 7919)
+            for cve in self.cve_pool:
+                cve["packages"] = [
+                    (name, "" if fix_rng.random() < unfixed_ratio else fixed_in)
+                    for name, fixed_in in cve["packages"]
+                ]
+
+    def spec(self) -> Dict[str, Any]:
+        """生成参数（写入基准结果用于比对）"""
+        return {
+            "hosts": self.hosts,
+            "cves_per_host": self.cves_per_host,
+            "layout": self.layout,
+            "hosts_per_file": self.hosts_per_file,
+            "summary_words": self.summary_words,
+            "packages_per_cve": self.packages_per_cve,
+            "unfixed_ratio": self.unfixed_ratio,
+            "seed": self.seed
+        }
+
+    def host(self, index: int) -> Dict[str, Any]:
+        """生成第 index 台主机的扫描结果"""
+        rng = random.Random(self.seed * 1_000_003 + index)
+        family, release, kernel = OS_RELEASES[index % len(OS_RELEASES)]
+        ip = f"10.{(index >> 16) & 255}.{(index >> 8) & 255}.{index & 255}"
+        server_name = f"host-{index:05d}"
+
+        cves = rng.sample(self.cve_pool, min(self.cves_per_host, len(self.cve_pool)))
+        packages: Dict[str, Dict[str, Any]] = {}
+        scanned = {}
+        for cve in cves:
+            affected = []
+            for name, fixed_in in cve["packages"]:
+                if name not in packages:
+                    version = f"{rng.randint(1, 9)}.{rng.randint(0, 20)}.{rng.randint(0, 30)}"
+                    packages[name] = {
+                        "Name": name,
+                        "Version": version,
+                        "Release": f"{rng.randint(1, 5)}ubuntu{rng.randint(0, 9)}",
+                        "NewVersion": version,
+                        "NewRelease": f"{rng.randint(6, 9)}ubuntu{rng.randint(0, 9)}",
+                        "Arch": "amd64",
+                        "Repository": ""
+                    }
+                affected.append({"Name": name, "FixedIn": fixed_in, "NotFixedYet": not fixed_in})
+
+            scanned[cve["id"]] = {
+                "CveID": cve["id"],
+                "Summary": cve["summary"],
+                "Cvss3Score": cve["cvss"],
+                "Cvss3": {"Score": cve["cvss"], "Vector": cve["vector"]},
+                "AffectedPackages": affected,
+                "PublishedDate": cve["published"],
+                "LastModifiedDate": cve["published"],
+                "Confidences": [{"Score": 100, "DetectionMethod": "OvalMatch"}],
+                "CveContents": {
+                    "nvd": [{
+                        "Type": "nvd",
+                        "CveID": cve["id"],
+                        "Title": "",
+                        "Summary": cve["summary"],
+                        "Cvss3Score": cve["cvss"],
+                        "Cvss3Vector": cve["vector"],
+                        "References": [
+                            {"Source": "MISC", "Link": f"https://nvd.nist.gov/vuln/detail/{cve['id']}"}
+                        ]
+                    }]
+                }
+            }
+
+        return {
+            "JSONVersion": 4,
+            "ServerName": server_name,
+            "Family": family,
+            "Release": release,
+            "IPv4Addrs": [ip],
+            "Kernel": {"Release": kernel, "Version": "", "RebootRequired": False},
+            "ScannedAt": "2024-01-01T00:00:00Z",
+            "ScanMode": "fast mode",
+            "Packages": packages,
+            "ScannedCves": scanned
+        }
+
+    def files(self) -> List[Tuple[str, Any]]:
+        """按布局返回 [(文件名, JSON 内容)]"""
+        if self.layout == "single":
+            return [(f"host-{i:05d}.json", self.host(i)) for i in range(self.hosts)]
+
+        files = []
+        for start in range(0, self.hosts, self.hosts_per_file):
+            end = min(start + self.hosts_per_file, self.hosts)
+            content = {f"host-{i:05d}": self.host(i) for i in range(start, end)}
+            files.append((f"fleet-{start // self.hosts_per_file:04d}.json", content))
+        return files
+
+    def write(self, out_dir: str) -> List[str]:
+        """
+        写入结果目录
+
+        Returns:
+            生成的文件路径列表
+        """
+        os.makedirs(out_dir, exist_ok=True)
+        paths = []
+        for filename, content in self.files():
+            path = os.path.join(out_dir, filename)
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(content, f, ensure_ascii=False, indent=2)
+            paths.append(path)
+        return paths
+
+    def _make_cve(self, rng: random.Random, n: int) -> Dict[str, Any]:
+        year = 2018 + n % 7
+        words = [rng.choice(SUMMARY_WORDS) for _ in range(self.summary_words)]
+        summary = " ".join(words).capitalize() + "."
+        names = rng.sample(PACKAGE_NAMES, self.packages_per_cve)
+        return {
+            "id": f"CVE-{year}-{10000 + n}",
+            "summary": summary,
+            "cvss": round(rng.uniform(2.0, 10.0), 1),
+            "vector": rng.choice(CVSS_VECTORS),
+            "published": f"{year}-{1 + n % 12:02d}-{1 + n % 28:02d}T00:00:00Z",
+            "packages": [
+                (name, f"{rng.randint(1, 9)}.{rng.randint(0, 20)}.{rng.randint(0, 30)}-{rng.randint(6, 9)}")
+                for name in names
+            ]
+        }
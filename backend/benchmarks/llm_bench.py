@@ -0,0 +1,186 @@
+"""
+修复命令生成链路基准
+功能：对（模拟）OpenAI 兼容服务并发调用 LLMClient，统计吞吐、延迟分位数和失败数，
+用于测量并发扇出、重试、限流和缓存行为
+"""
+
+import time
+import random
+import asyncio
+from typing import Any, Callable, Dict, List
+
+from benchmarks.generator import VulsFleetGenerator
+from benchmarks.loadtest import percentile
+
+
+def build_requests(generator: VulsFleetGenerator, calls: int, duplicate_ratio: float, seed: int) -> List[Dict[str, Any]]:
+    """
+    从 CVE 池生成调用列表
+
+    Args:
+        generator: 扫描结果生成器（提供 CVE 池）
+        calls: 调用次数
+        duplicate_ratio: 重复 CVE 的比例（模拟多台主机共享同一漏洞）
+        seed: 随机种子
+    """
+    rng = random.Random(seed)
+    pool = generator.cve_pool
+    requests = []
+    for n in range(calls):
+        if requests and rng.random() < duplicate_ratio:
+            requests.append(rng.choice(requests))
+            continue
+        cve = pool[n % len(pool)]
+        requests.append({
+            "cve": cve["id"],
+            "summary": cve["summary"],
+            "package": cve["packages"][0][0],
+            "os": "ubuntu 22.04"
+        })
+    return requests
+
+
+async def run_fanout(llm_client, requests: List[Dict[str, Any]], concurrency: int) -> Dict[str, Any]:
+    """以固定并发调用 LLMClient.generate 并汇总结果（回退到次级提供方的调用计为 degraded）"""
+    from llm_client import LLMGenerationError
+
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    latencies = []
+    failures = 0
+    degraded = 0
+
+    async def call(request: Dict[str, Any]):
+        nonlocal failures, degraded
+        async with semaphore:
+            t0 = time.perf_counter()
+            try:
+                generation = await llm_client.generate(
+                    request["cve"], request["summary"], package=request["package"], os=request["os"]
+                )
+            except LLMGenerationError:
+                failures += 1
+            else:
+                degraded += generation.degraded
+            latencies.append(time.perf_counter() - t0)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(call(request) for request in requests))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "calls": len(requests),
+        "unique_cves": len({request["cve"] for request in requests}),
+        "concurrency": concurrency,
+        "failures": failures,
+        "degraded": degraded,
+        "duration_seconds": round(elapsed, 3),
+        "throughput": round(len(requests) / elapsed, 2) if elapsed > 0 else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "max_ms": round(latencies[-1] * 1000, 2) if latencies else 0.0
+    }
+
+
+def print_fanout(report: Dict[str, Any], log=print):
+    log(
+        f"{report['calls']} calls ({report['unique_cves']} unique CVEs) at concurrency "
+        f"{report['concurrency']} in {report['duration_seconds']}s: {report['throughput']} calls/s, "
+        f"{report['failures']} failed, {report['degraded']} served by fallback"
+    )
+    log(
+        f"latency p50 {report['p50_ms']}ms  p95 {report['p95_ms']}ms  "
+        f"p99 {report['p99_ms']}ms  max {report['max_ms']}ms"
+    )
+    if "coalesced" in report:
+        log(f"coalesced into in-flight calls: {report['coalesced']}")
+    if "providers" in report:
+        for provider in report["providers"]:
+            log(f"provider {provider['name']}: circuit {provider['circuit']}, "
+                f"p50 {provider['latency_p50']}s p95 {provider['latency_p95']}s")
+    if "server" in report:
+        log(f"mock server: {report['server']}")
+
+
+def build_host_items(generator: VulsFleetGenerator, hosts: int) -> List[Dict[str, Any]]:
+    """按主机分组的 CVE 列表（与 /playbook 的一次调用对应）"""
+    groups = []
+    for index in range(min(hosts, generator.hosts)):
+        host = generator.host(index)
+        groups.append({
+            "os": f"{host['Family']} {host['Release']}",
+            "items": [
+                {
+                    "cve": cve_id,
+                    "summary": cve["Summary"],
+                    "package": ", ".join(pkg["Name"] for pkg in cve["AffectedPackages"])
+                }
+                for cve_id, cve in host["ScannedCves"].items()
+            ]
+        })
+    return groups
+
+
+async def run_batch_mode(
+    make_client: Callable[[], Any],
+    groups: List[Dict[str, Any]],
+    batch_size: int,
+    concurrency: int,
+    server_stats: Callable[[], Dict[str, Any]]
+) -> Dict[str, Any]:
+    """
+    以给定批大小为每台主机生成修复命令，统计每个 CVE 的 token 与耗时
+
+    Args:
+        make_client: 创建新 LLMClient（每种模式独立，避免共享单飞/熔断状态）
+        groups: build_host_items 的结果
+        batch_size: 批大小，1 为逐条
+        concurrency: 同时处理的主机数
+        server_stats: 读取模拟服务计数器
+    """
+    llm_client = make_client()
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    host_latencies = []
+    generated = 0
+
+    async def host(group: Dict[str, Any]):
+        nonlocal generated
+        async with semaphore:
+            t0 = time.perf_counter()
+            results = await llm_client.generate_batch(group["items"], group["os"], batch_size=batch_size)
+            host_latencies.append(time.perf_counter() - t0)
+            generated += sum(1 for result in results.values() if not result.degraded)
+
+    before = server_stats()
+    start = time.perf_counter()
+    await asyncio.gather(*(host(group) for group in groups))
+    elapsed = time.perf_counter() - start
+    after = server_stats()
+
+    cves = sum(len(group["items"]) for group in groups)
+    delta = {key: after[key] - before[key] for key in ("requests", "prompt_tokens", "completion_tokens", "malformed")}
+    host_latencies.sort()
+    return {
+        "batch_size": batch_size,
+        "hosts": len(groups),
+        "cves": cves,
+        "generated": generated,
+        "server_requests": delta["requests"],
+        "malformed": delta["malformed"],
+        "prompt_tokens_per_cve": round(delta["prompt_tokens"] / cves, 1),
+        "completion_tokens_per_cve": round(delta["completion_tokens"] / cves, 1),
+        "duration_seconds": round(elapsed, 3),
+        "ms_per_cve": round(elapsed * 1000 / cves, 2),
+        "host_p50_ms": round(percentile(host_latencies, 50) * 1000, 2),
+        "host_p95_ms": round(percentile(host_latencies, 95) * 1000, 2)
+    }
+
+
+def print_batch_comparison(reports: List[Dict[str, Any]], log=print):
+    log(f"{'batch':>5} {'cves':>6} {'ok':>6} {'reqs':>6} {'bad':>4} {'prompt/cve':>11} "
+        f"{'compl/cve':>10} {'ms/cve':>8} {'host p50':>10} {'host p95':>10}")
+    for r in reports:
+        log(f"{r['batch_size']:>5} {r['cves']:>6} {r['generated']:>6} {r['server_requests']:>6} {r['malformed']:>4} "
+            f"{r['prompt_tokens_per_cve']:>11} {r['completion_tokens_per_cve']:>10} {r['ms_per_cve']:>8} "
+            f"{r['host_p50_ms']:>8}ms {r['host_p95_ms']:>8}ms")
@@ -0,0 +1,231 @@
+"""
+HTTP 压测
+功能：在进程内启动应用（uvicorn + 合成数据库），以可配置并发驱动混合流量，
+统计各路由吞吐与 p50/p95/p99，并按 SLO 容差文件判定是否回归
+
+导入本模块前需设置 DATABASE_URL / SCAN_RESULTS_DIR 指向临时目录（__main__ 中完成）。
+"""
+
+import time
+import json
+import random
+import asyncio
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+import yaml
+
+from benchmarks.server import BackgroundServer
+
+
+# 默认流量配比（权重）
+DEFAULT_MIX = {"hosts": 40, "issues": 40, "playbook": 10, "parse": 10}
+
+# 流量类型对应的统计路由
+ROUTES = {
+    "hosts": "/hosts",
+    "issues": "/issues",
+    "playbook": "/playbook",
+    "parse": "/scan/parse",
+}
+
+
+class MockLLMClient:
+    """模拟 LLM：固定延迟后返回模板结果，使 /playbook 的耗时可控且不依赖外部服务"""
+
+    def __init__(self, inner, latency: float = 0.2):
+        self.inner = inner
+        self.latency = latency
+
+    async def generate_fix_command(self, cve: str, summary: str, **kwargs) -> str:
+        await asyncio.sleep(self.latency)
+        return await self.inner.generate_fix_command(cve, summary, **kwargs)
+
+
+def parse_mix(value: Optional[str]) -> Dict[str, int]:
+    """解析 hosts=40,issues=40,playbook=10,parse=10 形式的配比"""
+    if not value:
+        return dict(DEFAULT_MIX)
+    mix = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in ROUTES:
+            raise ValueError(f"Unknown traffic type: {name}")
+        mix[name] = int(weight)
+    return mix
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """最近秩百分位数"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, int(round(pct / 100.0 * len(sorted_values) + 0.5)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+class LoadTest:
+    """进程内压测"""
+
+    def __init__(
+        self,
+        app_module,
+        host_count: int,
+        concurrency: int = 16,
+        duration: float = 20.0,
+        mix: Optional[Dict[str, int]] = None,
+        llm_latency: float = 0.2,
+        seed: int = 42
+    ):
+        self.app_module = app_module
+        self.host_count = max(1, host_count)
+        self.concurrency = max(1, concurrency)
+        self.duration = duration
+        self.mix = mix or dict(DEFAULT_MIX)
+        self.seed = seed
+        self.latencies: Dict[str, List[float]] = {route: [] for route in ROUTES.values()}
+        self.errors: Dict[str, int] = {route: 0 for route in ROUTES.values()}
+
+        primary = app_module.llm_client.providers[0]
+        primary.client = MockLLMClient(primary.client, llm_latency)
+
+    def run(self) -> Dict[str, Any]:
+        """启动服务、压测并返回报告"""
+        with BackgroundServer(self.app_module.app) as base_url:
+            elapsed = asyncio.run(self._drive(base_url))
+        return self.report(elapsed)
+
+    async def _drive(self, base_url: str) -> float:
+        limits = httpx.Limits(max_connections=self.concurrency, max_keepalive_connections=self.concurrency)
+        async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60.0) as client:
+            deadline = time.perf_counter() + self.duration
+            start = time.perf_counter()
+            await asyncio.gather(*(
+                self._worker(client, deadline, random.Random(self.seed + n))
+                for n in range(self.concurrency)
+            ))
+            return time.perf_counter() - start
+
+    async def _worker(self, client: httpx.AsyncClient, deadline: float, rng: random.Random):
+        kinds = list(self.mix)
+        weights = [self.mix[kind] for kind in kinds]
+        while time.perf_counter() < deadline:
+            kind = rng.choices(kinds, weights)[0]
+            method, url, kwargs = self._request(kind, rng)
+            t0 = time.perf_counter()
+            try:
+                response = await client.request(method, url, **kwargs)
+                ok = response.status_code < 500
+            except httpx.HTTPError:
+                ok = False
+            route = ROUTES[kind]
+            self.latencies[route].append(time.perf_counter() - t0)
+            if not ok:
+                self.errors[route] += 1
+
+    def _request(self, kind: str, rng: random.Random) -> Tuple[str, str, Dict[str, Any]]:
+        if kind == "hosts":
+            return "GET", "/hosts", {}
+        if kind == "issues":
+            params = {}
+            if rng.random() < 0.5:
+                params["host_id"] = rng.randint(1, self.host_count)
+            if rng.random() < 0.5:
+                params["cvss_min"] = rng.choice([4.0, 7.0, 9.0])
+            if rng.random() < 0.3:
+                params["status"] = "open"
+            return "GET", "/issues", {"params": params}
+        if kind == "playbook":
+            body = {"host_id": rng.randint(1, self.host_count), "cvss_threshold": rng.choice([7.0, 9.0])}
+            return "POST", "/playbook", {"json": body}
+        return "POST", "/scan/parse", {}
+
+    def report(self, elapsed: float) -> Dict[str, Any]:
+        routes = {}
+        total = 0
+        for route, values in self.latencies.items():
+            if not values:
+                continue
+            values = sorted(values)
+            total += len(values)
+            routes[route] = {
+                "requests": len(values),
+                "errors": self.errors[route],
+                "error_rate": round(self.errors[route] / len(values), 4),
+                "throughput": round(len(values) / elapsed, 2),
+                "p50_ms": round(percentile(values, 50) * 1000, 2),
+                "p95_ms": round(percentile(values, 95) * 1000, 2),
+                "p99_ms": round(percentile(values, 99) * 1000, 2),
+                "max_ms": round(values[-1] * 1000, 2)
+            }
+        return {
+            "duration_seconds": round(elapsed, 2),
+            "concurrency": self.concurrency,
+            "mix": self.mix,
+            "requests": total,
+            "throughput": round(total / elapsed, 2) if elapsed > 0 else 0.0,
+            "routes": routes
+        }
+
+
+def print_report(report: Dict[str, Any], log=print):
+    log(
+        f"{report['requests']} requests in {report['duration_seconds']}s "
+        f"at concurrency {report['concurrency']}: {report['throughput']} req/s"
+    )
+    log(f"{'route':<14} {'reqs':>7} {'err':>5} {'req/s':>8} {'p50':>9} {'p95':>9} {'p99':>9} {'max':>9}")
+    for route, stats in report["routes"].items():
+        log(
+            f"{route:<14} {stats['requests']:>7} {stats['errors']:>5} {stats['throughput']:>8} "
+            f"{stats['p50_ms']:>7}ms {stats['p95_ms']:>7}ms {stats['p99_ms']:>7}ms {stats['max_ms']:>7}ms"
+        )
+
+
+def check_slo(
+    report: Dict[str, Any],
+    slo_path: str,
+    baseline: Optional[Dict[str, Any]] = None
+) -> List[str]:
+    """
+    按容差文件检查报告
+
+    Args:
+        report: 本次压测报告
+        slo_path: SLO 容差文件（YAML）
+        baseline: 基线报告；给出时同时检查相对基线的退化比例
+
+    Returns:
+        违反项列表，为空表示通过
+    """
+    with open(slo_path, "r", encoding="utf-8") as f:
+        slo = yaml.safe_load(f) or {}
+
+    violations = []
+    if report["throughput"] < slo.get("min_throughput", 0):
+        violations.append(f"throughput {report['throughput']} req/s < {slo['min_throughput']}")
+
+    max_error_rate = slo.get("max_error_rate")
+    tolerance = slo.get("regression_tolerance")
+    for route, stats in report["routes"].items():
+        if max_error_rate is not None and stats["error_rate"] > max_error_rate:
+            violations.append(f"{route} error rate {stats['error_rate']} > {max_error_rate}")
+
+        for key, limit in (slo.get("routes", {}).get(route) or {}).items():
+            value = stats.get(f"{key}_ms")
+            if value is not None and value > limit:
+                violations.append(f"{route} {key} {value}ms > {limit}ms")
+
+        base = (baseline or {}).get("routes", {}).get(route)
+        if base and tolerance is not None:
+            for key in ("p50_ms", "p95_ms", "p99_ms"):
+                if base[key] > 0 and stats[key] > base[key] * (1 + tolerance):
+                    violations.append(
+                        f"{route} {key[:-3]} {stats[key]}ms regressed more than "
+                        f"{tolerance:.0%} from baseline {base[key]}ms"
+                    )
+    return violations
+
+
+def save_report(report: Dict[str, Any], path: str):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
@@ -0,0 +1,230 @@
+"""
+模拟 LLM 服务
+功能：本地 OpenAI 兼容接口（/v1/chat/completions），延迟分布、错误率、429 限流比例、
+生成速度（token/s）和并发上限均可配置，输出按提示词确定性生成，用于离线测量修复命令生成链路；
+请求 stream=true 时按 SSE 逐词返回 chat.completion.chunk
+"""
+
+import re
+import json
+import math
+import time
+import random
+import asyncio
+import hashlib
+from typing import Dict, Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from starlette.requests import ClientDisconnect
+
+
+PACKAGE_RE = re.compile(r"(?:受影响包|包):\s*([^\s,:]+)")
+CVE_RE = re.compile(r"CVE-\d{4}-\d+")
+
+
+class MockLLMConfig:
+    """模拟服务参数"""
+
+    def __init__(
+        self,
+        latency_ms: float = 300.0,
+        latency_distribution: str = "lognormal",
+        latency_sigma: float = 0.5,
+        error_rate: float = 0.0,
+        rate_limit_rate: float = 0.0,
+        retry_after: float = 1.0,
+        tokens_per_second: float = 0.0,
+        max_concurrency: int = 0,
+        malformed_rate: float = 0.0,
+        seed: int = 42
+    ):
+        """
+        Args:
+            latency_ms: 基础延迟（fixed 为固定值，uniform 为均值，lognormal 为中位数）
+            latency_distribution: fixed / uniform / lognormal
+            latency_sigma: lognormal 的 sigma，uniform 时为相对抖动幅度
+            error_rate: 返回 500 的比例
+            rate_limit_rate: 返回 429 的比例
+            retry_after: 429 响应的 Retry-After（秒）
+            tokens_per_second: 生成速度，>0 时按输出 token 数追加延迟
+            max_concurrency: 并发上限，超出时返回 429（0 表示不限制）
+            malformed_rate: 批量请求返回截断 JSON 的比例
+            seed: 随机种子
+        """
+        if latency_distribution not in ("fixed", "uniform", "lognormal"):
+            raise ValueError(f"Unknown latency distribution: {latency_distribution}")
+
+        self.latency_ms = latency_ms
+        self.latency_distribution = latency_distribution
+        self.latency_sigma = latency_sigma
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.tokens_per_second = tokens_per_second
+        self.max_concurrency = max_concurrency
+        self.malformed_rate = malformed_rate
+        self.seed = seed
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算 token 数（约 4 个字符一个 token，中文按字计）"""
+    ascii_chars = sum(1 for ch in text if ord(ch) < 128)
+    return max(1, ascii_chars // 4 + (len(text) - ascii_chars))
+
+
+def fix_command_for(prompt: str) -> str:
+    """按提示词中的包名生成确定的修复命令"""
+    match = PACKAGE_RE.search(prompt)
+    if match:
+        package = match.group(1)
+        return f"apt-get update && apt-get install --only-upgrade -y {package}"
+    cve = CVE_RE.search(prompt)
+    return f"apt-get update && apt-get upgrade -y  # {cve.group(0) if cve else 'unknown'}"
+
+
+def is_batch_prompt(prompt: str) -> bool:
+    """是否为要求 JSON 输出的多 CVE 批量提示词"""
+    return '"fixes"' in prompt
+
+
+def batch_fixes_for(prompt: str) -> str:
+    """按批量提示词中每个 CVE 段落生成 JSON 响应"""
+    fixes = []
+    matches = list(CVE_RE.finditer(prompt))
+    for n, match in enumerate(matches):
+        end = matches[n + 1].start() if n + 1 < len(matches) else len(prompt)
+        segment = prompt[match.start():end]
+        fixes.append({"cve": match.group(0), "command": fix_command_for(segment)})
+    return json.dumps({"fixes": fixes}, ensure_ascii=False)
+
+
+def create_mock_app(config: Optional[MockLLMConfig] = None) -> FastAPI:
+    """创建模拟服务应用"""
+    config = config or MockLLMConfig()
+    app = FastAPI(title="FixPilot Mock LLM")
+    rng = random.Random(config.seed)
+    state = {
+        "in_flight": 0, "requests": 0, "errors": 0, "rate_limited": 0, "malformed": 0,
+        "prompt_tokens": 0, "completion_tokens": 0
+    }
+
+    def sample_latency() -> float:
+        base = config.latency_ms / 1000.0
+        if config.latency_distribution == "fixed":
+            return base
+        if config.latency_distribution == "uniform":
+            spread = base * config.latency_sigma
+            return max(0.0, rng.uniform(base - spread, base + spread))
+        return base * math.exp(rng.gauss(0.0, config.latency_sigma))
+
+    def error(status: int, message: str, error_type: str, headers: Dict[str, str] = None) -> JSONResponse:
+        return JSONResponse(
+            {"error": {"message": message, "type": error_type, "code": None}},
+            status_code=status,
+            headers=headers
+        )
+
+    @app.get("/v1/models")
+    async def list_models():
+        return {"object": "list", "data": [{"id": "mock-gpt", "object": "model", "owned_by": "fixpilot"}]}
+
+    @app.get("/stats")
+    async def get_stats():
+        return state
+
+    async def stream_chunks(completion_id: str, model: str, content: str):
+        try:
+            pieces = re.findall(r"\S+\s*", content) or [content]
+            per_piece = estimate_tokens(content) / config.tokens_per_second / len(pieces) if config.tokens_per_second > 0 else 0.0
+            for n, piece in enumerate(pieces + [None]):
+                chunk = {
+                    "id": completion_id,
+                    "object": "chat.completion.chunk",
+                    "created": int(time.time()),
+                    "model": model,
+                    "choices": [{
+                        "index": 0,
+                        "delta": {"content": piece} if piece is not None else {},
+                        "finish_reason": "stop" if piece is None else None
+                    }]
+                }
+                yield f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+                if piece is not None and per_piece:
+                    await asyncio.sleep(per_piece)
+            yield "data: [DONE]\n\n"
+        finally:
+            state["in_flight"] -= 1
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        try:
+            body = await request.json()
+        except ClientDisconnect:
+            # 客户端已取消（例如对冲请求的败者）
+            return Response(status_code=499)
+        state["requests"] += 1
+
+        if config.max_concurrency and state["in_flight"] >= config.max_concurrency:
+            state["rate_limited"] += 1
+            return error(429, "Too many concurrent requests", "rate_limit_exceeded",
+                         {"Retry-After": str(config.retry_after)})
+        roll = rng.random()
+        if roll < config.rate_limit_rate:
+            state["rate_limited"] += 1
+            return error(429, "Rate limit reached", "rate_limit_exceeded",
+                         {"Retry-After": str(config.retry_after)})
+
+        state["in_flight"] += 1
+        try:
+            messages = body.get("messages") or []
+            prompt = "\n".join(str(message.get("content", "")) for message in messages)
+            if is_batch_prompt(prompt):
+                content = batch_fixes_for(prompt)
+                if rng.random() < config.malformed_rate:
+                    state["malformed"] += 1
+                    content = content[:len(content) // 2]
+            else:
+                content = fix_command_for(prompt)
+            prompt_tokens = estimate_tokens(prompt)
+            completion_tokens = estimate_tokens(content)
+
+            delay = sample_latency()
+            if config.tokens_per_second > 0 and not body.get("stream"):
+                delay += completion_tokens / config.tokens_per_second
+            await asyncio.sleep(delay)
+
+            if roll < config.rate_limit_rate + config.error_rate:
+                state["errors"] += 1
+                return error(500, "The server had an error while processing your request", "server_error")
+
+            state["prompt_tokens"] += prompt_tokens
+            state["completion_tokens"] += completion_tokens
+            digest = hashlib.sha1(prompt.encode("utf-8")).hexdigest()[:24]
+            if body.get("stream"):
+                # 首个 token 之前的延迟已计入，之后按生成速度逐词输出；流结束前仍计入并发
+                state["in_flight"] += 1
+                return StreamingResponse(
+                    stream_chunks(f"chatcmpl-{digest}", body.get("model", "mock-gpt"), content),
+                    media_type="text/event-stream"
+                )
+            return {
+                "id": f"chatcmpl-{digest}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": body.get("model", "mock-gpt"),
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": content},
+                    "finish_reason": "stop"
+                }],
+                "usage": {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": completion_tokens,
+                    "total_tokens": prompt_tokens + completion_tokens
+                }
+            }
+        finally:
+            state["in_flight"] -= 1
+
+    return app
@@ -0,0 +1,108 @@
+"""
+列表接口响应体积与序列化开销
+功能：把合成主机群入库后，对 /issues 的全量响应体比较 ORM + Pydantic 序列化与按列查询 + orjson 序列化，
+以及 identity / gzip / br 编码下的传输字节数和服务端 CPU 时间（均折算为每 10 万条漏洞）
+
+导入本模块前需设置 DATABASE_URL 指向临时数据库（__main__ 中完成）。
+"""
+
+import time
+from typing import Any, Callable, Dict, List
+
+from benchmarks.generator import VulsFleetGenerator
+
+PER_ISSUES = 100_000
+
+
+def _cpu_seconds(func: Callable[[], Any], repeat: int):
+    """重复运行取最小 CPU 时间（process_time，含所有线程），返回 (秒, 最后一次结果)"""
+    best, result = None, None
+    for _ in range(repeat):
+        started = time.process_time()
+        result = func()
+        elapsed = time.process_time() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def payload_report(generator: VulsFleetGenerator, results_dir: str, repeat: int = 5) -> Dict[str, Any]:
+    """
+    生成数据、入库，测量各序列化方式与编码的字节数和 CPU 时间
+
+    Args:
+        generator: 扫描结果生成器
+        results_dir: 结果文件输出目录
+        repeat: 每项测量的重复次数（取最小值）
+    """
+    from pydantic import TypeAdapter
+    from sqlalchemy import select
+
+    from models import SessionLocal, Base, engine, Issue
+    from parser import VulsParser
+    from ingest import IngestPipeline
+    from responses import BROTLI_AVAILABLE, ORJSON_AVAILABLE, CompressionMiddleware, rows_json
+    from app import ISSUE_COLUMNS, IssueResponse
+
+    Base.metadata.create_all(bind=engine)
+    IngestPipeline(SessionLocal, VulsParser()).run(generator.write(results_dir), force=True)
+
+    adapter = TypeAdapter(List[IssueResponse])
+    db = SessionLocal()
+    try:
+        def pydantic_body() -> bytes:
+            # 改造前的 /issues：构建 ORM 对象，逐条校验后编码
+            db.expunge_all()
+            return adapter.dump_json(adapter.validate_python(db.query(Issue).all(), from_attributes=True))
+
+        def fast_body() -> bytes:
+            return rows_json(db.execute(select(*ISSUE_COLUMNS)))
+
+        pydantic_seconds, pydantic_bytes = _cpu_seconds(pydantic_body, repeat)
+        fast_seconds, fast_bytes = _cpu_seconds(fast_body, repeat)
+        issues = db.query(Issue).count()
+    finally:
+        db.close()
+
+    scale = PER_ISSUES / issues if issues else 0.0
+    compressor = CompressionMiddleware(app=None)
+    variants = [
+        {"serializer": "pydantic", "encoding": "identity", "bytes": len(pydantic_bytes),
+         "serialize_seconds": pydantic_seconds, "compress_seconds": 0.0},
+        {"serializer": "orjson" if ORJSON_AVAILABLE else "json", "encoding": "identity", "bytes": len(fast_bytes),
+         "serialize_seconds": fast_seconds, "compress_seconds": 0.0},
+    ]
+    for encoding in ["gzip"] + (["br"] if BROTLI_AVAILABLE else []):
+        compress_seconds, compressed = _cpu_seconds(lambda: compressor.compress(fast_bytes, encoding), repeat)
+        variants.append({
+            "serializer": variants[1]["serializer"], "encoding": encoding, "bytes": len(compressed),
+            "serialize_seconds": fast_seconds, "compress_seconds": compress_seconds
+        })
+
+    for variant in variants:
+        cpu = variant["serialize_seconds"] + variant["compress_seconds"]
+        variant["bytes_per_100k"] = int(variant["bytes"] * scale)
+        variant["serialize_ms_per_100k"] = round(variant["serialize_seconds"] * scale * 1000, 1)
+        variant["compress_ms_per_100k"] = round(variant["compress_seconds"] * scale * 1000, 1)
+        variant["cpu_ms_per_100k"] = round(cpu * scale * 1000, 1)
+
+    return {
+        "issues": issues,
+        "identical_output": pydantic_bytes == fast_bytes,
+        "gzip_level": compressor.gzip_level,
+        "brotli_quality": compressor.brotli_quality if BROTLI_AVAILABLE else None,
+        "variants": variants
+    }
+
+
+def print_payload_report(report: Dict[str, Any], log=print):
+    log(
+        f"/issues with {report['issues']} issues (figures per {PER_ISSUES:,} issues); "
+        f"fast path output identical to pydantic: {report['identical_output']}"
+    )
+    log(f"{'serializer':<10} {'encoding':<9} {'MB on wire':>10} {'serialize ms':>13} {'compress ms':>12} {'CPU ms':>9}")
+    for variant in report["variants"]:
+        log(
+            f"{variant['serializer']:<10} {variant['encoding']:<9} "
+            f"{variant['bytes_per_100k'] / 1e6:>10.2f} {variant['serialize_ms_per_100k']:>13.1f} "
+            f"{variant['compress_ms_per_100k']:>12.1f} {variant['cpu_ms_per_100k']:>9.1f}"
+        )
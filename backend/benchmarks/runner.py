@@ -0,0 +1,204 @@
+"""
+基准运行器
+功能：asv 风格的计时（预热 + 多轮重复，取最小值/中位数），结果连同环境信息保存为 JSON，并支持两次结果对比
+"""
+
+import os
+import gc
+import json
+import time
+import platform
+import statistics
+import subprocess
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+
+class Benchmark:
+    """单个基准：setup 返回的状态传给 func，计时只覆盖 func"""
+
+    def __init__(
+        self,
+        name: str,
+        func: Callable[[Any], Any],
+        setup: Optional[Callable[[], Any]] = None,
+        teardown: Optional[Callable[[Any], None]] = None,
+        repeat: int = 5,
+        number: int = 1,
+        unit: Optional[str] = None,
+        units: Optional[Callable[[Any], float]] = None
+    ):
+        """
+        Args:
+            name: 基准名称（suite.case）
+            func: 被计时的函数，参数为 setup 的返回值
+            setup: 每轮计时前调用（不计时）
+            teardown: 每轮计时后调用（不计时）
+            repeat: 重复轮数
+            number: 每轮调用 func 的次数
+            unit: 吞吐量单位（如 hosts），配合 units 计算每秒处理量
+            units: 由 setup 状态计算每次调用处理的单位数
+        """
+        self.name = name
+        self.func = func
+        self.setup = setup
+        self.teardown = teardown
+        self.repeat = max(1, repeat)
+        self.number = max(1, number)
+        self.unit = unit
+        self.units = units
+
+    def run(self) -> Dict[str, Any]:
+        # 预热一轮，排除首次导入、模板编译等一次性开销
+        self._run_once()
+
+        timings = []
+        units = None
+        for _ in range(self.repeat):
+            elapsed, units = self._run_once()
+            timings.append(elapsed / self.number)
+
+        result = {
+            "name": self.name,
+            "repeat": self.repeat,
+            "number": self.number,
+            "min": min(timings),
+            "median": statistics.median(timings),
+            "mean": statistics.fmean(timings),
+            "stdev": statistics.stdev(timings) if len(timings) > 1 else 0.0,
+            "timings": timings
+        }
+        if self.unit and units:
+            result["unit"] = self.unit
+            result["units_per_call"] = units
+            result["throughput"] = units / result["median"] if result["median"] > 0 else None
+        return result
+
+    def _run_once(self):
+        state = self.setup() if self.setup else None
+        units = self.units(state) if self.units else None
+
+        gc_enabled = gc.isenabled()
+        gc.collect()
+        gc.disable()
+        try:
+            start = time.perf_counter()
+            for _ in range(self.number):
+                self.func(state)
+            elapsed = time.perf_counter() - start
+        finally:
+            if gc_enabled:
+                gc.enable()
+            if self.teardown:
+                self.teardown(state)
+        return elapsed, units
+
+
+def environment_info() -> Dict[str, Any]:
+    """运行环境（提交号、Python、平台），用于判断两次结果是否可比"""
+    def git(*args) -> Optional[str]:
+        try:
+            return subprocess.check_output(
+                ["git", *args], stderr=subprocess.DEVNULL, text=True
+            ).strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    return {
+        "commit": git("rev-parse", "--short", "HEAD"),
+        "dirty": bool(git("status", "--porcelain", "--untracked-files=no")),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "timestamp": datetime.utcnow().isoformat()
+    }
+
+
+def run_benchmarks(
+    benchmarks: List[Benchmark],
+    pattern: Optional[str] = None,
+    log: Callable[[str], None] = print
+) -> List[Dict[str, Any]]:
+    """运行名称包含 pattern 的基准"""
+    results = []
+    for benchmark in benchmarks:
+        if pattern and pattern not in benchmark.name:
+            continue
+        result = benchmark.run()
+        results.append(result)
+
+        line = f"{benchmark.name:<40} median {format_seconds(result['median']):>10}  min {format_seconds(result['min']):>10}"
+        if result.get("throughput"):
+            line += f"  {result['throughput']:,.1f} {result['unit']}/s"
+        log(line)
+    return results
+
+
+def save_results(results: List[Dict[str, Any]], params: Dict[str, Any], out_dir: str) -> str:
+    """保存结果为 JSON，文件名含时间和提交号"""
+    env = environment_info()
+    os.makedirs(out_dir, exist_ok=True)
+    stamp = datetime.utcnow().strftime("%Y%m%dT%H%M%S")
+    path = os.path.join(out_dir, f"{stamp}-{env['commit'] or 'nogit'}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(
+            {"environment": env, "params": params, "benchmarks": {r["name"]: r for r in results}},
+            f, ensure_ascii=False, indent=2
+        )
+    return path
+
+
+def compare_results(
+    baseline_path: str,
+    current_path: str,
+    threshold: float = 0.10,
+    log: Callable[[str], None] = print
+) -> int:
+    """
+    对比两次结果的中位数
+
+    Args:
+        baseline_path: 基线结果文件
+        current_path: 当前结果文件
+        threshold: 变慢超过该比例视为回归
+
+    Returns:
+        回归的基准数
+    """
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    with open(current_path, "r", encoding="utf-8") as f:
+        current = json.load(f)
+
+    if baseline.get("params") != current.get("params"):
+        log("WARNING: benchmark parameters differ, results may not be comparable")
+
+    regressions = 0
+    log(f"{'benchmark':<40} {'baseline':>10} {'current':>10} {'ratio':>7}")
+    for name, result in current["benchmarks"].items():
+        base = baseline["benchmarks"].get(name)
+        if base is None:
+            log(f"{name:<40} {'-':>10} {format_seconds(result['median']):>10}    new")
+            continue
+
+        ratio = result["median"] / base["median"] if base["median"] > 0 else float("inf")
+        mark = ""
+        if ratio > 1 + threshold:
+            mark = "  REGRESSION"
+            regressions += 1
+        elif ratio < 1 - threshold:
+            mark = "  improved"
+        log(
+            f"{name:<40} {format_seconds(base['median']):>10} "
+            f"{format_seconds(result['median']):>10} {ratio:>6.2f}x{mark}"
+        )
+    return regressions
+
+
+def format_seconds(seconds: float) -> str:
+    if seconds >= 1:
+        return f"{seconds:.3f}s"
+    if seconds >= 1e-3:
+        return f"{seconds * 1e3:.2f}ms"
+    return f"{seconds * 1e6:.1f}us"
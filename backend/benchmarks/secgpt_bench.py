@@ -0,0 +1,158 @@
+"""
+SecGPT 本地推理基准
+功能：按推理模式（fp32 基线、bounded 解码、int8 量化、前缀 KV 复用）分别加载模型，
+测量加载耗时、常驻内存（RSS）和单条生成延迟
+
+每种模式在独立子进程中运行（python -m benchmarks secgpt --child MODE），
+内存峰值和 torch 线程设置互不影响。需要安装 transformers 和 torch。
+"""
+
+import os
+import sys
+import json
+import time
+import subprocess
+from typing import Any, Dict, List, Optional
+
+from benchmarks.generator import VulsFleetGenerator
+from benchmarks.loadtest import percentile
+
+
+# 模式 -> SecGPTClient 参数；fp32 与原实现一致
+SECGPT_MODES = {
+    "fp32": {"quantize": "none", "max_new_tokens": 200, "stop": False, "prefix_cache": False},
+    "fp32-bounded": {"quantize": "none", "max_new_tokens": 64, "stop": True, "prefix_cache": False},
+    "int8-bounded": {"quantize": "int8", "max_new_tokens": 64, "stop": True, "prefix_cache": False},
+    "int8-bounded-prefix": {"quantize": "int8", "max_new_tokens": 64, "stop": True, "prefix_cache": True},
+}
+
+
+def rss_mb() -> Dict[str, float]:
+    """当前进程的常驻内存和峰值（MB），读取 /proc/self/status"""
+    values = {"rss_mb": 0.0, "peak_rss_mb": 0.0}
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    values["rss_mb"] = round(int(line.split()[1]) / 1024, 1)
+                elif line.startswith("VmHWM:"):
+                    values["peak_rss_mb"] = round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        import resource
+        values["peak_rss_mb"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    return values
+
+
+def build_prompts(generator: VulsFleetGenerator, count: int) -> List[Dict[str, str]]:
+    """从合成主机群取 count 条不重复的 CVE"""
+    prompts = []
+    seen = set()
+    for index in range(generator.hosts):
+        host = generator.host(index)
+        for cve_id, cve in host["ScannedCves"].items():
+            if cve_id in seen:
+                continue
+            seen.add(cve_id)
+            prompts.append({
+                "cve": cve_id,
+                "summary": cve["Summary"],
+                "package": ", ".join(pkg["Name"] for pkg in cve["AffectedPackages"]),
+                "os": f"{host['Family']} {host['Release']}"
+            })
+            if len(prompts) >= count:
+                return prompts
+    return prompts
+
+
+def run_mode(mode: str, prompts: List[Dict[str, str]], model_path: Optional[str], threads: int) -> Dict[str, Any]:
+    """在当前进程中加载一种模式的模型并逐条生成"""
+    from llm_client import SecGPTClient
+    from metrics import LLM_TOKENS
+
+    baseline = rss_mb()
+    t0 = time.perf_counter()
+    client = SecGPTClient(model_path=model_path, device="cpu", threads=threads, **SECGPT_MODES[mode])
+    load_seconds = time.perf_counter() - t0
+    loaded = rss_mb()
+
+    # 预热一次（首次调用包含内核初始化等开销）
+    client._generate_sync(client._build_prompt(**prompts[0]))
+
+    completion_tokens = LLM_TOKENS.labels("secgpt", "completion")
+    tokens_before = completion_tokens.value
+    latencies = []
+    for prompt in prompts:
+        t0 = time.perf_counter()
+        client._generate_sync(client._build_prompt(**prompt))
+        latencies.append(time.perf_counter() - t0)
+    generated = completion_tokens.value - tokens_before
+    total = sum(latencies)
+
+    return {
+        "mode": mode,
+        "config": SECGPT_MODES[mode],
+        "threads": threads,
+        "prompts": len(prompts),
+        "load_seconds": round(load_seconds, 2),
+        "base_rss_mb": baseline["rss_mb"],
+        "model_rss_mb": loaded["rss_mb"],
+        "peak_rss_mb": rss_mb()["peak_rss_mb"],
+        "latency_p50": round(percentile(latencies, 50), 3),
+        "latency_p95": round(percentile(latencies, 95), 3),
+        "latency_avg": round(total / len(latencies), 3) if latencies else 0.0,
+        "completion_tokens_avg": round(generated / len(prompts), 1) if prompts else 0.0,
+        "ms_per_token": round(total * 1000 / generated, 2) if generated else 0.0
+    }
+
+
+def run_secgpt_modes(
+    modes: List[str],
+    prompts: int,
+    model_path: Optional[str],
+    threads: int,
+    extra_args: List[str],
+    log=print
+) -> List[Dict[str, Any]]:
+    """
+    依次在子进程中运行各模式
+
+    Args:
+        modes: SECGPT_MODES 中的模式名
+        prompts: 每种模式生成的条数
+        model_path: 模型路径，None 时用 SECGPT_MODEL_PATH
+        threads: torch intra-op 线程数，0 为 torch 默认
+        extra_args: 传给子进程的生成器参数（保证各模式使用相同的 CVE）
+    """
+    reports = []
+    backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    for mode in modes:
+        command = [
+            sys.executable, "-m", "benchmarks", "secgpt", "--child", mode,
+            "--prompts", str(prompts), "--threads", str(threads), *extra_args
+        ]
+        if model_path:
+            command += ["--model-path", model_path]
+        log(f"running {mode} ...")
+        completed = subprocess.run(command, cwd=backend_dir, capture_output=True, text=True)
+        if completed.returncode != 0:
+            log(f"  {mode} failed: {completed.stderr.strip().splitlines()[-1:]}")
+            continue
+        reports.append(json.loads(completed.stdout.strip().splitlines()[-1]))
+    return reports
+
+
+def print_secgpt_comparison(reports: List[Dict[str, Any]], log=print):
+    log(f"{'mode':<22} {'load s':>7} {'RSS MB':>8} {'peak MB':>8} {'p50 s':>7} {'p95 s':>7} {'tokens':>7} {'ms/tok':>7}")
+    for report in reports:
+        log(
+            f"{report['mode']:<22} {report['load_seconds']:>7} {report['model_rss_mb']:>8} "
+            f"{report['peak_rss_mb']:>8} {report['latency_p50']:>7} {report['latency_p95']:>7} "
+            f"{report['completion_tokens_avg']:>7} {report['ms_per_token']:>7}"
+        )
+    if len(reports) > 1 and reports[0]["latency_p50"]:
+        base = reports[0]
+        for report in reports[1:]:
+            log(
+                f"{report['mode']}: p50 {base['latency_p50'] / report['latency_p50']:.2f}x faster, "
+                f"RSS {report['model_rss_mb'] - base['model_rss_mb']:+.0f} MB vs {base['mode']}"
+            )
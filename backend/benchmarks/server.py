@@ -0,0 +1,63 @@
+"""
+后台服务
+功能：在后台线程中用 uvicorn 启动 ASGI 应用（随机端口），供压测和模拟 LLM 服务使用
+"""
+
+import time
+import socket
+import threading
+
+
+class BackgroundServer:
+    """
+    后台 uvicorn 服务
+
+    用法：
+        with BackgroundServer(app) as base_url:
+            ...
+    """
+
+    def __init__(self, app, host: str = "127.0.0.1", port: int = 0):
+        self.app = app
+        self.host = host
+        self.port = port
+        self.base_url = None
+        self._server = None
+        self._thread = None
+        self._sock = None
+
+    def start(self) -> str:
+        import uvicorn
+
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._sock.bind((self.host, self.port))
+        self.port = self._sock.getsockname()[1]
+
+        config = uvicorn.Config(self.app, log_level="warning", access_log=False)
+        self._server = uvicorn.Server(config)
+        self._thread = threading.Thread(
+            target=self._server.run, kwargs={"sockets": [self._sock]}, daemon=True
+        )
+        self._thread.start()
+        while not self._server.started:
+            if not self._thread.is_alive():
+                raise RuntimeError("Background server failed to start")
+            time.sleep(0.05)
+
+        self.base_url = f"http://{self.host}:{self.port}"
+        return self.base_url
+
+    def stop(self):
+        if self._server is not None:
+            self._server.should_exit = True
+            self._thread.join(timeout=10)
+            self._sock.close()
+            self._server = None
+
+    def __enter__(self) -> str:
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+        return False
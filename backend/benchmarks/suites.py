@@ -0,0 +1,190 @@
+"""
+基准套件
+功能：解析、入库、/issues 查询、批量导出、Playbook 渲染、模板 LLM 客户端、规则引擎分类的基准
+
+导入本模块前需设置 DATABASE_URL 指向临时数据库（__main__ 中完成），避免写入开发库。
+"""
+
+import os
+import asyncio
+from typing import Any, Dict, List
+
+from sqlalchemy import text
+
+from benchmarks.generator import VulsFleetGenerator
+from benchmarks.runner import Benchmark
+
+
+def build_benchmarks(generator: VulsFleetGenerator, work_dir: str, repeat: int = 5) -> List[Benchmark]:
+    """
+    生成数据并构建全部基准
+
+    Args:
+        generator: 扫描结果生成器
+        work_dir: 临时目录（存放生成的结果文件）
+        repeat: 每个基准的重复轮数
+    """
+    from models import engine, SessionLocal, Base, Issue
+    from parser import VulsParser
+    from ingest import IngestPipeline
+    from search import IssueSearchIndex
+    from playbook_gen import PlaybookGenerator
+    from llm_client import TemplateClient
+    from rules import FixRuleEngine
+
+    results_dir = os.path.join(work_dir, "results")
+    paths = generator.write(results_dir)
+    parser = VulsParser()
+    benchmarks = []
+
+    # ---------- 解析 ----------
+    single = VulsFleetGenerator(**{**generator.spec(), "hosts": 1, "layout": "single"})
+    single_path = single.write(os.path.join(work_dir, "parse-single"))[0]
+    multi = VulsFleetGenerator(**{**generator.spec(), "hosts": generator.hosts_per_file, "layout": "multi"})
+    multi_path = multi.write(os.path.join(work_dir, "parse-multi"))[0]
+
+    benchmarks.append(Benchmark(
+        "parse.single_host_file",
+        lambda _: parser.parse_file(single_path),
+        repeat=repeat, number=20, unit="hosts", units=lambda _: 1
+    ))
+    benchmarks.append(Benchmark(
+        "parse.multi_host_file",
+        lambda _: parser.parse_file(multi_path),
+        repeat=repeat, unit="hosts", units=lambda _: multi.hosts
+    ))
+
+    # ---------- 入库 ----------
+    def reset_db():
+        with engine.begin() as conn:
+            conn.execute(text("DROP TABLE IF EXISTS issues_fts"))
+        Base.metadata.drop_all(bind=engine)
+        Base.metadata.create_all(bind=engine)
+        IssueSearchIndex(engine).ensure()
+
+    def ingest_setup():
+        reset_db()
+        return IngestPipeline(SessionLocal, parser)
+
+    benchmarks.append(Benchmark(
+        "ingest.fleet",
+        lambda pipeline: pipeline.run(paths, force=True),
+        setup=ingest_setup,
+        repeat=max(1, repeat // 2), unit="hosts", units=lambda _: generator.hosts
+    ))
+
+    # ---------- /issues 查询（经由 API，含序列化与响应缓存） ----------
+    reset_db()
+    IngestPipeline(SessionLocal, parser).run(paths, force=True)
+    benchmarks.extend(_api_benchmarks(repeat))
+
+    # ---------- 批量导出 ----------
+    from export import PYARROW_AVAILABLE, export_issues
+
+    with engine.connect() as conn:
+        export_rows = conn.execute(text("SELECT COUNT(*) FROM issues")).scalar()
+    formats = ["ndjson", "csv"] + (["parquet"] if PYARROW_AVAILABLE else [])
+    for fmt in formats:
+        benchmarks.append(Benchmark(
+            f"export.{fmt}",
+            lambda _, fmt=fmt: sum(len(chunk) for chunk in export_issues(engine, fmt)),
+            repeat=repeat, unit="rows", units=lambda _: export_rows
+        ))
+
+    # ---------- Playbook 渲染 ----------
+    playbook_gen = PlaybookGenerator(templates_dir=os.path.join(work_dir, "templates"))
+    db = SessionLocal()
+    try:
+        sample_issues = db.query(Issue).order_by(Issue.id).limit(100).all()
+        fix_commands = [
+            {
+                "cve": issue.cve,
+                "summary": issue.summary,
+                "package": issue.package,
+                "packages": [pkg.split(":")[0] for pkg in (issue.package or "").split(", ") if pkg],
+                "command": "apt-get update && apt-get install --only-upgrade -y " + " ".join(
+                    pkg.split(":")[0] for pkg in (issue.package or "").split(", ") if pkg
+                )
+            }
+            for issue in sample_issues
+        ]
+    finally:
+        db.close()
+
+    for size in (10, 100):
+        commands = fix_commands[:size]
+        benchmarks.append(Benchmark(
+            f"playbook.render_{size}_issues",
+            lambda _, commands=commands: playbook_gen.generate_playbook("10.0.0.1", commands),
+            repeat=repeat, number=5, unit="issues", units=lambda _, n=len(commands): n
+        ))
+
+    # ---------- 模板 LLM 客户端 ----------
+    template_client = TemplateClient()
+
+    async def generate_all(issues):
+        for issue in issues:
+            await template_client.generate_fix_command(
+                issue["cve"], issue["summary"], package=issue["package"]
+            )
+
+    benchmarks.append(Benchmark(
+        "llm.template_client",
+        lambda _: asyncio.run(generate_all(fix_commands)),
+        repeat=repeat, number=10, unit="calls", units=lambda _: len(fix_commands)
+    ))
+
+    # ---------- 规则引擎批量分类 ----------
+    db = SessionLocal()
+    try:
+        summaries = [summary for (summary,) in db.query(Issue.summary)]
+    finally:
+        db.close()
+
+    benchmarks.append(Benchmark(
+        "rules.classify_cold",
+        lambda engine: engine.classify_many(summaries),
+        setup=FixRuleEngine.from_file,
+        repeat=repeat, unit="summaries", units=lambda _: len(summaries)
+    ))
+    warm_engine = FixRuleEngine.from_file()
+    warm_engine.classify_many(summaries)
+    benchmarks.append(Benchmark(
+        "rules.classify_cached",
+        lambda _: warm_engine.classify_many(summaries),
+        repeat=repeat, number=5, unit="summaries", units=lambda _: len(summaries)
+    ))
+
+    return benchmarks
+
+
+def _api_benchmarks(repeat: int) -> List[Benchmark]:
+    """通过 TestClient 调用 /issues 相关接口"""
+    from fastapi.testclient import TestClient
+    import app as app_module
+
+    client = TestClient(app_module.app)
+    cache = app_module.response_cache
+
+    def cold(path: str, params: Dict[str, Any]):
+        # 每次调用前使缓存失效，测量查询 + 序列化
+        def call(_):
+            cache.bump_generation()
+            response = client.get(path, params=params)
+            response.raise_for_status()
+        return call
+
+    def warm(path: str, params: Dict[str, Any]):
+        def call(_):
+            response = client.get(path, params=params)
+            response.raise_for_status()
+        return call
+
+    cases = [
+        ("api.issues_all_cold", cold("/issues", {})),
+        ("api.issues_filtered_cold", cold("/issues", {"cvss_min": 7.0, "status": "open"})),
+        ("api.issues_host_cold", cold("/issues", {"host_id": 1})),
+        ("api.issues_all_cached", warm("/issues", {})),
+        ("api.issues_search", warm("/issues/search", {"q": "overflow", "severity": "critical"})),
+    ]
+    return [Benchmark(name, func, repeat=repeat, number=5) for name, func in cases]
@@ -0,0 +1,300 @@
+"""
+响应缓存
+功能：读接口的 LRU/TTL 响应缓存，按代数（generation）整体失效，可选 Redis 后端；
+代数存放在 Redis 或数据库中，多个 worker 进程共享，任一进程写入后所有进程的缓存同时失效
+"""
+
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+from urllib.parse import urlencode
+from loguru import logger
+from sqlalchemy import insert, select, update
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError
+
+from models import CacheGeneration
+
+try:
+    import redis
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+
+
+class CachedResponse:
+    """缓存的响应体"""
+
+    __slots__ = ("body", "etag", "expires_at")
+
+    def __init__(self, body: bytes, etag: str, expires_at: float):
+        self.body = body
+        self.etag = etag
+        self.expires_at = expires_at
+
+
+class LocalGeneration:
+    """进程内代数（只适用于单进程部署）"""
+
+    name = "local"
+
+    def __init__(self):
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def get(self) -> int:
+        return self._generation
+
+    def bump(self) -> int:
+        with self._lock:
+            self._generation += 1
+            return self._generation
+
+
+class RedisGeneration:
+    """Redis 中的代数"""
+
+    name = "redis"
+    KEY = "fixpilot:cache:generation"
+
+    def __init__(self, client):
+        self.client = client
+
+    def get(self) -> int:
+        return int(self.client.get(self.KEY) or 0)
+
+    def bump(self) -> int:
+        return int(self.client.incr(self.KEY))
+
+
+class DatabaseGeneration:
+    """数据库 cache_generation 表中的代数（无 Redis 时多个 worker 共享）"""
+
+    name = "database"
+
+    def __init__(self, engine: Engine):
+        self.engine = engine
+        with self.engine.connect() as conn:
+            exists = conn.execute(select(CacheGeneration.id).where(CacheGeneration.id == 1)).first()
+        if exists is None:
+            try:
+                with self.engine.begin() as conn:
+                    conn.execute(insert(CacheGeneration).values(id=1, generation=0))
+            except IntegrityError:
+                # 其他 worker 同时完成了初始化
+                pass
+
+    def get(self) -> int:
+        with self.engine.connect() as conn:
+            return conn.execute(
+                select(CacheGeneration.generation).where(CacheGeneration.id == 1)
+            ).scalar() or 0
+
+    def bump(self) -> int:
+        with self.engine.begin() as conn:
+            return conn.execute(
+                update(CacheGeneration)
+                .where(CacheGeneration.id == 1)
+                .values(generation=CacheGeneration.generation + 1)
+                .returning(CacheGeneration.generation)
+            ).scalar()
+
+
+class MemoryCacheBackend:
+    """进程内 LRU + TTL 后端（响应体在进程内，代数由 generation 决定是否跨进程共享）"""
+
+    name = "memory"
+
+    def __init__(self, max_entries: int = 512, max_bytes: int = 64 * 1024 * 1024, generation=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.evictions = 0
+        self.generation = generation or LocalGeneration()
+        self._entries: "OrderedDict[str, CachedResponse]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get_generation(self) -> int:
+        return self.generation.get()
+
+    def bump_generation(self) -> int:
+        return self.generation.bump()
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry.expires_at < time.monotonic():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key: str, entry: CachedResponse):
+        size = len(entry.body)
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = entry
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        return {"entries": len(self._entries), "bytes": self._bytes, "evictions": self.evictions}
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key)
+        self._bytes -= len(entry.body)
+
+
+class RedisCacheBackend:
+    """Redis 兼容后端（多个 worker 共享缓存和代数）"""
+
+    name = "redis"
+    KEY_PREFIX = "fixpilot:cache:"
+
+    def __init__(self, url: str, ttl_seconds: float):
+        if not REDIS_AVAILABLE:
+            raise ImportError("Redis library is required for redis cache backend")
+
+        self.client = redis.Redis.from_url(url)
+        self.ttl_seconds = ttl_seconds
+        self.client.ping()
+        self.generation = RedisGeneration(self.client)
+
+    def get_generation(self) -> int:
+        return self.generation.get()
+
+    def bump_generation(self) -> int:
+        return self.generation.bump()
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        value = self.client.get(self.KEY_PREFIX + key)
+        if value is None:
+            return None
+        etag, _, body = value.partition(b"\n")
+        return CachedResponse(body, etag.decode(), 0.0)
+
+    def set(self, key: str, entry: CachedResponse):
+        self.client.set(
+            self.KEY_PREFIX + key,
+            entry.etag.encode() + b"\n" + entry.body,
+            px=max(1, int(self.ttl_seconds * 1000))
+        )
+
+    def clear(self):
+        self.bump_generation()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"entries": None, "bytes": None, "evictions": None}
+
+
+class ResponseCache:
+    """
+    读接口响应缓存
+
+    缓存键 = 代数 + 路径 + 规范化后的查询参数。入库、状态变更等写路径调用
+    bump_generation() 后，旧代数的条目不再命中，随 LRU/TTL 自然淘汰。
+
+    memory 后端的代数优先放在 Redis（给出 redis_url 且可连接时），否则放在 engine 对应的数据库中，
+    都没有时才退化为进程内代数；入库只在一个 worker 中进行，其他 worker 也据此失效。
+    """
+
+    def __init__(
+        self,
+        ttl_seconds: float = 60.0,
+        max_entries: int = 512,
+        max_bytes: int = 64 * 1024 * 1024,
+        backend: str = "memory",
+        redis_url: str = None,
+        engine: Optional[Engine] = None
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.backend = None
+
+        if backend == "redis" and redis_url:
+            try:
+                self.backend = RedisCacheBackend(redis_url, ttl_seconds)
+                logger.info("Using redis response cache")
+            except Exception as e:
+                logger.warning(f"Failed to initialize redis response cache: {e}")
+
+        if self.backend is None:
+            self.backend = MemoryCacheBackend(max_entries, max_bytes, self._shared_generation(redis_url, engine))
+        logger.info(f"Response cache generation kept in {self.backend.generation.name}")
+
+    @staticmethod
+    def _shared_generation(redis_url: Optional[str], engine: Optional[Engine]):
+        if redis_url and REDIS_AVAILABLE:
+            try:
+                client = redis.Redis.from_url(redis_url)
+                client.ping()
+                return RedisGeneration(client)
+            except Exception as e:
+                logger.warning(f"Redis unavailable for cache generation, using database: {e}")
+        if engine is not None:
+            return DatabaseGeneration(engine)
+        return LocalGeneration()
+
+    @property
+    def generation(self) -> int:
+        return self.backend.get_generation()
+
+    def bump_generation(self, *args, **kwargs) -> int:
+        """使所有缓存条目失效（可直接作为写路径回调使用）"""
+        return self.backend.bump_generation()
+
+    def make_key(self, path: str, params: Dict[str, Any]) -> str:
+        """由路径和规范化参数生成缓存键（忽略 None，参数按名排序）"""
+        normalized = sorted((k, str(v)) for k, v in params.items() if v is not None)
+        return f"{self.generation}:{path}?{urlencode(normalized)}"
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        entry = self.backend.get(key)
+        if entry is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return entry
+
+    def set(self, key: str, body: bytes) -> CachedResponse:
+        etag = '"' + hashlib.sha1(body).hexdigest()[:20] + '"'
+        entry = CachedResponse(body, etag, time.monotonic() + self.ttl_seconds)
+        self.backend.set(key, entry)
+        return entry
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "backend": self.backend.name,
+            "generation": self.generation,
+            "generation_store": self.backend.generation.name,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            **self.backend.stats()
+        }
+
+    @staticmethod
+    def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+        """检查 If-None-Match 是否命中"""
+        if not if_none_match:
+            return False
+        candidates = [tag.strip().replace("W/", "", 1) for tag in if_none_match.split(",")]
+        return etag in candidates or "*" in candidates
@@ -0,0 +1,332 @@
+"""
+变更事件推送
+功能：事件代理，入库、修复命令生成、状态变更等写路径发布变更事件，客户端通过 SSE 订阅；
+多 worker 部署时经 Redis Stream 转发，所有进程共享事件序号和回放缓冲
+"""
+
+import json
+import uuid
+import asyncio
+import threading
+from collections import deque
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Optional
+from loguru import logger
+
+try:
+    import redis
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+
+
+SEVERITY_RANK = {"low": 0, "medium": 1, "high": 2, "critical": 3}
+
+STREAM_KEY = "fixpilot:events"
+SEQ_KEY = "fixpilot:events:seq"
+EPOCH_KEY = "fixpilot:events:epoch"
+
+# 分配共享序号并以序号作为条目 ID 写入事件流（原子执行，流中条目按序号递增）
+PUBLISH_SCRIPT = """
+local seq = redis.call('INCR', KEYS[1])
+redis.call('XADD', KEYS[2], 'MAXLEN', '~', ARGV[2], seq .. '-0', 'event', ARGV[1])
+return seq
+"""
+
+
+def severity_of(cvss: Optional[float]) -> Optional[str]:
+    """CVSS 评分对应的严重程度（与前端 getRiskLevel 一致）"""
+    if cvss is None:
+        return None
+    if cvss >= 9.0:
+        return "critical"
+    if cvss >= 7.0:
+        return "high"
+    if cvss >= 4.0:
+        return "medium"
+    return "low"
+
+
+class ChangeEvent:
+    """变更事件"""
+
+    __slots__ = ("seq", "type", "host_id", "severity", "data", "timestamp")
+
+    def __init__(
+        self, seq: int, type: str, host_id: Optional[int], severity: Optional[str], data: Dict[str, Any],
+        timestamp: Optional[str] = None
+    ):
+        self.seq = seq
+        self.type = type
+        self.host_id = host_id
+        self.severity = severity
+        self.data = data
+        self.timestamp = timestamp or datetime.utcnow().isoformat()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "type": self.type,
+            "host_id": self.host_id,
+            "severity": self.severity,
+            "timestamp": self.timestamp,
+            **self.data
+        }
+
+
+class Subscription:
+    """单个订阅者：带过滤条件的有界事件队列"""
+
+    def __init__(self, broker: "EventBroker", host_id: Optional[int], severity: Optional[str], queue_size: int):
+        self.broker = broker
+        self.host_id = host_id
+        self.min_rank = SEVERITY_RANK.get(severity) if severity else None
+        self.queue: "asyncio.Queue[ChangeEvent]" = asyncio.Queue(maxsize=queue_size)
+        # 队列溢出后客户端需要全量重新加载
+        self.overflowed = False
+
+    def matches(self, event: ChangeEvent) -> bool:
+        if self.host_id is not None and event.host_id != self.host_id:
+            return False
+        if self.min_rank is not None:
+            if event.severity is None or SEVERITY_RANK[event.severity] < self.min_rank:
+                return False
+        return True
+
+    def offer(self, event: ChangeEvent):
+        """在事件循环线程中调用"""
+        if self.overflowed or not self.matches(event):
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class EventBroker:
+    """
+    事件代理
+
+    每个事件分配递增序号，最近 history_size 条保留在环形缓冲区中。
+    恢复令牌格式为 "<epoch>-<seq>"；令牌来自其他实例或已滑出缓冲区时，
+    客户端会收到 reset 事件并全量重新加载。publish 可以在任意线程调用。
+
+    进程内模式下 epoch 每次进程启动生成，只有本进程发布的事件能送达本进程的订阅者。
+    指定 redis_url 时事件经 Redis Stream 转发：序号和 epoch 由 Redis 分配、所有 worker 共享，
+    每个进程的转发线程读取事件流投递给本进程的订阅者，断线重连到任一 worker 都能续传。
+    Redis 不可用时退化为进程内模式。
+    """
+
+    def __init__(self, history_size: int = 1000, queue_size: int = 256, redis_url: Optional[str] = None):
+        self.epoch = uuid.uuid4().hex[:8]
+        self.history_size = history_size
+        self.queue_size = queue_size
+        self._history: "deque[ChangeEvent]" = deque(maxlen=history_size)
+        self._subscribers: List[Subscription] = []
+        self._seq = 0
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.published = 0
+        self._redis = None
+        self._publish_script = None
+        self._relay_thread: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+
+        if redis_url:
+            self._connect(redis_url)
+
+    def _connect(self, redis_url: str):
+        if not REDIS_AVAILABLE:
+            logger.warning("Redis library not available, change events stay in-process")
+            return
+        try:
+            client = redis.Redis.from_url(redis_url)
+            client.ping()
+            client.set(EPOCH_KEY, self.epoch, nx=True)
+            self.epoch = client.get(EPOCH_KEY).decode()
+            self._publish_script = client.register_script(PUBLISH_SCRIPT)
+            self._redis = client
+            logger.info("Relaying change events through redis")
+        except Exception as e:
+            logger.warning(f"Failed to initialize redis event relay: {e}")
+
+    @property
+    def backend(self) -> str:
+        return "redis" if self._redis is not None else "memory"
+
+    def attach_loop(self, loop: asyncio.AbstractEventLoop):
+        """绑定订阅者所在的事件循环并启动 Redis 转发线程（应用启动时调用）"""
+        self._loop = loop
+        if self._redis is not None and self._relay_thread is None:
+            self._stop_event.clear()
+            self._relay_thread = threading.Thread(target=self._relay_loop, name="events-relay", daemon=True)
+            self._relay_thread.start()
+
+    def close(self):
+        """停止 Redis 转发线程（应用关闭时调用）"""
+        self._stop_event.set()
+        if self._relay_thread is not None:
+            self._relay_thread.join(timeout=10)
+            self._relay_thread = None
+
+    def token(self, seq: int) -> str:
+        return f"{self.epoch}-{seq}"
+
+    def publish(self, type: str, host_id: Optional[int] = None, severity: Optional[str] = None, **data) -> ChangeEvent:
+        """发布事件（Redis 模式下由转发线程投递，发布进程的订阅者也不例外）"""
+        if self._redis is None:
+            with self._lock:
+                self._seq += 1
+                event = ChangeEvent(self._seq, type, host_id, severity, data)
+                self.published += 1
+            self._deliver(event)
+            return event
+
+        event = ChangeEvent(0, type, host_id, severity, data)
+        payload = json.dumps({
+            "type": type, "host_id": host_id, "severity": severity,
+            "timestamp": event.timestamp, "data": data
+        }, ensure_ascii=False)
+        try:
+            event.seq = int(self._publish_script(keys=[SEQ_KEY, STREAM_KEY], args=[payload, self.history_size]))
+        except Exception as e:
+            logger.error(f"Failed to publish {type} event to redis: {e}")
+            return event
+        with self._lock:
+            self.published += 1
+        return event
+
+    def _deliver(self, event: ChangeEvent):
+        """写入回放缓冲并投递给本进程的订阅者"""
+        with self._lock:
+            self._seq = max(self._seq, event.seq)
+            self._history.append(event)
+            subscribers = list(self._subscribers)
+
+        if subscribers and self._loop is not None and not self._loop.is_closed():
+            for subscription in subscribers:
+                self._loop.call_soon_threadsafe(subscription.offer, event)
+
+    def _relay_loop(self):
+        """Redis 模式：启动时载入最近 history_size 条作为回放缓冲，之后阻塞读取新事件"""
+        last_id = None
+        while not self._stop_event.is_set():
+            try:
+                if last_id is None:
+                    entries = self._redis.xrevrange(STREAM_KEY, count=self.history_size)
+                    for entry_id, fields in reversed(entries):
+                        self._deliver(self._decode(entry_id, fields))
+                    last_id = entries[0][0] if entries else b"0-0"
+                response = self._redis.xread({STREAM_KEY: last_id}, count=500, block=1000)
+                for _, entries in response or []:
+                    for entry_id, fields in entries:
+                        last_id = entry_id
+                        self._deliver(self._decode(entry_id, fields))
+            except Exception as e:
+                logger.warning(f"Event relay read failed, retrying: {e}")
+                self._stop_event.wait(1.0)
+
+    @staticmethod
+    def _decode(entry_id: bytes, fields: Dict[bytes, bytes]) -> ChangeEvent:
+        seq = int(entry_id.split(b"-", 1)[0])
+        payload = json.loads(fields[b"event"])
+        return ChangeEvent(
+            seq, payload["type"], payload.get("host_id"), payload.get("severity"),
+            payload.get("data") or {}, timestamp=payload.get("timestamp")
+        )
+
+    def subscribe(self, host_id: Optional[int] = None, severity: Optional[str] = None) -> Subscription:
+        subscription = Subscription(self, host_id, severity, self.queue_size)
+        with self._lock:
+            self._subscribers.append(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            if subscription in self._subscribers:
+                self._subscribers.remove(subscription)
+
+    def replay(self, token: Optional[str], subscription: Subscription) -> Optional[List[ChangeEvent]]:
+        """
+        返回恢复令牌之后的缓冲事件
+
+        Returns:
+            事件列表；令牌无法续接时返回 None
+        """
+        if not token:
+            return []
+
+        epoch, _, seq = token.partition("-")
+        if epoch != self.epoch or not seq.isdigit():
+            return None
+
+        seq = int(seq)
+        with self._lock:
+            history = list(self._history)
+            current = self._seq
+
+        if seq > current:
+            # Redis 模式下令牌可能来自转发进度更快的其他 worker，之后的事件会从订阅队列到达
+            return [] if self._redis is not None else None
+        if seq < current and (not history or history[0].seq > seq + 1):
+            return None
+        return [event for event in history if event.seq > seq and subscription.matches(event)]
+
+    async def stream(
+        self,
+        host_id: Optional[int] = None,
+        severity: Optional[str] = None,
+        last_event_id: Optional[str] = None,
+        heartbeat: float = 15.0
+    ) -> AsyncIterator[str]:
+        """生成 SSE 数据流"""
+        subscription = self.subscribe(host_id, severity)
+        try:
+            backlog = self.replay(last_event_id, subscription)
+            last_seq = 0
+            if backlog is None:
+                yield self._format("reset", self.token(self._seq), {"reason": "resume token expired"})
+                backlog = []
+            else:
+                yield self._format("ready", None, {"epoch": self.epoch})
+                if last_event_id:
+                    # 客户端已收到令牌之前的事件
+                    last_seq = int(last_event_id.partition("-")[2])
+
+            for event in backlog:
+                last_seq = event.seq
+                yield self._format(event.type, self.token(event.seq), event.to_dict())
+
+            while True:
+                if subscription.overflowed:
+                    yield self._format("reset", self.token(self._seq), {"reason": "subscriber too slow"})
+                    return
+                try:
+                    event = await asyncio.wait_for(subscription.queue.get(), timeout=heartbeat)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                # 回放过的事件可能也进入了队列
+                if event.seq <= last_seq:
+                    continue
+                last_seq = event.seq
+                yield self._format(event.type, self.token(event.seq), event.to_dict())
+        finally:
+            subscription.close()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "epoch": self.epoch,
+            "backend": self.backend,
+            "published": self.published,
+            "subscribers": len(self._subscribers),
+            "buffered": len(self._history)
+        }
+
+    @staticmethod
+    def _format(event_type: str, token: Optional[str], data: Dict[str, Any]) -> str:
+        """格式化 SSE 消息（无 token 时不带 id，不影响客户端的 Last-Event-ID）"""
+        id_line = f"id: {token}\n" if token else ""
+        return f"{id_line}event: {event_type}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
@@ -0,0 +1,257 @@
+"""
+漏洞数据批量导出
+功能：用服务端游标按块读取漏洞（含主机信息）原始行，流式输出 NDJSON / CSV，
+或用 pyarrow 按行组写出 Parquet；不构建 ORM 对象，内存占用与导出规模无关。
+安装 pyarrow 时 CSV 也由 pyarrow 的 C++ 写出器生成，否则使用标准库 csv
+"""
+
+import io
+import os
+import csv
+import json
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence
+
+from sqlalchemy import String, cast, select
+from sqlalchemy.engine import Engine
+
+from models import Host, Issue
+from metrics import EXPORT_ROWS, EXPORT_BYTES
+from responses import ORJSON_AVAILABLE
+
+if ORJSON_AVAILABLE:
+    import orjson
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+    import pyarrow.parquet as pq
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+
+# 导出列：(列名, SQL 表达式)；created_at 在数据库中转为文本，避免逐行解析时间
+EXPORT_COLUMNS = [
+    ("issue_id", Issue.id),
+    ("host_id", Issue.host_id),
+    ("ip", Host.ip),
+    ("hostname", Host.hostname),
+    ("os", Host.os),
+    ("cve", Issue.cve),
+    ("cvss", Issue.cvss),
+    ("summary", Issue.summary),
+    ("package", Issue.package),
+    ("patchable", Issue.patchable),
+    ("status", Issue.status),
+    ("fix_command", Issue.fix_command),
+    ("created_at", cast(Issue.created_at, String)),
+]
+COLUMN_NAMES = [name for name, _ in EXPORT_COLUMNS]
+
+EXPORT_FORMATS = {
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "csv": ("text/csv", "csv"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+DEFAULT_CHUNK_ROWS = int(os.getenv("EXPORT_CHUNK_ROWS", "10000"))
+DEFAULT_ROW_GROUP_ROWS = int(os.getenv("EXPORT_PARQUET_ROW_GROUP", "100000"))
+
+
+def export_statement(host_id: Optional[int] = None, cvss_min: Optional[float] = None, status: Optional[str] = None):
+    """与 /issues 相同的筛选条件，按 issue id 排序"""
+    statement = select(*(column for _, column in EXPORT_COLUMNS)).outerjoin(Host, Host.id == Issue.host_id)
+    if host_id:
+        statement = statement.where(Issue.host_id == host_id)
+    if cvss_min:
+        statement = statement.where(Issue.cvss >= cvss_min)
+    if status:
+        statement = statement.where(Issue.status == status)
+    return statement.order_by(Issue.id)
+
+
+def iter_chunks(engine: Engine, statement, chunk_rows: int = DEFAULT_CHUNK_ROWS) -> Iterator[Sequence[Sequence[Any]]]:
+    """
+    按块读取结果行（Row 对象，可直接按序列使用）
+
+    stream_results 在支持的驱动上使用服务端游标（PostgreSQL 命名游标等），SQLite 本身即逐行读取。
+    """
+    with engine.connect() as conn:
+        result = conn.execution_options(stream_results=True, yield_per=chunk_rows).execute(statement)
+        for partition in result.partitions(chunk_rows):
+            yield partition
+
+
+def ndjson_chunks(chunks: Iterator[Sequence[Sequence[Any]]]) -> Iterator[bytes]:
+    """每行一个 JSON 对象（安装 orjson 时用 orjson 编码）"""
+    names = COLUMN_NAMES
+    if ORJSON_AVAILABLE:
+        for chunk in chunks:
+            body = b"\n".join([orjson.dumps(dict(zip(names, row))) for row in chunk])
+            yield _count("ndjson", len(chunk), body + b"\n")
+        return
+
+    encode = json.JSONEncoder(ensure_ascii=False, check_circular=False).encode
+    for chunk in chunks:
+        body = "\n".join([encode(dict(zip(names, row))) for row in chunk])
+        yield _count("ndjson", len(chunk), (body + "\n").encode("utf-8"))
+
+
+def csv_chunks(chunks: Iterator[Sequence[Sequence[Any]]]) -> Iterator[bytes]:
+    """带表头的 CSV（UTF-8）"""
+    if PYARROW_AVAILABLE:
+        yield from _arrow_csv_chunks(chunks)
+        return
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerow(COLUMN_NAMES)
+    for chunk in chunks:
+        writer.writerows(chunk)
+        data = buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+        yield _count("csv", len(chunk), data)
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+class _ChunkSink(io.RawIOBase):
+    """pyarrow 写出器的输出目标：写入的数据暂存，由生成器取走后输出"""
+
+    def __init__(self):
+        self.parts: List[bytes] = []
+        self.position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self.parts.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def drain(self) -> bytes:
+        data = b"".join(self.parts)
+        self.parts = []
+        return data
+
+
+def export_schema() -> "pa.Schema":
+    return pa.schema([
+        ("issue_id", pa.int64()),
+        ("host_id", pa.int64()),
+        ("ip", pa.string()),
+        ("hostname", pa.string()),
+        ("os", pa.string()),
+        ("cve", pa.string()),
+        ("cvss", pa.float64()),
+        ("summary", pa.string()),
+        ("package", pa.string()),
+        ("patchable", pa.string()),
+        ("status", pa.string()),
+        ("fix_command", pa.string()),
+        ("created_at", pa.string()),
+    ])
+
+
+def _arrow_table(rows: Sequence[Sequence[Any]], schema: "pa.Schema") -> "pa.Table":
+    """按列构建 Arrow 表（行转列后一次转换一整列）"""
+    columns = list(zip(*rows))
+    return pa.Table.from_arrays(
+        [pa.array(values, type=field.type) for values, field in zip(columns, schema)],
+        schema=schema
+    )
+
+
+def _arrow_csv_chunks(chunks: Iterator[Sequence[Sequence[Any]]]) -> Iterator[bytes]:
+    schema = export_schema()
+    sink = _ChunkSink()
+    writer = pa_csv.CSVWriter(sink, schema)
+    try:
+        for chunk in chunks:
+            writer.write_table(_arrow_table(chunk, schema))
+            yield _count("csv", len(chunk), sink.drain())
+    finally:
+        writer.close()
+    tail = sink.drain()
+    if tail:
+        yield tail
+
+
+def parquet_chunks(chunks: Iterator[Sequence[Sequence[Any]]], row_group_rows: int = DEFAULT_ROW_GROUP_ROWS) -> Iterator[bytes]:
+    """
+    Parquet（zstd 压缩）：读取块累积到 row_group_rows 行写出一个行组，写完即输出，
+    内存中最多保留一个行组；文件尾（元数据）在最后输出
+    """
+    if not PYARROW_AVAILABLE:
+        raise RuntimeError("pyarrow is required for Parquet export")
+
+    schema = export_schema()
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema, compression="zstd")
+    # 每个读取块立即转为列式表，累积的是 Arrow 内存而不是 Python 行对象
+    pending: List["pa.Table"] = []
+    pending_rows = 0
+
+    def flush() -> bytes:
+        nonlocal pending_rows
+        writer.write_table(pa.concat_tables(pending), row_group_size=pending_rows)
+        rows = pending_rows
+        pending.clear()
+        pending_rows = 0
+        return _count("parquet", rows, sink.drain())
+
+    try:
+        for chunk in chunks:
+            pending.append(_arrow_table(chunk, schema))
+            pending_rows += len(chunk)
+            if pending_rows >= row_group_rows:
+                yield flush()
+        if pending:
+            yield flush()
+    finally:
+        writer.close()
+    yield _count("parquet", 0, sink.drain())
+
+
+def export_issues(
+    engine: Engine,
+    fmt: str,
+    host_id: Optional[int] = None,
+    cvss_min: Optional[float] = None,
+    status: Optional[str] = None,
+    chunk_rows: int = DEFAULT_CHUNK_ROWS
+) -> Iterator[bytes]:
+    """
+    按格式导出漏洞
+
+    Args:
+        engine: 数据库引擎
+        fmt: ndjson / csv / parquet
+        host_id, cvss_min, status: 筛选条件（同 /issues）
+        chunk_rows: 每次从游标读取的行数
+
+    Returns:
+        字节块迭代器（同步，适合 StreamingResponse 在线程池中迭代）
+    """
+    writers: Dict[str, Callable[[Iterator[Sequence[Sequence[Any]]]], Iterator[bytes]]] = {
+        "ndjson": ndjson_chunks,
+        "csv": csv_chunks,
+        "parquet": parquet_chunks,
+    }
+    if fmt not in writers:
+        raise ValueError(f"Unsupported export format: {fmt}")
+    if fmt == "parquet" and not PYARROW_AVAILABLE:
+        raise RuntimeError("pyarrow is required for Parquet export")
+    return writers[fmt](iter_chunks(engine, export_statement(host_id, cvss_min, status), chunk_rows))
+
+
+def _count(fmt: str, rows: int, data: bytes) -> bytes:
+    EXPORT_ROWS.labels(fmt).inc(rows)
+    EXPORT_BYTES.labels(fmt).inc(len(data))
+    return data
@@ -0,0 +1,84 @@
+"""
+主机漏洞统计
+功能：一次分组查询得到每台主机按状态、按严重程度的漏洞数，供主机列表在单个请求中展示；
+查询只读取 issues 的 (host_id, status, cvss)，由同名覆盖索引支撑，不回表
+"""
+
+from typing import Any, Dict, List, Optional, Sequence
+
+from sqlalchemy import and_, case, func, or_, select
+from sqlalchemy.engine import Engine
+
+from models import ISSUE_STATUSES, Host, Issue
+
+STATUSES = ISSUE_STATUSES
+
+# 严重程度分桶（与 events.severity_of、前端 getRiskLevel 一致）；只统计未修复（status != fixed）的漏洞
+SEVERITY_BUCKETS = (
+    ("critical", 9.0, None),
+    ("high", 7.0, 9.0),
+    ("medium", 4.0, 7.0),
+    ("low", None, 4.0),
+)
+
+STATUS_FIELDS = [f"{status}_count" for status in STATUSES]
+SEVERITY_FIELDS = [f"{name}_count" for name, _, _ in SEVERITY_BUCKETS]
+COUNT_FIELDS = STATUS_FIELDS + SEVERITY_FIELDS
+
+
+def ensure_indexes(engine: Engine):
+    """为已有数据库补建 issues 上的索引（新库由 create_all 创建），幂等"""
+    for index in Issue.__table__.indexes:
+        index.create(bind=engine, checkfirst=True)
+
+
+def _severity_condition(low: Optional[float], high: Optional[float]):
+    conditions = [Issue.status != "fixed"]
+    if low is not None:
+        conditions.append(Issue.cvss >= low)
+    if high is not None:
+        conditions.append(Issue.cvss < high)
+    condition = and_(*conditions)
+    if low is None:
+        # 无评分的漏洞计入 low（与 search.SEVERITY_CASE 一致）
+        condition = or_(condition, and_(Issue.status != "fixed", Issue.cvss.is_(None)))
+    return condition
+
+
+def issue_counts_statement(host_ids: Optional[Sequence[int]] = None):
+    """按主机分组的计数查询：host_id + COUNT_FIELDS"""
+    counts = [func.count(case((Issue.status == status, 1))).label(f"{status}_count") for status in STATUSES]
+    counts += [
+        func.count(case((_severity_condition(low, high), 1))).label(f"{name}_count")
+        for name, low, high in SEVERITY_BUCKETS
+    ]
+    statement = select(Issue.host_id, *counts)
+    if host_ids is not None:
+        statement = statement.where(Issue.host_id.in_(host_ids))
+    return statement.group_by(Issue.host_id)
+
+
+def hosts_with_counts_statement(host_columns: Sequence[Any], host_ids: Optional[Sequence[int]] = None):
+    """主机列 + 计数列（无漏洞的主机计数为 0），单条 SQL；host_ids 限定主机"""
+    counts = issue_counts_statement(host_ids).subquery()
+    statement = select(
+        *host_columns,
+        *[func.coalesce(counts.c[name], 0).label(name) for name in COUNT_FIELDS]
+    ).outerjoin(counts, counts.c.host_id == Host.id)
+    if host_ids is not None:
+        statement = statement.where(Host.id.in_(host_ids))
+    return statement
+
+
+def fleet_summary(rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    /hosts/summary 响应：每台主机的计数与全体合计
+
+    Args:
+        rows: hosts_with_counts_statement 的结果行（字典，含 host_id）
+    """
+    totals = {name: 0 for name in COUNT_FIELDS}
+    for row in rows:
+        for name in COUNT_FIELDS:
+            totals[name] += row[name]
+    return {"hosts": rows, "totals": totals}
@@ -0,0 +1,401 @@
+"""
+扫描结果入库
+功能：将解析后的主机和漏洞信息写入数据库，支持有界队列的流水线批量入库
+"""
+
+import os
+import time
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from typing import List, Dict, Any, Callable, Optional, Tuple
+from sqlalchemy import insert, delete
+from sqlalchemy.orm import Session
+from loguru import logger
+
+from models import Host, Issue, IssuePackage, IngestCheckpoint
+from advisory import advisory_rows, upsert_advisories
+from metrics import (
+    INGEST_HOSTS, INGEST_NEW_ISSUES, INGEST_BATCH_SECONDS,
+    INGEST_BATCH_FAILURES, INGEST_HOSTS_PER_SECOND
+)
+
+
+def ingest_host_results(
+    db: Session,
+    results: List[Dict[str, Any]],
+    changes: Optional[List[Dict[str, Any]]] = None,
+    advisories: Optional[List[Dict[str, str]]] = None
+) -> int:
+    """
+    将解析结果写入数据库（不提交事务）
+
+    Args:
+        db: 数据库会话
+        results: VulsParser 输出的主机信息列表
+        changes: 若提供，按主机追加变更摘要（host_id、新增漏洞数、最高 CVSS 等）
+        advisories: 若提供，追加本批写入的修复版本记录（提交后合并进内存索引）
+
+    Returns:
+        新增的漏洞记录数
+    """
+    new_issues = 0
+    fixed_versions = []
+
+    for result in results:
+        # 更新或创建主机记录
+        host = db.query(Host).filter(Host.ip == result["ip"]).first()
+        if not host:
+            host = Host(
+                ip=result["ip"],
+                hostname=result.get("hostname"),
+                os=result.get("os"),
+                last_scan=datetime.utcnow(),
+                risk_score=result.get("risk_score", 0.0)
+            )
+            db.add(host)
+            db.flush()
+        else:
+            host.last_scan = datetime.utcnow()
+            host.risk_score = result.get("risk_score", 0.0)
+
+        # 一次查出该主机已有的 CVE，避免逐条查询
+        issue_ids = {
+            cve: issue_id
+            for cve, issue_id in db.query(Issue.cve, Issue.id).filter(Issue.host_id == host.id)
+        }
+
+        # 添加漏洞记录
+        added = []
+        for issue in result.get("issues", []):
+            if issue["cve"] in issue_ids:
+                continue
+
+            new_issue = Issue(
+                host_id=host.id,
+                cve=issue["cve"],
+                summary=issue["summary"],
+                cvss=issue["cvss"],
+                package=issue.get("package"),
+                patchable=issue.get("patchable"),
+                status="open"
+            )
+            db.add(new_issue)
+            added.append(new_issue)
+            issue_ids[issue["cve"]] = None
+            new_issues += 1
+
+        if added:
+            db.flush()
+            for new_issue in added:
+                issue_ids[new_issue.cve] = new_issue.id
+
+        _replace_issue_packages(db, host.id, result.get("issues", []), issue_ids)
+        fixed_versions.extend(advisory_rows(result))
+
+        if changes is not None:
+            changes.append({
+                "host_id": host.id,
+                "ip": host.ip,
+                "risk_score": host.risk_score,
+                "new_issues": len(added),
+                "max_new_cvss": max((issue.cvss or 0.0 for issue in added), default=None)
+            })
+
+    upsert_advisories(db, fixed_versions)
+    if advisories is not None:
+        advisories.extend(fixed_versions)
+
+    logger.debug(f"Ingested {len(results)} host results, {new_issues} new issues")
+    return new_issues
+
+
+def _replace_issue_packages(
+    db: Session,
+    host_id: int,
+    issues: List[Dict[str, Any]],
+    issue_ids: Dict[str, int]
+):
+    """用本次扫描结果整体替换主机的受影响包记录（版本和修复版本可能随扫描变化）"""
+    db.execute(delete(IssuePackage).where(IssuePackage.host_id == host_id))
+
+    rows = [
+        {
+            "issue_id": issue_ids[issue["cve"]],
+            "host_id": host_id,
+            "name": pkg["name"],
+            "version": pkg.get("version", ""),
+            "new_version": pkg.get("new_version", ""),
+            "fixed_in": pkg.get("fixed_in", "")
+        }
+        for issue in issues
+        if issue_ids.get(issue["cve"]) is not None
+        for pkg in issue.get("packages", [])
+    ]
+    if rows:
+        db.execute(insert(IssuePackage), rows)
+
+
+class _FileDone:
+    """队列中的文件结束标记：该文件的所有主机记录都已入队（failed 为解析失败，不写断点）"""
+
+    __slots__ = ("path", "fingerprint", "hosts", "failed")
+
+    def __init__(self, path: str, fingerprint: Optional[Tuple[int, float]], hosts: int, failed: bool = False):
+        self.path = path
+        self.fingerprint = fingerprint
+        self.hosts = hosts
+        self.failed = failed
+
+
+_END = object()
+
+
+class IngestPipeline:
+    """
+    生产者/消费者入库流水线
+
+    解析线程把主机记录放入有界队列（队列满时阻塞，形成背压），
+    写入线程按 batch_size 分批入库，每批一个事务。
+    文件的全部主机提交成功后写入 IngestCheckpoint，中断后重跑会跳过已完成的文件。
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Session],
+        parser,
+        batch_size: int = 50,
+        queue_size: int = 200,
+        workers: int = 4,
+        on_commit: Optional[Callable[[Dict[str, Any]], None]] = None,
+        advisory_index=None
+    ):
+        self.session_factory = session_factory
+        self.parser = parser
+        self.batch_size = max(1, batch_size)
+        self.queue_size = max(1, queue_size)
+        self.workers = max(1, workers)
+        # 每批提交成功后回调（缓存失效等）
+        self.on_commit = on_commit
+        # 提交后把本批修复版本合并进内存索引（AdvisoryIndex）
+        self.advisory_index = advisory_index
+        self.logger = logger
+        self.last_stats: Dict[str, Any] = {}
+
+        # 同一时间只允许一个写入者，避免 SQLite 写锁竞争
+        self._write_lock = threading.Lock()
+
+    def run(self, file_paths: List[str], force: bool = False) -> Dict[str, Any]:
+        """
+        解析并入库一组结果文件
+
+        Args:
+            file_paths: 结果文件路径列表
+            force: 忽略断点，重新入库所有文件
+
+        Returns:
+            本次运行的统计信息
+        """
+        started = time.perf_counter()
+        stats = {
+            "files_total": len(file_paths),
+            "files_skipped": 0,
+            "files_ingested": 0,
+            "files_failed": 0,
+            "hosts": 0,
+            "new_issues": 0,
+            "batches": 0,
+            "batches_failed": 0,
+            "queue_size": self.queue_size,
+            "queue_depth_max": 0,
+            "queue_depth_avg": 0.0,
+            "parse_seconds": 0.0,
+            "batch_latency_avg": 0.0,
+            "batch_latency_max": 0.0,
+            "duration_seconds": 0.0,
+            "hosts_per_second": 0.0
+        }
+
+        pending = self._pending_files(file_paths, force)
+        stats["files_skipped"] = len(file_paths) - len(pending)
+        if not pending:
+            self.last_stats = stats
+            return stats
+
+        records: "queue.Queue" = queue.Queue(maxsize=self.queue_size)
+        parse_times = []
+
+        def produce(path: str, fingerprint: Tuple[int, float]):
+            t0 = time.perf_counter()
+            try:
+                results = self.parser.parse_file(path, strict=True)
+            finally:
+                parse_times.append(time.perf_counter() - t0)
+            for host_result in results:
+                records.put((path, host_result))
+            records.put(_FileDone(path, fingerprint, len(results)))
+
+        def feed():
+            try:
+                with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="ingest-parse") as pool:
+                    futures = {pool.submit(produce, path, fingerprint): path for path, fingerprint in pending}
+                    for future in as_completed(futures):
+                        error = future.exception()
+                        if error is not None:
+                            # 解析失败的文件不写断点，下次运行重试
+                            path = futures[future]
+                            self.logger.error(f"Failed to ingest {os.path.basename(path)}, will retry on next run: {error}")
+                            records.put(_FileDone(path, None, 0, failed=True))
+            finally:
+                records.put(_END)
+
+        producer = threading.Thread(target=feed, name="ingest-feed", daemon=True)
+        producer.start()
+
+        batch: List[Tuple[str, Dict[str, Any]]] = []
+        done_files: List[_FileDone] = []
+        failed_paths = set()
+        batch_latencies = []
+        depth_samples = 0
+        depth_total = 0
+
+        while True:
+            item = records.get()
+            depth = records.qsize()
+            depth_samples += 1
+            depth_total += depth
+            stats["queue_depth_max"] = max(stats["queue_depth_max"], depth)
+
+            if item is _END:
+                break
+            if isinstance(item, _FileDone):
+                if item.failed:
+                    failed_paths.add(item.path)
+                else:
+                    done_files.append(item)
+            else:
+                batch.append(item)
+
+            if len(batch) >= self.batch_size:
+                self._flush(batch, done_files, failed_paths, stats, batch_latencies)
+                batch, done_files = [], []
+
+        if batch or done_files:
+            self._flush(batch, done_files, failed_paths, stats, batch_latencies)
+
+        producer.join()
+        stats["files_failed"] = len(failed_paths)
+
+        duration = time.perf_counter() - started
+        stats["queue_depth_avg"] = round(depth_total / depth_samples, 2) if depth_samples else 0.0
+        stats["parse_seconds"] = round(sum(parse_times), 4)
+        if batch_latencies:
+            stats["batch_latency_avg"] = round(sum(batch_latencies) / len(batch_latencies), 4)
+            stats["batch_latency_max"] = round(max(batch_latencies), 4)
+        stats["duration_seconds"] = round(duration, 4)
+        stats["hosts_per_second"] = round(stats["hosts"] / duration, 2) if duration > 0 else 0.0
+        INGEST_HOSTS_PER_SECOND.set(stats["hosts_per_second"])
+
+        self.logger.info(
+            f"Ingested {stats['hosts']} hosts ({stats['new_issues']} new issues) from "
+            f"{stats['files_ingested']} files in {stats['batches']} batches, "
+            f"{stats['files_skipped']} unchanged files skipped"
+        )
+        self.last_stats = stats
+        return stats
+
+    def _flush(
+        self,
+        batch: List[Tuple[str, Dict[str, Any]]],
+        done_files: List[_FileDone],
+        failed_paths: set,
+        stats: Dict[str, Any],
+        batch_latencies: List[float]
+    ):
+        """提交一批主机记录，并为已完整入库的文件写入断点"""
+        t0 = time.perf_counter()
+        # 文件的部分主机所在批次失败时，不为其写断点，下次运行会重新入库
+        completed = [done for done in done_files if done.path not in failed_paths]
+
+        with self._write_lock:
+            db = self.session_factory()
+            try:
+                changes = []
+                advisories = []
+                new_issues = ingest_host_results(
+                    db, [host_result for _, host_result in batch], changes, advisories
+                )
+                for done in completed:
+                    db.merge(IngestCheckpoint(
+                        path=done.path,
+                        size=done.fingerprint[0],
+                        mtime=done.fingerprint[1],
+                        hosts=done.hosts,
+                        ingested_at=datetime.utcnow()
+                    ))
+                db.commit()
+            except Exception as e:
+                db.rollback()
+                INGEST_BATCH_FAILURES.inc()
+                stats["batches_failed"] += 1
+                failed_paths.update(path for path, _ in batch)
+                failed_paths.update(done.path for done in done_files)
+                self.logger.error(f"Error ingesting batch of {len(batch)} hosts: {e}")
+                return
+            finally:
+                db.close()
+
+        latency = time.perf_counter() - t0
+        batch_latencies.append(latency)
+        INGEST_BATCH_SECONDS.observe(latency)
+        INGEST_HOSTS.inc(len(batch))
+        INGEST_NEW_ISSUES.inc(new_issues)
+        stats["batches"] += 1
+        stats["hosts"] += len(batch)
+        stats["new_issues"] += new_issues
+        stats["files_ingested"] += len(completed)
+
+        if self.advisory_index is not None and advisories:
+            self.advisory_index.add(advisories)
+
+        if self.on_commit is not None and batch:
+            try:
+                self.on_commit({"hosts": changes, "new_issues": new_issues})
+            except Exception as e:
+                self.logger.error(f"Ingest commit callback failed: {e}")
+
+    def _pending_files(self, file_paths: List[str], force: bool) -> List[Tuple[str, Tuple[int, float]]]:
+        """过滤掉指纹未变化且已入库的文件"""
+        fingerprints = []
+        for path in file_paths:
+            fingerprint = self._fingerprint(path)
+            if fingerprint is not None:
+                fingerprints.append((path, fingerprint))
+
+        if force or not fingerprints:
+            return fingerprints
+
+        db = self.session_factory()
+        try:
+            checkpoints = {
+                cp.path: (cp.size, cp.mtime)
+                for cp in db.query(IngestCheckpoint).filter(
+                    IngestCheckpoint.path.in_([path for path, _ in fingerprints])
+                )
+            }
+        finally:
+            db.close()
+
+        return [
+            (path, fingerprint) for path, fingerprint in fingerprints
+            if checkpoints.get(path) != fingerprint
+        ]
+
+    @staticmethod
+    def _fingerprint(path: str) -> Optional[Tuple[int, float]]:
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return st.st_size, st.st_mtime
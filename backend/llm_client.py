@@ -4,11 +4,24 @@ LLM 客户端
 """
 
 import os
+import copy
 import json
+import time
+import random
 import asyncio
-from typing import Optional, Dict, Any
+import threading
+from collections import OrderedDict, deque
+from typing import Optional, Dict, Any, List, Tuple, Callable, Awaitable
 from abc import ABC, abstractmethod
 from loguru import logger
+import httpx
+
+from rules import FixRuleEngine
+from metrics import (
+    LLM_SECONDS, LLM_TOKENS, LLM_ERRORS, LLM_RETRIES, LLM_HEDGES,
+    LLM_FALLBACKS, LLM_BREAKER_OPEN, LLM_COALESCED, LLM_INFLIGHT, LLM_BATCHES,
+    FIX_RULE_FIRST_TIER, SECGPT_SERVER_QUEUE_DEPTH
+)
 
 try:
     import openai
@@ -18,7 +31,7 @@ except ImportError:
     logger.warning("OpenAI library not available")
 
 try:
-    from transformers import AutoTokenizer, AutoModelForCausalLM
+    from transformers import AutoTokenizer, AutoModelForCausalLM, StoppingCriteria, StoppingCriteriaList
     import torch
     TRANSFORMERS_AVAILABLE = True
 except ImportError:
@@ -26,6 +39,38 @@ except ImportError:
     logger.warning("Transformers library not available")
 
 
+# 旧版本写入数据库的失败占位命令，视为未生成
+LEGACY_ERROR_PREFIX = "# Error generating fix command"
+
+
+def is_failed_fix_command(command: Optional[str]) -> bool:
+    """是否为旧版本遗留的失败占位命令"""
+    return bool(command) and command.startswith(LEGACY_ERROR_PREFIX)
+
+
+class LLMProviderError(Exception):
+    """单个提供方生成失败"""
+    
+    def __init__(self, message: str, retryable: bool = False, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retryable = retryable
+        self.retry_after = retry_after
+
+
+class BatchParseError(LLMProviderError):
+    """批量响应无法解析（由调用方拆分批次重试）"""
+    pass
+
+
+# 批量模式要求模型输出的 JSON 结构
+BATCH_FORMAT = '{"fixes": [{"cve": "CVE-XXXX-XXXX", "command": "apt update && apt install --only-upgrade -y package"}]}'
+
+
+class LLMGenerationError(Exception):
+    """所有提供方均生成失败"""
+    pass
+
+
 class BaseLLMClient(ABC):
     """LLM 客户端基类"""
     
@@ -38,44 +83,105 @@ class BaseLLMClient(ABC):
 class OpenAIClient(BaseLLMClient):
     """OpenAI GPT 客户端"""
     
-    def __init__(self, api_key: str = None, model: str = "gpt-3.5-turbo"):
+    def __init__(self, api_key: str = None, model: str = None, base_url: str = None):
         if not OPENAI_AVAILABLE:
             raise ImportError("OpenAI library is required for OpenAI client")
         
         self.api_key = api_key or os.getenv("OPENAI_API_KEY")
-        self.model = model
-        self.client = openai.AsyncOpenAI(api_key=self.api_key)
+        self.model = model or os.getenv("OPENAI_MODEL", "gpt-3.5-turbo")
+        # 可指向任意 OpenAI 兼容服务（代理、本地模拟服务等）
+        self.base_url = base_url or os.getenv("OPENAI_BASE_URL") or None
         
         if not self.api_key:
             raise ValueError("OpenAI API key is required")
+        
+        # 重试由 LLMClient 统一处理
+        self.client = openai.AsyncOpenAI(api_key=self.api_key, base_url=self.base_url, max_retries=0)
+    
+    SYSTEM_PROMPT = "你是一个专业的网络安全专家，专门负责生成Linux系统漏洞的修复命令。请提供准确、安全的Shell命令来修复指定的CVE漏洞。"
     
     async def generate_fix_command(self, cve: str, summary: str, **kwargs) -> str:
-        """使用 OpenAI GPT 生成修复命令"""
+        """使用 OpenAI GPT 生成修复命令（失败时抛出 LLMProviderError）"""
+        prompt = self._build_prompt(cve, summary, **kwargs)
+        return self._extract_command(await self._complete(prompt, max_tokens=500))
+    
+    async def stream_fix_command(self, cve: str, summary: str, on_token: Callable[[str], None], **kwargs) -> str:
+        """流式生成修复命令：每收到一段增量文本调用 on_token，返回提取后的完整命令"""
+        prompt = self._build_prompt(cve, summary, **kwargs)
+        return self._extract_command(await self._complete(prompt, max_tokens=500, on_token=on_token))
+    
+    async def generate_fix_commands(self, items: List[Dict[str, Any]], os_info: str = "Linux") -> Dict[str, str]:
+        """
+        一次请求生成多个 CVE 的修复命令（要求模型输出 JSON）
+        
+        Args:
+            items: [{"cve", "summary", "package"}]，同一主机/操作系统
+            os_info: 操作系统
+        
+        Returns:
+            {cve: command}，只包含响应中解析出的 CVE
+        
+        Raises:
+            BatchParseError: 响应不是合法的 JSON 结构
+        """
+        prompt = self._build_batch_prompt(items, os_info)
+        response = await self._complete(prompt, max_tokens=min(4000, 200 * len(items) + 100))
+        return self._parse_batch_response(response, {item["cve"] for item in items})
+    
+    async def _complete(self, prompt: str, max_tokens: int, on_token: Optional[Callable[[str], None]] = None) -> str:
+        """调用 chat completions 并把 SDK 异常转换为 LLMProviderError；指定 on_token 时使用流式响应"""
         try:
-            prompt = self._build_prompt(cve, summary, **kwargs)
-            
             response = await self.client.chat.completions.create(
                 model=self.model,
                 messages=[
-                    {
-                        "role": "system",
-                        "content": "你是一个专业的网络安全专家，专门负责生成Linux系统漏洞的修复命令。请提供准确、安全的Shell命令来修复指定的CVE漏洞。"
-                    },
-                    {
-                        "role": "user",
-                        "content": prompt
-                    }
+                    {"role": "system", "content": self.SYSTEM_PROMPT},
+                    {"role": "user", "content": prompt}
                 ],
-                max_tokens=500,
-                temperature=0.3
+                max_tokens=max_tokens,
+                temperature=0.3,
+                stream=on_token is not None
             )
             
-            fix_command = response.choices[0].message.content.strip()
-            return self._extract_command(fix_command)
+            if on_token is not None:
+                # 流式响应不带 usage，completion token 按增量块数计
+                parts = []
+                async for chunk in response:
+                    delta = chunk.choices[0].delta.content if chunk.choices else None
+                    if delta:
+                        parts.append(delta)
+                        on_token(delta)
+                LLM_TOKENS.labels("openai", "completion").inc(len(parts))
+                content = "".join(parts).strip()
+            else:
+                usage = getattr(response, "usage", None)
+                if usage is not None:
+                    LLM_TOKENS.labels("openai", "prompt").inc(usage.prompt_tokens or 0)
+                    LLM_TOKENS.labels("openai", "completion").inc(usage.completion_tokens or 0)
+                content = (response.choices[0].message.content or "").strip()
+            
+            if not content:
+                raise LLMProviderError("OpenAI returned an empty response", retryable=True)
+            return content
             
+        except LLMProviderError:
+            raise
+        except openai.RateLimitError as e:
+            raise LLMProviderError(f"OpenAI rate limited: {e}", retryable=True, retry_after=self._retry_after(e))
+        except openai.APIStatusError as e:
+            retryable = e.status_code >= 500 or e.status_code in (408, 409)
+            raise LLMProviderError(f"OpenAI API error {e.status_code}: {e}", retryable=retryable)
+        except (openai.APITimeoutError, openai.APIConnectionError) as e:
+            raise LLMProviderError(f"OpenAI connection error: {e}", retryable=True)
         except Exception as e:
-            logger.error(f"OpenAI API error: {e}")
-            return f"# Error generating fix command for {cve}: {e}"
+            raise LLMProviderError(f"OpenAI API error: {e}")
+    
+    @staticmethod
+    def _retry_after(error) -> Optional[float]:
+        """读取 429 响应的 Retry-After"""
+        try:
+            return float(error.response.headers.get("retry-after"))
+        except (AttributeError, TypeError, ValueError):
+            return None
     
     def _build_prompt(self, cve: str, summary: str, **kwargs) -> str:
         """构建修复命令生成的提示词"""
@@ -120,44 +226,208 @@ systemctl restart service-name
                 commands.append(line)
         
         return ' && '.join(commands) if commands else response.strip()
+    
+    def _build_batch_prompt(self, items: List[Dict[str, Any]], os_info: str) -> str:
+        """构建多 CVE 的批量提示词，说明部分只出现一次"""
+        blocks = "\n".join(
+            f"{n}. CVE编号: {item['cve']}\n   受影响包: {item.get('package') or ''}\n   漏洞描述: {item.get('summary') or ''}"
+            for n, item in enumerate(items, 1)
+        )
+        return f"""
+请为以下 {len(items)} 个CVE漏洞分别生成修复命令，操作系统: {os_info}
+
+{blocks}
+
+要求：
+1. 每个CVE提供具体的Shell命令，优先使用包管理器更新（如apt, yum, dnf等）
+2. 如果需要重启服务，请包含相关命令
+3. 确保命令的安全性和准确性
+4. 只返回JSON，不要包含解释文字，格式：
+{BATCH_FORMAT}
+"""
+    
+    def _parse_batch_response(self, response: str, expected: set) -> Dict[str, str]:
+        """解析批量响应；结构不合法时抛出 BatchParseError"""
+        text = response.strip()
+        if text.startswith("```"):
+            text = text.strip("`")
+            text = text[text.find("\n") + 1:] if "\n" in text else ""
+        start, end = text.find("{"), text.rfind("}")
+        try:
+            data = json.loads(text[start:end + 1]) if start >= 0 else None
+        except ValueError:
+            data = None
+        fixes = data.get("fixes") if isinstance(data, dict) else None
+        if not isinstance(fixes, list):
+            raise BatchParseError("Batched response is not valid JSON")
+        
+        commands = {}
+        for fix in fixes:
+            if not isinstance(fix, dict):
+                continue
+            cve, command = fix.get("cve"), fix.get("command")
+            if cve in expected and isinstance(command, str) and command.strip():
+                commands[cve] = self._extract_command(command)
+        return commands
+
+
+# SecGPT 提示词的固定指令前缀：放在最前面，CPU 配置下只编码一次并复用其 KV 缓存
+SECGPT_PREAMBLE = """### 漏洞修复任务
+
+根据以下漏洞信息生成修复此漏洞的Shell命令，只输出命令本身，每行一条，不要解释。
+
+"""
+
+# 命令块结束标志：生成到这些序列即停止（空行、下一个标题、代码块结束）
+SECGPT_STOP_SEQUENCES = ("\n\n", "\n###", "\n```")
+
+# 推理配置：default 与原实现一致；cpu 为 CPU 部署的默认值（int8 动态量化、短输出、提前停止、前缀 KV 复用）
+SECGPT_PROFILES = {
+    "default": {"quantize": "none", "max_new_tokens": 200, "stop": False, "prefix_cache": False},
+    "cpu": {"quantize": "int8", "max_new_tokens": 64, "stop": True, "prefix_cache": True},
+}
+
+
+if TRANSFORMERS_AVAILABLE:
+    class StopOnSequences(StoppingCriteria):
+        """生成文本（不含提示词）出现任一停止序列时结束；批量生成时所有行都结束才停止"""
+
+        def __init__(self, tokenizer, prompt_length: int, stop_sequences: Tuple[str, ...]):
+            self.tokenizer = tokenizer
+            self.prompt_length = prompt_length
+            self.stop_sequences = stop_sequences
+
+        def __call__(self, input_ids, scores, **kwargs) -> bool:
+            generated = input_ids[:, self.prompt_length:]
+            if generated.shape[1] == 0:
+                return False
+            for row in generated:
+                text = self.tokenizer.decode(row, skip_special_tokens=True).lstrip()
+                if not any(stop in text for stop in self.stop_sequences):
+                    return False
+            return True
+
+
+def _env_flag(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value is None or value == "":
+        return default
+    return value.lower() in ("1", "true", "yes", "on")
 
 
 class SecGPTClient(BaseLLMClient):
-    """SecGPT-mini 本地客户端"""
+    """
+    SecGPT-mini 本地客户端
+
+    SECGPT_PROFILE=cpu 启用 CPU 推理配置：Linear 层 int8 动态量化、max_new_tokens 上限、
+    命令块结束即停止、固定指令前缀的 KV 缓存复用；各项可用 SECGPT_QUANTIZE / SECGPT_MAX_NEW_TOKENS /
+    SECGPT_STOP_SEQUENCES / SECGPT_PREFIX_CACHE 单独覆盖，SECGPT_THREADS 设置 torch 计算线程数。
+    """
     
-    def __init__(self, model_path: str = "secgpt-mini-1.5b"):
+    def __init__(
+        self,
+        model_path: str = None,
+        device: str = None,
+        profile: str = None,
+        quantize: str = None,
+        max_new_tokens: int = None,
+        stop: bool = None,
+        prefix_cache: bool = None,
+        threads: int = None
+    ):
         if not TRANSFORMERS_AVAILABLE:
             raise ImportError("Transformers library is required for SecGPT client")
         
-        self.model_path = model_path
+        self.model_path = model_path or os.getenv("SECGPT_MODEL_PATH", "secgpt-mini-1.5b")
         self.tokenizer = None
         self.model = None
-        self.device = "cuda" if torch.cuda.is_available() else "cpu"
+        device = device or os.getenv("SECGPT_DEVICE")
+        if device == "cuda" and not torch.cuda.is_available():
+            device = None
+        self.device = device or ("cuda" if torch.cuda.is_available() else "cpu")
         
+        self.profile = profile or os.getenv("SECGPT_PROFILE") or "default"
+        if self.profile not in SECGPT_PROFILES:
+            raise ValueError(f"Unknown SecGPT profile {self.profile!r}, expected one of {sorted(SECGPT_PROFILES)}")
+        defaults = SECGPT_PROFILES[self.profile]
+        self.quantize = (quantize or os.getenv("SECGPT_QUANTIZE") or defaults["quantize"]).lower()
+        self.max_new_tokens = max_new_tokens or int(os.getenv("SECGPT_MAX_NEW_TOKENS") or defaults["max_new_tokens"])
+        self.stop_sequences = SECGPT_STOP_SEQUENCES if (
+            stop if stop is not None else _env_flag("SECGPT_STOP_SEQUENCES", defaults["stop"])
+        ) else ()
+        self.prefix_cache = prefix_cache if prefix_cache is not None else _env_flag(
+            "SECGPT_PREFIX_CACHE", defaults["prefix_cache"]
+        )
+        self.threads = threads or int(os.getenv("SECGPT_THREADS") or 0)
+        self._prefix_ids = None
+        self._prefix_past = None
+        
+        self._configure_threads()
         self._load_model()
     
+    def _configure_threads(self):
+        """设置 torch 线程数（intra-op = SECGPT_THREADS，inter-op 固定为 1：解码是串行的逐 token 计算）"""
+        if self.device != "cpu" or self.threads <= 0:
+            return
+        torch.set_num_threads(self.threads)
+        try:
+            torch.set_num_interop_threads(1)
+        except RuntimeError:
+            # 进程内已有并行计算后不能再修改 inter-op 线程数
+            pass
+        logger.info(f"SecGPT torch threads: intra-op={torch.get_num_threads()}")
+    
     def _load_model(self):
         """加载 SecGPT 模型"""
         try:
-            logger.info(f"Loading SecGPT model from {self.model_path}")
+            logger.info(f"Loading SecGPT model from {self.model_path} (profile={self.profile})")
             self.tokenizer = AutoTokenizer.from_pretrained(self.model_path)
             self.model = AutoModelForCausalLM.from_pretrained(
                 self.model_path,
                 torch_dtype=torch.float16 if self.device == "cuda" else torch.float32,
-                device_map="auto" if self.device == "cuda" else None
+                device_map="auto" if self.device == "cuda" else None,
+                low_cpu_mem_usage=True
             )
+            self.model.eval()
             
             if self.tokenizer.pad_token is None:
                 self.tokenizer.pad_token = self.tokenizer.eos_token
             
+            if self.quantize == "int8":
+                if self.device == "cpu":
+                    # 只量化 Linear 层权重，激活在运行时动态量化；模型体积和内存带宽约降为 1/4
+                    self.model = torch.quantization.quantize_dynamic(
+                        self.model, {torch.nn.Linear}, dtype=torch.qint8
+                    )
+                else:
+                    logger.warning("SECGPT_QUANTIZE=int8 only applies to CPU inference, ignored")
+            elif self.quantize != "none":
+                raise ValueError(f"Unsupported SECGPT_QUANTIZE {self.quantize!r}, expected int8 or none")
+            
+            if self.prefix_cache:
+                self._encode_prefix()
+            
             logger.info("SecGPT model loaded successfully")
             
         except Exception as e:
             logger.error(f"Failed to load SecGPT model: {e}")
             raise
     
+    def _encode_prefix(self):
+        """对固定指令前缀做一次前向计算，缓存其 token 和 past_key_values"""
+        self._prefix_ids = self.tokenizer(SECGPT_PREAMBLE, return_tensors="pt").input_ids.to(self.device)
+        with torch.no_grad():
+            self._prefix_past = self.model(self._prefix_ids, use_cache=True).past_key_values
+        logger.info(f"SecGPT prompt prefix cached ({self._prefix_ids.shape[1]} tokens)")
+    
+    def _prefix_cache_copy(self):
+        # 旧版元组缓存在生成时不会被原地修改；Cache 对象会被追加，需要复制
+        if isinstance(self._prefix_past, tuple):
+            return self._prefix_past
+        return copy.deepcopy(self._prefix_past)
+    
     async def generate_fix_command(self, cve: str, summary: str, **kwargs) -> str:
-        """使用 SecGPT 生成修复命令"""
+        """使用 SecGPT 生成修复命令（失败时抛出 LLMProviderError）"""
         try:
             prompt = self._build_prompt(cve, summary, **kwargs)
             
@@ -170,46 +440,99 @@ class SecGPTClient(BaseLLMClient):
             return self._extract_command(fix_command)
             
         except Exception as e:
-            logger.error(f"SecGPT generation error: {e}")
-            return f"# Error generating fix command for {cve}: {e}"
+            raise LLMProviderError(f"SecGPT generation error: {e}")
+    
+    def _generate_kwargs(self, prompt_length: int) -> Dict[str, Any]:
+        kwargs = {
+            "max_new_tokens": self.max_new_tokens,
+            "temperature": 0.3,
+            "do_sample": True,
+            "pad_token_id": self.tokenizer.pad_token_id,
+            "num_return_sequences": 1
+        }
+        if self.stop_sequences:
+            kwargs["stopping_criteria"] = StoppingCriteriaList(
+                [StopOnSequences(self.tokenizer, prompt_length, self.stop_sequences)]
+            )
+        return kwargs
     
     def _generate_sync(self, prompt: str) -> str:
         """同步生成文本"""
-        inputs = self.tokenizer.encode(prompt, return_tensors="pt")
-        if self.device == "cuda":
-            inputs = inputs.to(self.device)
+        kwargs = {}
+        if self._prefix_past is not None and prompt.startswith(SECGPT_PREAMBLE):
+            # 前缀与其余部分分别编码再拼接，保证前缀 token 与缓存一致；只计算前缀之后的 token
+            suffix = self.tokenizer(
+                prompt[len(SECGPT_PREAMBLE):], add_special_tokens=False, return_tensors="pt"
+            ).input_ids.to(self.device)
+            inputs = torch.cat([self._prefix_ids, suffix], dim=1)
+            kwargs["past_key_values"] = self._prefix_cache_copy()
+        else:
+            inputs = self.tokenizer.encode(prompt, return_tensors="pt").to(self.device)
         
+        prompt_length = inputs.shape[1]
         with torch.no_grad():
             outputs = self.model.generate(
                 inputs,
-                max_length=inputs.shape[1] + 200,
-                temperature=0.3,
-                do_sample=True,
-                pad_token_id=self.tokenizer.eos_token_id,
-                num_return_sequences=1
+                attention_mask=torch.ones_like(inputs),
+                **self._generate_kwargs(prompt_length),
+                **kwargs
             )
         
-        generated_text = self.tokenizer.decode(outputs[0], skip_special_tokens=True)
-        # 移除原始提示词，只保留生成的部分
-        response = generated_text[len(prompt):].strip()
-        return response
+        completion = outputs[0, prompt_length:]
+        LLM_TOKENS.labels("secgpt", "prompt").inc(prompt_length)
+        LLM_TOKENS.labels("secgpt", "completion").inc(completion.shape[0])
+        
+        # 只解码生成的部分
+        return self._trim_stop(self.tokenizer.decode(completion, skip_special_tokens=True))
+    
+    def _generate_batch_sync(self, prompts: List[str]) -> List[str]:
+        """
+        同步批量生成（左侧填充后一次 generate），供推理服务合批使用
+
+        左侧填充会使前缀位置随行变化，批量模式不复用前缀 KV 缓存。
+        """
+        if len(prompts) == 1:
+            return [self._generate_sync(prompts[0])]
+        
+        self.tokenizer.padding_side = "left"
+        inputs = self.tokenizer(prompts, return_tensors="pt", padding=True)
+        if self.device == "cuda":
+            inputs = inputs.to(self.device)
+        
+        prompt_length = inputs["input_ids"].shape[1]
+        with torch.no_grad():
+            outputs = self.model.generate(**inputs, **self._generate_kwargs(prompt_length))
+        
+        completions = outputs[:, prompt_length:]
+        LLM_TOKENS.labels("secgpt", "prompt").inc(int(inputs["attention_mask"].sum()))
+        LLM_TOKENS.labels("secgpt", "completion").inc(int((completions != self.tokenizer.pad_token_id).sum()))
+        
+        return [
+            self._trim_stop(self.tokenizer.decode(completion, skip_special_tokens=True))
+            for completion in completions
+        ]
+    
+    def _trim_stop(self, text: str) -> str:
+        """截掉第一个停止序列及之后的内容（批量生成时先结束的行会继续生成到整批停止）"""
+        text = text.strip()
+        for stop in self.stop_sequences:
+            position = text.find(stop)
+            if position != -1:
+                text = text[:position]
+        return text.strip()
     
     def _build_prompt(self, cve: str, summary: str, **kwargs) -> str:
-        """构建 SecGPT 的提示词"""
+        """构建 SecGPT 的提示词（固定前缀 + 漏洞信息）"""
         os_info = kwargs.get('os', 'Linux')
         package = kwargs.get('package', '')
         
-        prompt = f"""### 漏洞修复任务
-
-CVE: {cve}
+        return SECGPT_PREAMBLE + f"""CVE: {cve}
 描述: {summary}
 系统: {os_info}
 包: {package}
 
-请生成修复此漏洞的Shell命令：
-
+命令：
 """
-        return prompt
     
     def _extract_command(self, response: str) -> str:
         """从响应中提取Shell命令"""
@@ -227,100 +550,627 @@ CVE: {cve}
         return ' && '.join(commands) if commands else response.strip()
 
 
+class RemoteSecGPTClient(BaseLLMClient):
+    """
+    共享 SecGPT 推理服务客户端（见 model_server.py）
+    
+    多个 API worker 共用推理服务进程中的一份模型；地址为 unix:///路径 或 http://主机:端口。
+    """
+    
+    def __init__(self, server_url: str = None, timeout: float = None):
+        self.server_url = server_url or os.getenv("SECGPT_SERVER_URL")
+        if not self.server_url:
+            raise ValueError("SECGPT_SERVER_URL is required for the SecGPT server client")
+        
+        timeout = timeout if timeout is not None else float(os.getenv("SECGPT_SERVER_TIMEOUT", "120"))
+        if self.server_url.startswith("unix://"):
+            transport = httpx.AsyncHTTPTransport(uds=self.server_url[len("unix://"):])
+            base_url = "http://secgpt"
+        else:
+            transport = None
+            base_url = self.server_url.rstrip("/")
+        self.client = httpx.AsyncClient(base_url=base_url, transport=transport, timeout=timeout)
+    
+    async def generate_fix_command(self, cve: str, summary: str, **kwargs) -> str:
+        """请求推理服务生成修复命令（失败时抛出 LLMProviderError）"""
+        payload = {
+            "cve": cve,
+            "summary": summary,
+            "package": kwargs.get("package") or "",
+            "os": kwargs.get("os") or "Linux"
+        }
+        try:
+            response = await self.client.post("/generate", json=payload)
+        except httpx.TimeoutException as e:
+            raise LLMProviderError(f"SecGPT server timed out: {e}", retryable=True)
+        except httpx.HTTPError as e:
+            raise LLMProviderError(f"SecGPT server unreachable: {e}", retryable=True)
+        
+        self._record_queue_depth(response)
+        if response.status_code == 503:
+            retry_after = response.headers.get("retry-after")
+            raise LLMProviderError(
+                "SecGPT server queue is full", retryable=True,
+                retry_after=float(retry_after) if retry_after else None
+            )
+        if response.status_code != 200:
+            raise LLMProviderError(
+                f"SecGPT server error {response.status_code}: {response.text[:200]}",
+                retryable=response.status_code >= 500
+            )
+        
+        command = (response.json().get("command") or "").strip()
+        if not command:
+            raise LLMProviderError("SecGPT server returned an empty command", retryable=True)
+        return command
+    
+    async def health(self) -> Dict[str, Any]:
+        """推理服务健康状态（模型是否加载、队列深度等）"""
+        try:
+            response = await self.client.get("/health", timeout=5.0)
+            response.raise_for_status()
+        except httpx.HTTPError as e:
+            return {"status": "unreachable", "error": str(e)}
+        self._record_queue_depth(response)
+        return response.json()
+    
+    @staticmethod
+    def _record_queue_depth(response):
+        depth = response.headers.get("x-queue-depth")
+        if depth is not None and depth.isdigit():
+            SECGPT_SERVER_QUEUE_DEPTH.set(int(depth))
+
+
+def _current_task() -> Optional["asyncio.Task"]:
+    try:
+        return asyncio.current_task()
+    except RuntimeError:
+        return None
+
+
+class CircuitBreaker:
+    """
+    熔断器
+
+    连续失败 failure_threshold 次后打开，reset_timeout 秒内跳过该提供方；
+    之后进入半开状态放行一次试探请求，成功则关闭，失败则重新打开。
+    指定 name 时状态变化同步到 fixpilot_llm_circuit_open 指标（半开视为未打开）。
+    试探请求被取消或以未记录结果的异常结束时，由调用方 release_probe() 释放试探名额，
+    否则熔断器会一直停在半开状态拒绝所有请求。
+    """
+    
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0, name: Optional[str] = None):
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._probing = False
+        # 放行试探请求的任务，只有它能释放试探名额
+        self._probe_owner = None
+        self._lock = threading.Lock()
+        self._set_gauge(False)
+    
+    def _set_gauge(self, is_open: bool):
+        if self.name is not None:
+            LLM_BREAKER_OPEN.labels(self.name).set(1 if is_open else 0)
+    
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+    
+    def allow(self) -> bool:
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half_open" and not self._probing:
+                self._probing = True
+                self._probe_owner = _current_task()
+                self._set_gauge(False)
+                return True
+            return False
+    
+    def release_probe(self):
+        """当前任务放行的试探请求没有记录结果就结束时释放试探名额（其他情况无操作）"""
+        with self._lock:
+            if self._probing and self._probe_owner is _current_task():
+                self._probing = False
+                self._probe_owner = None
+    
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._probing = False
+            self._probe_owner = None
+            self._set_gauge(False)
+    
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._probing or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+                self._set_gauge(True)
+            self._probing = False
+            self._probe_owner = None
+
+
+class FixGeneration:
+    """一次修复命令生成的结果"""
+    
+    __slots__ = ("command", "provider", "degraded")
+    
+    def __init__(self, command: str, provider: str, degraded: bool):
+        self.command = command
+        self.provider = provider
+        # 由回退提供方生成（不应持久化，下次仍尝试首选提供方）
+        self.degraded = degraded
+
+
+class _ProviderSlot:
+    """提供方及其熔断器、延迟样本"""
+    
+    def __init__(self, name: str, client: BaseLLMClient, breaker: CircuitBreaker, hedge: bool):
+        self.name = name
+        self.client = client
+        self.breaker = breaker
+        # 只对远程服务做对冲请求，本地推理重复执行没有意义
+        self.hedge = hedge
+        self.latencies: "deque[float]" = deque(maxlen=200)
+    
+    def latency_quantile(self, q: float, min_samples: int = 20) -> Optional[float]:
+        if len(self.latencies) < min_samples:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
 class LLMClient:
-    """LLM 客户端管理器"""
+    """
+    LLM 客户端管理器
     
-    def __init__(self, provider: str = "auto"):
+    按 OpenAI → SecGPT → 模板 的顺序组成回退链（从配置的首选提供方开始）。
+    每个远程提供方：429/5xx 指数退避加抖动重试、超过延迟阈值时发出对冲请求、
+    连续失败时熔断。每次调用独立回退，首选提供方恢复后自动切回。
+    失败的 (提供方, CVE) 在 negative_ttl 秒内直接跳过。
+    提示词相同的并发调用合并为一次（single-flight），共享同一个结果。
+    batch_size > 1 且首选提供方支持时，generate_batch 把同一主机的多个 CVE 打包为一次请求。
+    rules_first_tier 开启时，规则引擎中 first_tier 规则命中的 CVE 直接用模板命令，不调用 LLM。
+    generate 指定 on_token 时，支持流式输出的提供方逐段回调生成的文本（不发对冲请求）。
+    """
+    
+    PROVIDER_ORDER = ("openai", "secgpt", "template")
+    
+    def __init__(
+        self,
+        provider: str = "auto",
+        max_attempts: int = None,
+        base_delay: float = None,
+        max_delay: float = None,
+        timeout: float = None,
+        hedge_delay: str = None,
+        breaker_threshold: int = None,
+        breaker_reset: float = None,
+        negative_ttl: float = None,
+        batch_size: int = None,
+        rules_first_tier: bool = None
+    ):
         self.provider = provider
         self.client = None
+        self.providers: List[_ProviderSlot] = []
+        
+        self.max_attempts = max(1, max_attempts or int(os.getenv("LLM_MAX_ATTEMPTS", "3")))
+        self.base_delay = base_delay if base_delay is not None else float(os.getenv("LLM_RETRY_BASE_DELAY", "0.5"))
+        self.max_delay = max_delay if max_delay is not None else float(os.getenv("LLM_RETRY_MAX_DELAY", "8"))
+        self.timeout = timeout if timeout is not None else float(os.getenv("LLM_TIMEOUT", "30"))
+        # auto：按最近延迟的 p95 对冲；0 关闭；数字为固定秒数
+        self.hedge_delay = (hedge_delay or os.getenv("LLM_HEDGE_DELAY", "auto")).strip().lower()
+        self.breaker_threshold = breaker_threshold or int(os.getenv("LLM_BREAKER_THRESHOLD", "5"))
+        self.breaker_reset = breaker_reset if breaker_reset is not None else float(os.getenv("LLM_BREAKER_RESET", "30"))
+        self.negative_ttl = negative_ttl if negative_ttl is not None else float(os.getenv("LLM_NEGATIVE_TTL", "60"))
+        # 每个批量请求最多包含的 CVE 数，1 表示逐条生成
+        self.batch_size = max(1, batch_size or int(os.getenv("LLM_BATCH_SIZE", "1")))
+        self.rules_first_tier = rules_first_tier if rules_first_tier is not None else (
+            os.getenv("LLM_RULES_FIRST_TIER", "true").lower() == "true"
+        )
+        self.rule_engine = FixRuleEngine.from_file()
+        
+        self._negative: "OrderedDict[Tuple[str, str, str, str], float]" = OrderedDict()
+        self._negative_max = 4096
+        
+        # 按提示词合并的在途调用
+        self._inflight: Dict[str, "asyncio.Future[FixGeneration]"] = {}
+        self.coalesced = 0
         
         self._initialize_client()
     
     def _initialize_client(self):
-        """初始化 LLM 客户端"""
-        if self.provider == "openai" or (self.provider == "auto" and os.getenv("OPENAI_API_KEY")):
+        """初始化回退链"""
+        if self.provider == "auto":
+            start = "openai" if os.getenv("OPENAI_API_KEY") else "secgpt"
+        elif self.provider in self.PROVIDER_ORDER:
+            start = self.provider
+        else:
+            raise ValueError(f"Unknown LLM provider: {self.provider}")
+        
+        factories = {
+            "openai": OpenAIClient,
+            # 配置了共享推理服务时不在本进程加载模型
+            "secgpt": RemoteSecGPTClient if os.getenv("SECGPT_SERVER_URL") else SecGPTClient,
+            "template": lambda: TemplateClient(self.rule_engine)
+        }
+        for name in self.PROVIDER_ORDER[self.PROVIDER_ORDER.index(start):]:
             try:
-                self.client = OpenAIClient()
-                self.provider = "openai"
-                logger.info("Using OpenAI client")
+                client = factories[name]()
             except Exception as e:
-                logger.warning(f"Failed to initialize OpenAI client: {e}")
-                if self.provider == "openai":
+                logger.warning(f"Failed to initialize {name} client: {e}")
+                # 显式指定的首选提供方不可用时直接报错
+                if name == self.provider:
                     raise
+                continue
+            
+            self.providers.append(_ProviderSlot(
+                name, client,
+                CircuitBreaker(self.breaker_threshold, self.breaker_reset, name=name),
+                hedge=(name == "openai")
+            ))
+        
+        primary = self.providers[0]
+        self.client = primary.client
+        self.provider = primary.name
+        logger.info(f"Using LLM providers: {' -> '.join(slot.name for slot in self.providers)}")
+    
+    async def generate_fix_command(self, cve: str, summary: str, **kwargs) -> str:
+        """生成修复命令"""
+        return (await self.generate(cve, summary, **kwargs)).command
+    
+    async def generate(
+        self,
+        cve: str,
+        summary: str,
+        on_token: Optional[Callable[[Optional[str]], None]] = None,
+        **kwargs
+    ) -> FixGeneration:
+        """
+        生成修复命令，并返回实际使用的提供方
+        
+        提示词相同的并发调用共享一次生成；调用方被取消不会影响其他等待者。
+        
+        Args:
+            on_token: 流式回调，参数为增量文本；重试或回退前已输出过文本时以 None 调用，
+                表示丢弃之前的部分输出。合并到已有在途调用时不回调，只返回结果
+        
+        Raises:
+            LLMGenerationError: 回退链上所有提供方都失败
+        """
+        if self.rules_first_tier:
+            command = self.rule_engine.render(
+                cve, summary, kwargs.get("package") or "", kwargs.get("os"), first_tier_only=True
+            )
+            if command is not None:
+                FIX_RULE_FIRST_TIER.inc()
+                return FixGeneration(command, "rules", degraded=False)
+        
+        key = self._coalesce_key(cve, summary, kwargs)
+        loop = asyncio.get_running_loop()
+        task = self._inflight.get(key)
+        if task is not None and task.get_loop() is loop and not task.done():
+            self.coalesced += 1
+            LLM_COALESCED.inc()
+        else:
+            task = loop.create_task(self._generate(cve, summary, on_token, **kwargs))
+            self._inflight[key] = task
+            LLM_INFLIGHT.set(len(self._inflight))
+            task.add_done_callback(lambda done, key=key: self._release(key, done))
+        return await asyncio.shield(task)
+    
+    def _coalesce_key(self, cve: str, summary: str, kwargs: Dict[str, Any]) -> str:
+        """合并键：首选提供方构建的完整提示词"""
+        build_prompt = getattr(self.providers[0].client, "_build_prompt", None)
+        if build_prompt is not None:
+            return build_prompt(cve, summary, **kwargs)
+        return "\x00".join([cve, summary] + [f"{k}={kwargs[k]}" for k in sorted(kwargs)])
+    
+    def _release(self, key: str, task: "asyncio.Future[FixGeneration]"):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        LLM_INFLIGHT.set(len(self._inflight))
+        # 没有等待者时也要取出异常，避免 "exception was never retrieved"
+        if not task.cancelled():
+            task.exception()
+    
+    async def _generate(
+        self,
+        cve: str,
+        summary: str,
+        on_token: Optional[Callable[[Optional[str]], None]] = None,
+        **kwargs
+    ) -> FixGeneration:
+        key = (cve, str(kwargs.get("package") or ""), str(kwargs.get("os") or ""))
+        errors = []
+        streamed = False
+        
+        def emit(delta: str):
+            nonlocal streamed
+            streamed = True
+            on_token(delta)
+        
+        def call_factory(slot: _ProviderSlot) -> Callable[[], Awaitable[str]]:
+            stream = getattr(slot.client, "stream_fix_command", None) if on_token is not None else None
+            
+            async def call() -> str:
+                nonlocal streamed
+                # 上一次尝试已输出部分文本，通知调用方丢弃
+                if streamed:
+                    streamed = False
+                    on_token(None)
+                if stream is not None:
+                    return await stream(cve, summary, on_token=emit, **kwargs)
+                return await slot.client.generate_fix_command(cve, summary, **kwargs)
+            
+            return call
         
-        if self.client is None and (self.provider == "secgpt" or self.provider == "auto"):
+        for index, slot in enumerate(self.providers):
+            is_last = index == len(self.providers) - 1
+            if not is_last:
+                if self._is_negative(slot.name, key):
+                    continue
+                if not slot.breaker.allow():
+                    LLM_FALLBACKS.labels(slot.name, "circuit_open").inc()
+                    continue
+            
+            start = time.perf_counter()
             try:
-                self.client = SecGPTClient()
-                self.provider = "secgpt"
-                logger.info("Using SecGPT client")
+                # 流式调用不对冲，避免两路输出交错
+                command = await self._call_with_retry(slot, call_factory(slot), hedge=on_token is None)
             except Exception as e:
-                logger.warning(f"Failed to initialize SecGPT client: {e}")
-                if self.provider == "secgpt":
+                LLM_ERRORS.labels(slot.name).inc()
+                LLM_FALLBACKS.labels(slot.name, "error").inc()
+                self._set_negative(slot.name, key)
+                errors.append(f"{slot.name}: {e}")
+                logger.warning(f"LLM provider {slot.name} failed for {cve}: {e}")
+                continue
+            finally:
+                LLM_SECONDS.labels(slot.name).observe(time.perf_counter() - start)
+            
+            return FixGeneration(command, slot.name, degraded=index > 0)
+        
+        raise LLMGenerationError(f"All LLM providers failed for {cve}: " + "; ".join(errors))
+    
+    async def generate_batch(
+        self,
+        items: List[Dict[str, Any]],
+        os_info: Optional[str] = None,
+        batch_size: Optional[int] = None
+    ) -> Dict[str, FixGeneration]:
+        """
+        为同一主机/操作系统的多个 CVE 生成修复命令
+        
+        首选提供方按 batch_size 分批请求；响应不合法时对半拆分重试，
+        拆到单条或批量失败的 CVE 走 generate（含重试与回退）。
+        
+        Args:
+            items: [{"cve", "summary", "package"}]
+            os_info: 操作系统
+            batch_size: 覆盖默认批大小
+        
+        Returns:
+            {cve: FixGeneration}，所有提供方都失败的 CVE 不在结果中
+        """
+        unique = list({item["cve"]: item for item in items}.values())
+        size = max(1, batch_size or self.batch_size)
+        primary = self.providers[0]
+        results: Dict[str, FixGeneration] = {}
+        
+        if self.rules_first_tier:
+            for cve, command in self.rule_engine.render_many(unique, os_info, first_tier_only=True).items():
+                results[cve] = FixGeneration(command, "rules", degraded=False)
+            FIX_RULE_FIRST_TIER.inc(len(results))
+            unique = [item for item in unique if item["cve"] not in results]
+        
+        if size > 1 and len(unique) > 1 and hasattr(primary.client, "generate_fix_commands"):
+            chunks = [unique[i:i + size] for i in range(0, len(unique), size)]
+            await asyncio.gather(*(
+                self._generate_chunk(primary, chunk, os_info or "Linux", results) for chunk in chunks
+            ))
+        
+        async def single(item: Dict[str, Any]):
+            try:
+                results[item["cve"]] = await self.generate(
+                    item["cve"], item.get("summary") or "", package=item.get("package") or "", os=os_info
+                )
+            except LLMGenerationError as e:
+                logger.error(str(e))
+        
+        await asyncio.gather(*(single(item) for item in unique if item["cve"] not in results))
+        return results
+    
+    async def _generate_chunk(
+        self,
+        slot: _ProviderSlot,
+        chunk: List[Dict[str, Any]],
+        os_info: str,
+        results: Dict[str, FixGeneration]
+    ):
+        """生成一个批次；响应不合法时对半拆分，其他失败留给逐条回退"""
+        if len(chunk) < 2 or not slot.breaker.allow():
+            return
+        try:
+            commands = await self._call_with_retry(
+                slot, lambda: slot.client.generate_fix_commands(chunk, os_info), hedge=False
+            )
+        except BatchParseError as e:
+            LLM_BATCHES.labels("split").inc()
+            logger.warning(f"Splitting batch of {len(chunk)} CVEs: {e}")
+            middle = len(chunk) // 2
+            await asyncio.gather(
+                self._generate_chunk(slot, chunk[:middle], os_info, results),
+                self._generate_chunk(slot, chunk[middle:], os_info, results)
+            )
+            return
+        except LLMProviderError as e:
+            LLM_BATCHES.labels("error").inc()
+            logger.warning(f"Batch of {len(chunk)} CVEs failed on {slot.name}: {e}")
+            return
+        
+        LLM_BATCHES.labels("ok").inc()
+        for cve, command in commands.items():
+            results[cve] = FixGeneration(command, slot.name, degraded=False)
+    
+    async def _call_with_retry(self, slot: _ProviderSlot, call: Callable[[], Awaitable[Any]], hedge: bool = True) -> Any:
+        """
+        对单个提供方重试（指数退避 + 全抖动，优先使用 Retry-After）
+
+        调用方在同一任务中先经 breaker.allow() 放行；调用被取消（客户端断开、对冲落败）
+        或抛出未计入熔断的异常时，在 finally 中释放半开试探名额
+        """
+        try:
+            for attempt in range(self.max_attempts):
+                try:
+                    result = await self._call_with_hedge(slot, call, hedge)
+                except BatchParseError:
+                    # 服务可用，只是输出不合法，不计入熔断
+                    slot.breaker.record_success()
                     raise
+                except LLMProviderError as e:
+                    slot.breaker.record_failure()
+                    if not e.retryable or attempt == self.max_attempts - 1 or slot.breaker.state == "open":
+                        raise
+                    delay = e.retry_after if e.retry_after is not None else random.uniform(
+                        0, min(self.max_delay, self.base_delay * (2 ** attempt))
+                    )
+                    LLM_RETRIES.labels(slot.name).inc()
+                    await asyncio.sleep(min(delay, self.max_delay))
+                    continue
+                
+                slot.breaker.record_success()
+                return result
+        finally:
+            slot.breaker.release_probe()
+    
+    async def _call_with_hedge(self, slot: _ProviderSlot, call: Callable[[], Awaitable[Any]], hedge: bool) -> Any:
+        """首个请求超过对冲阈值仍未返回时再发一个，取先成功的结果"""
+        delay = self._hedge_delay(slot) if hedge else None
+        if delay is None:
+            return await self._attempt(slot, call, record_latency=hedge)
         
-        if self.client is None:
-            # 回退到模板生成
-            self.client = TemplateClient()
-            self.provider = "template"
-            logger.info("Using template-based client")
+        first = asyncio.ensure_future(self._attempt(slot, call))
+        tasks = {first}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if not done:
+                LLM_HEDGES.labels(slot.name).inc()
+                tasks.add(asyncio.ensure_future(self._attempt(slot, call)))
+            
+            error = None
+            pending = tasks
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
     
-    async def generate_fix_command(self, cve: str, summary: str, **kwargs) -> str:
-        """生成修复命令"""
-        return await self.client.generate_fix_command(cve, summary, **kwargs)
+    async def _attempt(self, slot: _ProviderSlot, call: Callable[[], Awaitable[Any]], record_latency: bool = True) -> Any:
+        start = time.perf_counter()
+        try:
+            result = await asyncio.wait_for(call(), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            raise LLMProviderError(f"{slot.name} timed out after {self.timeout}s", retryable=True)
+        except LLMProviderError:
+            raise
+        except Exception as e:
+            raise LLMProviderError(f"{slot.name} error: {e}")
+        
+        # 批量请求的延迟不代表单条请求，不参与对冲阈值
+        if record_latency:
+            slot.latencies.append(time.perf_counter() - start)
+        return result
+    
+    def _hedge_delay(self, slot: _ProviderSlot) -> Optional[float]:
+        if not slot.hedge or self.hedge_delay in ("0", "off", "false", ""):
+            return None
+        if self.hedge_delay == "auto":
+            return slot.latency_quantile(0.95)
+        try:
+            return float(self.hedge_delay)
+        except ValueError:
+            return None
+    
+    def _is_negative(self, provider: str, key: Tuple[str, str, str]) -> bool:
+        expires = self._negative.get((provider,) + key)
+        if expires is None:
+            return False
+        if expires < time.monotonic():
+            self._negative.pop((provider,) + key, None)
+            return False
+        return True
+    
+    def _set_negative(self, provider: str, key: Tuple[str, str, str]):
+        if self.negative_ttl <= 0:
+            return
+        full_key = (provider,) + key
+        self._negative[full_key] = time.monotonic() + self.negative_ttl
+        self._negative.move_to_end(full_key)
+        while len(self._negative) > self._negative_max:
+            self._negative.popitem(last=False)
+    
+    async def health(self) -> Dict[str, Any]:
+        """各提供方健康状态：远程推理服务实时探测，其余按熔断器状态"""
+        providers = {}
+        for slot in self.providers:
+            probe = getattr(slot.client, "health", None)
+            status = await probe() if probe is not None else {"status": "ok"}
+            status["circuit"] = slot.breaker.state
+            providers[slot.name] = status
+        healthy = any(
+            status.get("status") == "ok" and status["circuit"] != "open"
+            for status in providers.values()
+        )
+        return {"status": "ok" if healthy else "degraded", "providers": providers}
+    
+    def stats(self) -> Dict[str, Any]:
+        """各提供方熔断状态与延迟"""
+        providers = []
+        for slot in self.providers:
+            state = slot.breaker.state
+            p50 = slot.latency_quantile(0.5, min_samples=1)
+            p95 = slot.latency_quantile(0.95, min_samples=1)
+            providers.append({
+                "name": slot.name,
+                "circuit": state,
+                "consecutive_failures": slot.breaker.failures,
+                "latency_p50": round(p50, 4) if p50 is not None else None,
+                "latency_p95": round(p95, 4) if p95 is not None else None,
+                "hedge_delay": self._hedge_delay(slot)
+            })
+        return {
+            "providers": providers,
+            "negative_cache_entries": len(self._negative),
+            "inflight": len(self._inflight),
+            "coalesced": self.coalesced
+        }
 
 
 class TemplateClient(BaseLLMClient):
-    """基于模板的修复命令生成器（回退方案）"""
-    
-    def __init__(self):
-        self.templates = {
-            "package_update": "apt update && apt upgrade -y {package}",
-            "service_restart": "systemctl restart {service}",
-            "kernel_update": "apt update && apt upgrade -y linux-image-generic && reboot",
-            "security_update": "apt update && apt upgrade -y && apt autoremove -y",
-            "default": "# Manual review required for {cve}: {summary}"
-        }
+    """基于模板的修复命令生成器（回退方案，规则见 fix_rules.yaml）"""
+    
+    def __init__(self, rule_engine: Optional[FixRuleEngine] = None):
+        self.rule_engine = rule_engine or FixRuleEngine.from_file()
     
     async def generate_fix_command(self, cve: str, summary: str, **kwargs) -> str:
         """基于模板生成修复命令"""
-        package = kwargs.get('package', '')
-        
-        # 简单的规则匹配
-        summary_lower = summary.lower()
-        
-        if package and any(keyword in summary_lower for keyword in ['package', 'library', 'component']):
-            return self.templates["package_update"].format(package=package.split(':')[0])
-        elif any(keyword in summary_lower for keyword in ['kernel', 'linux kernel']):
-            return self.templates["kernel_update"]
-        elif any(keyword in summary_lower for keyword in ['service', 'daemon', 'server']):
-            service = self._extract_service_name(summary, package)
-            return self.templates["service_restart"].format(service=service)
-        elif any(keyword in summary_lower for keyword in ['security', 'vulnerability']):
-            return self.templates["security_update"]
-        else:
-            return self.templates["default"].format(cve=cve, summary=summary[:100])
-    
-    def _extract_service_name(self, summary: str, package: str) -> str:
-        """从描述中提取服务名称"""
-        if package:
-            return package.split(':')[0]
-        
-        # 常见服务名称映射
-        service_mapping = {
-            'apache': 'apache2',
-            'nginx': 'nginx',
-            'mysql': 'mysql',
-            'postgresql': 'postgresql',
-            'ssh': 'ssh',
-            'openssh': 'ssh'
-        }
-        
-        summary_lower = summary.lower()
-        for keyword, service in service_mapping.items():
-            if keyword in summary_lower:
-                return service
-        
-        return "unknown-service"
+        return self.rule_engine.render(cve, summary, kwargs.get('package', ''), kwargs.get('os'))
 
 
 if __name__ == "__main__":
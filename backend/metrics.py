@@ -0,0 +1,489 @@
+"""
+运行指标
+功能：轻量的 Prometheus 风格计数器/仪表/直方图，供 /metrics 以文本格式暴露
+
+标签组合对应的子指标在首次使用时创建并缓存，热路径上只做一次字典查找和加锁累加；
+固定标签的子指标可在模块加载时预先取出，完全避免逐次调用的分配。
+"""
+
+import time
+import bisect
+import threading
+import contextvars
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+from loguru import logger
+
+
+# 默认耗时分桶（秒）
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# 默认大小分桶（字节）
+SIZE_BUCKETS = (1024, 8192, 65536, 262144, 1048576, 4194304, 16777216, 67108864)
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _label_text(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _CounterChild:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self.value += amount
+
+
+class _GaugeChild:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def set(self, value: float):
+        self.value = value
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1.0):
+        self.inc(-amount)
+
+
+class _Timer:
+    """with 语句计时，退出时记录到直方图"""
+
+    __slots__ = ("child", "start")
+
+    def __init__(self, child: "_HistogramChild"):
+        self.child = child
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.child.observe(time.perf_counter() - self.start)
+        return False
+
+
+class _HistogramChild:
+    __slots__ = ("upper_bounds", "counts", "sum", "count", "_lock")
+
+    def __init__(self, upper_bounds: Tuple[float, ...]):
+        self.upper_bounds = upper_bounds
+        # 最后一格对应 +Inf
+        self.counts = [0] * (len(upper_bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect.bisect_left(self.upper_bounds, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def time(self) -> _Timer:
+        return _Timer(self)
+
+
+class _Metric:
+    """指标基类：按标签值缓存子指标"""
+
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+        if not self.labelnames:
+            self._default = self.labels()
+
+    def labels(self, *values: str):
+        """取出（必要时创建）标签值对应的子指标"""
+        child = self._children.get(values)
+        if child is not None:
+            return child
+        if len(values) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {values}")
+        with self._lock:
+            child = self._children.get(values)
+            if child is None:
+                child = self._new_child()
+                self._children[values] = child
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def collect(self) -> List[str]:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type_name}"
+        ]
+        for values, child in list(self._children.items()):
+            lines.extend(self._sample_lines(values, child))
+        return lines
+
+    def _sample_lines(self, values: Tuple[str, ...], child) -> List[str]:
+        return [f"{self.name}{_label_text(self.labelnames, values)} {_format_value(child.value)}"]
+
+
+class Counter(_Metric):
+    """单调递增计数器"""
+
+    type_name = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1.0):
+        self._default.inc(amount)
+
+
+class Gauge(_Metric):
+    """可增可减的瞬时值"""
+
+    type_name = "gauge"
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def set(self, value: float):
+        self._default.set(value)
+
+    def inc(self, amount: float = 1.0):
+        self._default.inc(amount)
+
+    def dec(self, amount: float = 1.0):
+        self._default.dec(amount)
+
+
+class Histogram(_Metric):
+    """分桶直方图"""
+
+    type_name = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS
+    ):
+        self.upper_bounds = tuple(sorted(float(b) for b in buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.upper_bounds)
+
+    def observe(self, value: float):
+        self._default.observe(value)
+
+    def time(self) -> _Timer:
+        return self._default.time()
+
+    def _sample_lines(self, values: Tuple[str, ...], child: _HistogramChild) -> List[str]:
+        with child._lock:
+            counts = list(child.counts)
+            total = child.sum
+            count = child.count
+
+        lines = []
+        cumulative = 0
+        for bound, n in zip(self.upper_bounds + (float("inf"),), counts):
+            cumulative += n
+            le = 'le="' + _format_value(bound) + '"'
+            lines.append(f"{self.name}_bucket{_label_text(self.labelnames, values, le)} {cumulative}")
+        labels = _label_text(self.labelnames, values)
+        lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+        lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """指标注册表"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Callable[[], None]] = []
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Duplicate metric: {metric.name}")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS
+    ) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def add_collector(self, collector: Callable[[], None]):
+        """注册抓取前回调（用于把缓存命中数等外部状态同步到仪表）"""
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        """输出 Prometheus 文本格式 (0.0.4)"""
+        for collector in self._collectors:
+            try:
+                collector()
+            except Exception as e:
+                logger.error(f"Metrics collector failed: {e}")
+
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.collect())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+CONTENT_TYPE = "text/plain; version=0.0.4"
+
+# 解析
+PARSE_SECONDS = REGISTRY.histogram(
+    "fixpilot_parse_file_seconds", "Time to parse one Vuls result file"
+)
+PARSE_BYTES = REGISTRY.histogram(
+    "fixpilot_parse_file_bytes", "Size of parsed Vuls result files", buckets=SIZE_BUCKETS
+)
+PARSE_ERRORS = REGISTRY.counter(
+    "fixpilot_parse_errors_total", "Result files that failed to parse"
+)
+
+# 入库
+INGEST_HOSTS = REGISTRY.counter(
+    "fixpilot_ingest_hosts_total", "Host results committed to the database"
+)
+INGEST_NEW_ISSUES = REGISTRY.counter(
+    "fixpilot_ingest_new_issues_total", "New issues committed to the database"
+)
+INGEST_BATCH_SECONDS = REGISTRY.histogram(
+    "fixpilot_ingest_batch_seconds", "Time to commit one ingest batch"
+)
+INGEST_BATCH_FAILURES = REGISTRY.counter(
+    "fixpilot_ingest_batch_failures_total", "Ingest batches rolled back"
+)
+INGEST_HOSTS_PER_SECOND = REGISTRY.gauge(
+    "fixpilot_ingest_hosts_per_second", "Throughput of the last ingest run"
+)
+
+# HTTP 与数据库
+HTTP_SECONDS = REGISTRY.histogram(
+    "fixpilot_http_request_seconds", "HTTP request latency by route", ("method", "route", "status")
+)
+DB_QUERY_SECONDS = REGISTRY.histogram(
+    "fixpilot_db_query_seconds", "Database statement latency by route", ("route",)
+)
+
+# LLM
+LLM_SECONDS = REGISTRY.histogram(
+    "fixpilot_llm_request_seconds", "Fix command generation latency", ("provider",)
+)
+LLM_TOKENS = REGISTRY.counter(
+    "fixpilot_llm_tokens_total", "LLM tokens consumed", ("provider", "kind")
+)
+LLM_ERRORS = REGISTRY.counter(
+    "fixpilot_llm_errors_total", "Failed fix command generations", ("provider",)
+)
+LLM_RETRIES = REGISTRY.counter(
+    "fixpilot_llm_retries_total", "LLM request retries after 429/5xx/timeouts", ("provider",)
+)
+LLM_HEDGES = REGISTRY.counter(
+    "fixpilot_llm_hedged_requests_total", "Hedged LLM requests issued for slow calls", ("provider",)
+)
+LLM_FALLBACKS = REGISTRY.counter(
+    "fixpilot_llm_fallbacks_total", "Calls that skipped or fell through a provider", ("provider", "reason")
+)
+LLM_BREAKER_OPEN = REGISTRY.gauge(
+    "fixpilot_llm_circuit_open", "Whether the provider circuit breaker is open", ("provider",)
+)
+LLM_COALESCED = REGISTRY.counter(
+    "fixpilot_llm_coalesced_total", "Fix command requests that joined an identical in-flight call"
+)
+LLM_INFLIGHT = REGISTRY.gauge(
+    "fixpilot_llm_inflight", "Distinct fix command generations currently in flight"
+)
+FIX_RULE_FIRST_TIER = REGISTRY.counter(
+    "fixpilot_fix_rule_first_tier_total", "Fix commands produced by first-tier template rules without an LLM call"
+)
+SECGPT_SERVER_QUEUE_DEPTH = REGISTRY.gauge(
+    "fixpilot_secgpt_server_queue_depth", "Queue depth last reported by the shared SecGPT server"
+)
+LLM_BATCHES = REGISTRY.counter(
+    "fixpilot_llm_batches_total", "Batched multi-CVE requests by outcome (ok/split/error)", ("result",)
+)
+
+# 修复命令缓存（已存库的 fix_command 视为命中）
+FIX_CACHE = REGISTRY.counter(
+    "fixpilot_fix_cache_requests_total", "Stored fix command lookups", ("result",)
+)
+FIX_CACHE_HIT = FIX_CACHE.labels("hit")
+FIX_CACHE_MISS = FIX_CACHE.labels("miss")
+
+# 修复公告索引（离线解析修复命令，未解析的才调用 LLM）
+ADVISORY_LOOKUPS = REGISTRY.counter(
+    "fixpilot_advisory_lookups_total", "Fix commands resolved from the advisory index", ("result",)
+)
+
+# 读接口响应缓存（抓取时从 ResponseCache.stats() 同步）
+RESPONSE_CACHE_LOOKUPS = REGISTRY.gauge(
+    "fixpilot_response_cache_lookups", "Response cache lookups since start", ("result",)
+)
+RESPONSE_CACHE_ENTRIES = REGISTRY.gauge(
+    "fixpilot_response_cache_entries", "Entries held by the in-memory response cache"
+)
+
+# SecGPT 推理服务进程（model_server.py 的 /metrics）
+MODEL_QUEUE_DEPTH = REGISTRY.gauge(
+    "fixpilot_model_queue_depth", "Generation requests waiting in the inference queue"
+)
+MODEL_QUEUE_WAIT_SECONDS = REGISTRY.histogram(
+    "fixpilot_model_queue_wait_seconds", "Time a request waited before its batch started"
+)
+MODEL_BATCH_SIZE = REGISTRY.histogram(
+    "fixpilot_model_batch_size", "Prompts per inference batch", buckets=(1, 2, 4, 8, 16, 32, 64)
+)
+MODEL_INFERENCE_SECONDS = REGISTRY.histogram(
+    "fixpilot_model_inference_seconds", "Wall time of one batched generate call"
+)
+MODEL_REJECTED = REGISTRY.counter(
+    "fixpilot_model_rejected_total", "Requests rejected because the inference queue was full"
+)
+
+# Playbook
+PLAYBOOK_RENDER_SECONDS = REGISTRY.histogram(
+    "fixpilot_playbook_render_seconds", "Time to plan and render a playbook"
+)
+PLAYBOOK_BYTES = REGISTRY.histogram(
+    "fixpilot_playbook_bytes", "Size of rendered playbooks", buckets=SIZE_BUCKETS
+)
+EXPORT_ROWS = REGISTRY.counter(
+    "fixpilot_export_rows_total", "Rows written by /export", ("format",)
+)
+EXPORT_BYTES = REGISTRY.counter(
+    "fixpilot_export_bytes_total", "Bytes streamed by /export", ("format",)
+)
+PLAYBOOK_VALIDATIONS = REGISTRY.counter(
+    "fixpilot_playbook_validations_total", "Playbook syntax check results", ("result",)
+)
+PLAYBOOK_VALIDATION_SECONDS = REGISTRY.histogram(
+    "fixpilot_playbook_validation_seconds", "Duration of one ansible-playbook --syntax-check invocation"
+)
+PLAYBOOK_VALIDATION_CACHE = REGISTRY.counter(
+    "fixpilot_playbook_validation_cache_total", "Playbook syntax check cache lookups", ("result",)
+)
+PLAYBOOK_STREAM_FIRST_RESULT_SECONDS = REGISTRY.histogram(
+    "fixpilot_playbook_stream_first_result_seconds", "Time from request to the first fix command on /playbook/stream"
+)
+RESPONSE_BYTES = REGISTRY.counter(
+    "fixpilot_response_bytes_total", "Response body bytes sent by the compression middleware", ("encoding",)
+)
+RESPONSE_COMPRESSION_SECONDS = REGISTRY.histogram(
+    "fixpilot_response_compression_seconds", "Time spent compressing one response body", ("encoding",)
+)
+
+
+# 当前请求的 ASGI scope，供数据库语句计时按路由归类
+_current_scope: "contextvars.ContextVar[Optional[dict]]" = contextvars.ContextVar(
+    "fixpilot_metrics_scope", default=None
+)
+
+
+def route_label(scope: Optional[dict]) -> str:
+    """路由模板作为标签（未匹配的路径统一归类，避免标签基数膨胀）"""
+    if scope is None:
+        return "background"
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+
+class MetricsMiddleware:
+    """ASGI 中间件：按路由模板统计请求耗时，并为数据库计时提供路由上下文"""
+
+    def __init__(self, app, skip_paths: Sequence[str] = ("/metrics",)):
+        self.app = app
+        self.skip_paths = frozenset(skip_paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.skip_paths:
+            await self.app(scope, receive, send)
+            return
+
+        status = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        token = _current_scope.set(scope)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current_scope.reset(token)
+            HTTP_SECONDS.labels(scope["method"], route_label(scope), str(status[0])).observe(
+                time.perf_counter() - start
+            )
+
+
+def instrument_engine(engine):
+    """为 SQLAlchemy 引擎注册语句计时（路由取自当前请求上下文）"""
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        starts = conn.info.get("query_start_time")
+        if starts:
+            DB_QUERY_SECONDS.labels(route_label(_current_scope.get())).observe(
+                time.perf_counter() - starts.pop()
+            )
+
+    @event.listens_for(engine, "handle_error")
+    def _error(context):
+        # 语句失败时不会触发 after_cursor_execute，弹出对应的开始时间
+        conn = context.connection
+        if conn is not None and conn.info.get("query_start_time"):
+            conn.info["query_start_time"].pop()
@@ -0,0 +1,260 @@
+"""
+SecGPT 推理服务
+功能：独立进程加载一份 SecGPT 模型，通过 Unix socket 或本机 HTTP 供所有 API worker 共享；
+请求进入有界队列，按 max_batch / max_wait 合批推理，推理在专用线程中执行，不占用 API 进程的 CPU 和 GIL
+
+用法（在 backend 目录下）：
+    python model_server.py --uds /tmp/fixpilot-secgpt.sock
+    python model_server.py --host 127.0.0.1 --port 8901
+API 进程设置 SECGPT_SERVER_URL=unix:///tmp/fixpilot-secgpt.sock（或 http://127.0.0.1:8901）即可使用。
+"""
+
+import os
+import time
+import asyncio
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import JSONResponse, Response
+from pydantic import BaseModel
+from loguru import logger
+
+from metrics import (
+    REGISTRY, CONTENT_TYPE, MODEL_QUEUE_DEPTH, MODEL_QUEUE_WAIT_SECONDS,
+    MODEL_BATCH_SIZE, MODEL_INFERENCE_SECONDS, MODEL_REJECTED
+)
+
+
+class QueueFullError(Exception):
+    """推理队列已满"""
+    pass
+
+
+class InferenceQueue:
+    """
+    合批推理队列
+
+    首个请求到达后最多等待 max_wait 秒凑满 max_batch 条再推理；
+    推理在单个专用线程中串行执行（模型只有一份）。
+    """
+
+    def __init__(
+        self,
+        generate_batch: Callable[[List[str]], List[str]],
+        max_batch: int = 8,
+        max_wait: float = 0.02,
+        max_queue: int = 256
+    ):
+        self.generate_batch = generate_batch
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max(0.0, max_wait)
+        self.max_queue = max(1, max_queue)
+        self.requests = 0
+        self.batches = 0
+        self.rejected = 0
+        self.in_flight = 0
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="secgpt-infer")
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def start(self):
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._worker = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+        self._executor.shutdown(wait=False)
+
+    async def submit(self, prompt: str) -> Tuple[str, float, int]:
+        """
+        提交一条提示词并等待结果
+
+        Returns:
+            (生成文本, 排队时间秒, 所在批次大小)
+
+        Raises:
+            QueueFullError: 队列已满
+        """
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self._queue.put_nowait((prompt, time.perf_counter(), future))
+        except asyncio.QueueFull:
+            self.rejected += 1
+            MODEL_REJECTED.inc()
+            raise QueueFullError(f"Inference queue is full ({self.max_queue})")
+        self.requests += 1
+        MODEL_QUEUE_DEPTH.set(self.depth)
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+            MODEL_QUEUE_DEPTH.set(self.depth)
+
+            # 等待期间已被取消的请求不再推理
+            batch = [item for item in batch if not item[2].done()]
+            if not batch:
+                continue
+
+            started = time.perf_counter()
+            for _, enqueued, _ in batch:
+                MODEL_QUEUE_WAIT_SECONDS.observe(started - enqueued)
+            MODEL_BATCH_SIZE.observe(len(batch))
+
+            self.in_flight = len(batch)
+            try:
+                outputs = await loop.run_in_executor(
+                    self._executor, self.generate_batch, [prompt for prompt, _, _ in batch]
+                )
+                if len(outputs) != len(batch):
+                    raise RuntimeError(f"Model returned {len(outputs)} outputs for {len(batch)} prompts")
+            except Exception as e:
+                logger.error(f"Inference batch of {len(batch)} failed: {e}")
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            finally:
+                self.in_flight = 0
+                MODEL_INFERENCE_SECONDS.observe(time.perf_counter() - started)
+
+            self.batches += 1
+            for (_, enqueued, future), output in zip(batch, outputs):
+                if not future.done():
+                    future.set_result((output, started - enqueued, len(batch)))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queue_depth": self.depth,
+            "max_queue": self.max_queue,
+            "max_batch": self.max_batch,
+            "max_wait_ms": round(self.max_wait * 1000, 1),
+            "in_flight": self.in_flight,
+            "requests": self.requests,
+            "batches": self.batches,
+            "rejected": self.rejected
+        }
+
+
+class GenerateRequest(BaseModel):
+    cve: str
+    summary: str = ""
+    package: str = ""
+    os: str = "Linux"
+
+
+def create_model_server(
+    model,
+    max_batch: int = 8,
+    max_wait: float = 0.02,
+    max_queue: int = 256
+) -> FastAPI:
+    """
+    创建推理服务应用
+
+    Args:
+        model: 提供 _build_prompt / _extract_command / _generate_batch_sync 的模型客户端（SecGPTClient）
+        max_batch: 每批最多提示词数
+        max_wait: 凑批最长等待（秒）
+        max_queue: 排队上限，超出返回 503
+    """
+    app = FastAPI(title="FixPilot SecGPT Server")
+    queue = InferenceQueue(model._generate_batch_sync, max_batch, max_wait, max_queue)
+    app.state.queue = queue
+
+    def queue_headers() -> Dict[str, str]:
+        return {"X-Queue-Depth": str(queue.depth)}
+
+    @app.on_event("startup")
+    async def start_queue():
+        queue.start()
+
+    @app.on_event("shutdown")
+    async def stop_queue():
+        await queue.stop()
+
+    @app.post("/generate")
+    async def generate(request: GenerateRequest):
+        prompt = model._build_prompt(request.cve, request.summary, package=request.package, os=request.os)
+        try:
+            output, waited, batch_size = await queue.submit(prompt)
+        except QueueFullError as e:
+            return JSONResponse({"detail": str(e)}, status_code=503, headers={"Retry-After": "1", **queue_headers()})
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Generation failed: {e}")
+        return JSONResponse(
+            {
+                "command": model._extract_command(output),
+                "batch_size": batch_size,
+                "queue_wait_ms": round(waited * 1000, 2)
+            },
+            headers=queue_headers()
+        )
+
+    @app.get("/health")
+    async def health():
+        return JSONResponse(
+            {"status": "ok", "model": getattr(model, "model_path", None), **queue.stats()},
+            headers=queue_headers()
+        )
+
+    @app.get("/metrics")
+    async def metrics():
+        return Response(REGISTRY.render(), media_type=CONTENT_TYPE)
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="FixPilot SecGPT 推理服务")
+    parser.add_argument("--uds", default=os.getenv("SECGPT_SERVER_UDS"), help="Unix socket 路径（优先于 host/port）")
+    parser.add_argument("--host", default=os.getenv("SECGPT_SERVER_HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("SECGPT_SERVER_PORT", "8901")))
+    parser.add_argument("--model-path", default=None, help="模型路径，默认 SECGPT_MODEL_PATH")
+    parser.add_argument("--max-batch", type=int, default=int(os.getenv("SECGPT_SERVER_MAX_BATCH", "8")))
+    parser.add_argument("--max-wait-ms", type=float, default=float(os.getenv("SECGPT_SERVER_MAX_WAIT_MS", "20")))
+    parser.add_argument("--max-queue", type=int, default=int(os.getenv("SECGPT_SERVER_MAX_QUEUE", "256")))
+    args = parser.parse_args()
+
+    import uvicorn
+    from llm_client import SecGPTClient
+
+    app = create_model_server(
+        SecGPTClient(model_path=args.model_path),
+        max_batch=args.max_batch,
+        max_wait=args.max_wait_ms / 1000.0,
+        max_queue=args.max_queue
+    )
+    if args.uds:
+        if os.path.exists(args.uds):
+            os.unlink(args.uds)
+        logger.info(f"SecGPT server listening on unix://{args.uds}")
+        uvicorn.run(app, uds=args.uds, log_level="info")
+    else:
+        logger.info(f"SecGPT server listening on http://{args.host}:{args.port}")
+        uvicorn.run(app, host=args.host, port=args.port, log_level="info")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+数据库模型
+功能：数据库连接配置与 ORM 模型定义，供 API 与后台摄取任务共用
+"""
+
+import os
+from sqlalchemy import create_engine, Column, Integer, String, Float, DateTime, Text, Index
+from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import sessionmaker
+from datetime import datetime
+
+# 数据库配置
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./fixpilot.db")
+engine = create_engine(
+    DATABASE_URL,
+    connect_args={"check_same_thread": False} if DATABASE_URL.startswith("sqlite") else {}
+)
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+Base = declarative_base()
+
+# 漏洞状态
+ISSUE_STATUSES = ("open", "fixing", "fixed", "failed")
+
+# 数据模型
+class Host(Base):
+    __tablename__ = "hosts"
+
+    id = Column(Integer, primary_key=True, index=True)
+    ip = Column(String, unique=True, index=True)
+    hostname = Column(String)
+    os = Column(String)
+    last_scan = Column(DateTime)
+    risk_score = Column(Float, default=0.0)
+
+class Issue(Base):
+    __tablename__ = "issues"
+    __table_args__ = (
+        # 覆盖主机列表的按主机状态/严重程度计数（host_stats），分组计数只扫描索引
+        Index("ix_issues_host_status_cvss", "host_id", "status", "cvss"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    host_id = Column(Integer)
+    cve = Column(String, index=True)
+    summary = Column(Text)
+    cvss = Column(Float)
+    package = Column(String)
+    patchable = Column(String)
+    status = Column(String, default="open")  # open, fixing, fixed, failed
+    fix_command = Column(Text)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class IssueStatusHistory(Base):
+    """漏洞状态变更历史（只追加，不更新不删除）；同一次批量流转的记录共用 batch_id"""
+    __tablename__ = "issue_status_history"
+
+    id = Column(Integer, primary_key=True)
+    issue_id = Column(Integer, index=True)
+    host_id = Column(Integer)
+    from_status = Column(String)
+    to_status = Column(String)
+    batch_id = Column(String, index=True)
+    note = Column(Text)
+    changed_at = Column(DateTime, default=datetime.utcnow)
+
+class IssuePackage(Base):
+    """漏洞受影响的包（按包名建索引，支持“哪些主机受包 X 影响”查询）"""
+    __tablename__ = "issue_packages"
+    __table_args__ = (
+        Index("ix_issue_packages_name_host", "name", "host_id"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    issue_id = Column(Integer, index=True)
+    host_id = Column(Integer, index=True)
+    name = Column(String)
+    version = Column(String)
+    new_version = Column(String)
+    fixed_in = Column(String)
+
+class Advisory(Base):
+    """修复公告索引：某发行版上 CVE 涉及的包的修复版本（入库时从扫描结果的 FixedIn 累积）"""
+    __tablename__ = "advisories"
+    __table_args__ = (
+        Index("ix_advisories_key", "family", "release", "cve", "package", unique=True),
+    )
+
+    id = Column(Integer, primary_key=True)
+    family = Column(String)
+    release = Column(String)  # 发行版流：RPM 系为主版本号，其余为完整版本号
+    cve = Column(String)
+    package = Column(String)
+    fixed_version = Column(String)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+class IngestCheckpoint(Base):
+    """已入库的结果文件（按文件指纹记录，中断后可从断点继续）"""
+    __tablename__ = "ingest_checkpoints"
+
+    path = Column(String, primary_key=True)
+    size = Column(Integer)
+    mtime = Column(Float)
+    hosts = Column(Integer, default=0)
+    ingested_at = Column(DateTime, default=datetime.utcnow)
+
+class CacheGeneration(Base):
+    """响应缓存代数（单行；多个 worker 进程共享，写路径递增使各进程的缓存失效）"""
+    __tablename__ = "cache_generation"
+
+    id = Column(Integer, primary_key=True)
+    generation = Column(Integer, nullable=False, default=0)
+
+
+def init_db():
+    """创建所有数据表"""
+    Base.metadata.create_all(bind=engine)
@@ -5,12 +5,15 @@ Vuls JSON 解析器
 
 import json
 import os
+import time
 import pandas as pd
 from typing import List, Dict, Any
 from datetime import datetime
 from loguru import logger
 from pydantic import BaseModel, Field
 
+from metrics import PARSE_SECONDS, PARSE_BYTES, PARSE_ERRORS
+
 
 class VulnerabilityInfo(BaseModel):
     """漏洞信息模型"""
@@ -55,25 +58,73 @@ class VulsParser:
             return []
         
         all_results = []
-        json_files = [f for f in os.listdir(results_dir) if f.endswith('.json')]
+        json_files = self.list_result_files(results_dir)
         
         if not json_files:
             self.logger.warning(f"No JSON files found in {results_dir}")
             return []
         
-        for json_file in json_files:
-            file_path = os.path.join(results_dir, json_file)
+        for file_path in json_files:
             try:
                 result = self._parse_single_file(file_path)
                 if result:
                     all_results.extend(result)
             except Exception as e:
-                self.logger.error(f"Error parsing {json_file}: {e}")
+                self.logger.error(f"Error parsing {os.path.basename(file_path)}: {e}")
                 continue
         
         self.logger.info(f"Parsed {len(all_results)} host results from {len(json_files)} files")
         return all_results
     
+    def list_result_files(self, results_dir: str = "./results") -> List[str]:
+        """
+        列出扫描结果目录中的 JSON 文件
+        
+        Args:
+            results_dir: 扫描结果目录路径
+            
+        Returns:
+            JSON 文件路径列表（按文件名排序）
+        """
+        if not os.path.exists(results_dir):
+            return []
+        
+        return [
+            os.path.join(results_dir, f)
+            for f in sorted(os.listdir(results_dir))
+            if f.endswith('.json')
+        ]
+    
+    def parse_file(self, file_path: str, strict: bool = False) -> List[Dict[str, Any]]:
+        """
+        解析单个扫描结果文件（出错时记录日志并返回空列表）
+        
+        Args:
+            file_path: JSON 文件路径
+            strict: 出错时记录日志后重新抛出异常（入库流水线据此区分解析失败和空文件）
+            
+        Returns:
+            解析后的主机信息列表
+        """
+        start = time.perf_counter()
+        try:
+            results = self._parse_single_file(file_path)
+        except Exception as e:
+            PARSE_ERRORS.inc()
+            self.logger.error(f"Error parsing {os.path.basename(file_path)}: {e}")
+            if strict:
+                raise
+            return []
+        
+        PARSE_SECONDS.observe(time.perf_counter() - start)
+        try:
+            PARSE_BYTES.observe(os.path.getsize(file_path))
+        except OSError:
+            pass
+        
+        self.logger.info(f"Parsed {len(results)} host results from {file_path}")
+        return results
+    
     def _parse_single_file(self, file_path: str) -> List[Dict[str, Any]]:
         """
         解析单个 JSON 文件
@@ -123,6 +174,8 @@ class VulsParser:
                 "ip": self._extract_ip(data, server_name),
                 "hostname": data.get('ServerName', server_name or ''),
                 "os": self._extract_os_info(data),
+                "family": (data.get('Family') or '').lower(),
+                "release": data.get('Release') or '',
                 "kernel": data.get('Kernel', {}).get('Release', ''),
                 "scan_time": data.get('ScannedAt', ''),
                 "issues": [],
@@ -132,7 +185,9 @@ class VulsParser:
             # 解析漏洞信息
             vulnerabilities = data.get('ScannedCves', {})
             if vulnerabilities:
-                issues, risk_score = self._parse_vulnerabilities(vulnerabilities)
+                issues, risk_score = self._parse_vulnerabilities(
+                    vulnerabilities, data.get('Packages', {})
+                )
                 host_info["issues"] = issues
                 host_info["risk_score"] = risk_score
             
@@ -177,12 +232,17 @@ class VulsParser:
         else:
             return "unknown"
     
-    def _parse_vulnerabilities(self, vulnerabilities: Dict[str, Any]) -> tuple:
+    def _parse_vulnerabilities(
+        self, 
+        vulnerabilities: Dict[str, Any], 
+        host_packages: Dict[str, Any] = None
+    ) -> tuple:
         """
         解析漏洞信息
         
         Args:
             vulnerabilities: 漏洞数据字典
+            host_packages: 主机已安装包信息（Vuls 的 Packages 字段）
             
         Returns:
             (漏洞列表, 风险评分)
@@ -197,16 +257,18 @@ class VulsParser:
                 cvss_score = self._extract_cvss_score(cve_data)
                 
                 # 提取包信息
-                packages = self._extract_package_info(cve_data)
+                affected_packages = self._extract_affected_packages(cve_data, host_packages)
+                packages = self._extract_package_info(cve_data, affected_packages)
                 
                 # 判断是否可修复
-                patchable = self._check_patchable(cve_data)
+                patchable = self._check_patchable(cve_data, affected_packages)
                 
                 issue = {
                     "cve": cve_id,
                     "summary": cve_data.get('Summary', ''),
                     "cvss": cvss_score,
                     "package": packages,
+                    "packages": affected_packages,
                     "patchable": patchable,
                     "published": cve_data.get('PublishedDate', ''),
                     "modified": cve_data.get('LastModifiedDate', '')
@@ -249,19 +311,80 @@ class VulsParser:
         
         return 0.0
     
-    def _extract_package_info(self, cve_data: Dict[str, Any]) -> str:
-        """提取受影响的包信息"""
+    def _extract_affected_packages(
+        self, 
+        cve_data: Dict[str, Any], 
+        host_packages: Dict[str, Any] = None
+    ) -> List[Dict[str, str]]:
+        """
+        提取全部受影响的包及版本、修复版本信息
+        
+        兼容两种 AffectedPackages 格式：
+        - 列表：[{"Name", "FixedIn", "NotFixedYet"}]，版本信息从主机 Packages 补全
+        - 字典：{name: {"Version", "FixedIn", "NewVersion"}}
+        
+        Returns:
+            [{"name", "version", "new_version", "fixed_in"}]
+        """
+        host_packages = host_packages or {}
+        affected_packages = cve_data.get('AffectedPackages', {})
+        
+        if isinstance(affected_packages, dict):
+            entries = [
+                dict(pkg_info, Name=pkg_name)
+                for pkg_name, pkg_info in affected_packages.items()
+                if isinstance(pkg_info, dict)
+            ]
+        elif isinstance(affected_packages, list):
+            entries = [pkg_info for pkg_info in affected_packages if isinstance(pkg_info, dict)]
+        else:
+            entries = []
+        
+        packages = []
+        seen = set()
+        for pkg_info in entries:
+            name = pkg_info.get('Name', '')
+            if not name or name in seen:
+                continue
+            seen.add(name)
+            
+            installed = host_packages.get(name, {}) if isinstance(host_packages, dict) else {}
+            packages.append({
+                "name": name,
+                "version": pkg_info.get('Version') or self._join_version(
+                    installed.get('Version', ''), installed.get('Release', '')
+                ),
+                "new_version": pkg_info.get('NewVersion') or self._join_version(
+                    installed.get('NewVersion', ''), installed.get('NewRelease', '')
+                ),
+                "fixed_in": pkg_info.get('FixedIn', '') or ''
+            })
+        
+        return packages
+    
+    @staticmethod
+    def _join_version(version: str, release: str) -> str:
+        """拼接 Version 和 Release（如 1.1.1f-1ubuntu2.16）"""
+        if version and release:
+            return f"{version}-{release}"
+        return version or ''
+    
+    def _extract_package_info(
+        self, 
+        cve_data: Dict[str, Any], 
+        affected_packages: List[Dict[str, str]] = None
+    ) -> str:
+        """提取受影响的包信息（展示用字符串）"""
         packages = []
         
         # 从 AffectedPackages 提取
-        affected_packages = cve_data.get('AffectedPackages', {})
-        for pkg_name, pkg_info in affected_packages.items():
-            if isinstance(pkg_info, dict):
-                version = pkg_info.get('Version', '')
-                if version:
-                    packages.append(f"{pkg_name}:{version}")
-                else:
-                    packages.append(pkg_name)
+        if affected_packages is None:
+            affected_packages = self._extract_affected_packages(cve_data)
+        for pkg in affected_packages:
+            if pkg["version"]:
+                packages.append(f"{pkg['name']}:{pkg['version']}")
+            else:
+                packages.append(pkg["name"])
         
         # 从 Packages 提取
         if not packages:
@@ -271,18 +394,22 @@ class VulsParser:
         
         return ", ".join(packages[:3])  # 最多显示 3 个包
     
-    def _check_patchable(self, cve_data: Dict[str, Any]) -> str:
+    def _check_patchable(
+        self, 
+        cve_data: Dict[str, Any], 
+        affected_packages: List[Dict[str, str]] = None
+    ) -> str:
         """检查漏洞是否可修复"""
         # 检查是否有可用的补丁
         if cve_data.get('FixAvailable', False):
             return "yes"
         
         # 检查包是否有更新版本
-        affected_packages = cve_data.get('AffectedPackages', {})
-        for pkg_info in affected_packages.values():
-            if isinstance(pkg_info, dict):
-                if pkg_info.get('FixedIn') or pkg_info.get('NewVersion'):
-                    return "yes"
+        if affected_packages is None:
+            affected_packages = self._extract_affected_packages(cve_data)
+        for pkg in affected_packages:
+            if pkg["fixed_in"] or pkg["new_version"]:
+                return "yes"
         
         return "unknown"
     
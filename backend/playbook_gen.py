@@ -4,12 +4,123 @@ Ansible Playbook 生成器
 """
 
 import os
+import re
+import json
+import time
 import yaml
 from typing import List, Dict, Any
 from datetime import datetime
-from jinja2 import Template
+from jinja2 import Environment, Template
 from loguru import logger
 
+from metrics import PLAYBOOK_RENDER_SECONDS, PLAYBOOK_BYTES
+
+
+# 可合并为模块任务的包管理器命令
+PACKAGE_MANAGERS = {
+    "apt": "apt",
+    "apt-get": "apt",
+    "yum": "yum",
+    "dnf": "dnf"
+}
+
+# 含这些 shell 语法的命令不做拆解
+SHELL_META_RE = re.compile(r"[|<>`$()]")
+
+# yum/dnf 的版本锁定写法 name-[epoch:]version-release（advisory.pinned_command 生成的就是这种）；
+# 只有 version-release 完整时才视为锁定，java-1.8.0-openjdk、python3-2to3 这类包名不拆
+RPM_SPEC_RE = re.compile(r"^(.+?)-((?:\d+:)?\d[\w.+~]*-\d[\w.]*)$")
+
+# 可以从命令中去掉的包管理器选项（不带参数、不影响安装哪些包）；出现其他选项的命令原样保留
+PACKAGE_MANAGER_FLAGS = {
+    "-y", "--yes", "--assume-yes", "--assumeyes", "-q", "-qq", "--quiet", "-yq", "-qy",
+    "--only-upgrade", "--no-install-recommends", "--no-install-suggests", "--fix-missing",
+    "-f", "--fix-broken", "--nogpgcheck", "--refresh", "--best", "--allowerasing", "--skip-broken",
+    "--security", "--bugfix"
+}
+VERSION_TOKEN_RE = re.compile(r"~|\d+|[A-Za-z]+")
+
+
+def _dpkg_order(char: str) -> int:
+    if char == "~":
+        return -1
+    if char.isdigit() or not char:
+        return 0
+    if char.isalpha():
+        return ord(char)
+    return ord(char) + 256
+
+
+def _dpkg_verrevcmp(a: str, b: str) -> int:
+    """dpkg 的 upstream/revision 比较（~ 低于任何字符，含空）"""
+    i = j = 0
+    while i < len(a) or j < len(b):
+        first_diff = 0
+        while (i < len(a) and not a[i].isdigit()) or (j < len(b) and not b[j].isdigit()):
+            ac = _dpkg_order(a[i]) if i < len(a) else 0
+            bc = _dpkg_order(b[j]) if j < len(b) else 0
+            if ac != bc:
+                return ac - bc
+            i += 1
+            j += 1
+        while i < len(a) and a[i] == "0":
+            i += 1
+        while j < len(b) and b[j] == "0":
+            j += 1
+        while i < len(a) and a[i].isdigit() and j < len(b) and b[j].isdigit():
+            if not first_diff:
+                first_diff = ord(a[i]) - ord(b[j])
+            i += 1
+            j += 1
+        if i < len(a) and a[i].isdigit():
+            return 1
+        if j < len(b) and b[j].isdigit():
+            return -1
+        if first_diff:
+            return first_diff
+    return 0
+
+
+def _rpm_vercmp(a: str, b: str) -> int:
+    """rpmvercmp：按数字/字母段比较，数字段高于字母段，~ 低于一切"""
+    ta, tb = VERSION_TOKEN_RE.findall(a), VERSION_TOKEN_RE.findall(b)
+    for x, y in zip(ta, tb):
+        if x == y:
+            continue
+        if x == "~" or y == "~":
+            return -1 if x == "~" else 1
+        if x.isdigit() and y.isdigit():
+            return (int(x) > int(y)) - (int(x) < int(y))
+        if x.isdigit() != y.isdigit():
+            return 1 if x.isdigit() else -1
+        return (x > y) - (x < y)
+    if len(ta) == len(tb):
+        return 0
+    rest = ta[len(tb)] if len(ta) > len(tb) else tb[len(ta)]
+    longer = 1 if len(ta) > len(tb) else -1
+    return -longer if rest == "~" else longer
+
+
+def compare_versions(module: str, a: str, b: str) -> int:
+    """
+    按包管理器的规则比较版本（epoch:version-release），返回负数/0/正数
+
+    apt 使用 dpkg 规则，yum/dnf 使用 rpm 规则
+    """
+    def split_epoch(version: str):
+        epoch, _, rest = version.rpartition(":") if ":" in version else ("0", "", version)
+        return int(epoch) if epoch.isdigit() else 0, rest
+
+    epoch_a, a = split_epoch(a)
+    epoch_b, b = split_epoch(b)
+    if epoch_a != epoch_b:
+        return epoch_a - epoch_b
+    if module != "apt":
+        return _rpm_vercmp(a, b)
+    upstream_a, _, revision_a = a.rpartition("-") if "-" in a else (a, "", "")
+    upstream_b, _, revision_b = b.rpartition("-") if "-" in b else (b, "", "")
+    return _dpkg_verrevcmp(upstream_a, upstream_b) or _dpkg_verrevcmp(revision_a, revision_b)
+
 
 class PlaybookGenerator:
     """Ansible Playbook 生成器"""
@@ -26,20 +137,31 @@ class PlaybookGenerator:
     
     def _init_templates(self):
         """初始化 Jinja2 模板"""
-        self.main_template = Template("""---
+        # 生成期变量使用 [[ ]]，{{ }} 原样保留给 Ansible 运行时求值
+        self.env = Environment(
+            trim_blocks=True,
+            variable_start_string="[[",
+            variable_end_string="]]"
+        )
+        self.env.filters["json"] = lambda value: json.dumps(value, ensure_ascii=False)
+        
+        self.main_template = self.env.from_string("""---
 # FixPilot Auto-generated Playbook
-# Generated at: {{ timestamp }}
-# Target Host: {{ target_host }}
-# Issues Count: {{ issues_count }}
+# Generated at: [[ timestamp ]]
+# Target Host: [[ target_host ]]
+# Issues Count: [[ issues_count ]]
+# Tasks: [[ plan.task_count ]] (package upgrades merged from [[ plan.package_cve_count ]] CVEs)
 
-- name: Fix security vulnerabilities on {{ target_host }}
-  hosts: {{ target_host }}
+- name: Fix security vulnerabilities on [[ target_host ]]
+  hosts: [[ target_host ]]
   become: yes
   gather_facts: yes
   
   vars:
     backup_dir: "/tmp/fixpilot_backup_{{ ansible_date_time.epoch }}"
     log_file: "/var/log/fixpilot_{{ ansible_date_time.epoch }}.log"
+    services_to_restart: [[ services_to_restart | json ]]
+    cve_task_map: [[ plan.cve_tasks | json ]]
   
   pre_tasks:
     - name: Create backup directory
@@ -54,6 +176,22 @@ class PlaybookGenerator:
         line: "{{ ansible_date_time.iso8601 }} - FixPilot playbook started"
         create: yes
     
+    - name: Log CVE to task mapping
+      lineinfile:
+        path: "{{ log_file }}"
+        line: "{{ ansible_date_time.iso8601 }} - {{ item.cve }} -> {{ item.task }}"
+      loop: "{{ cve_task_map }}"
+    
+    - name: Snapshot installed packages (Debian)
+      shell: dpkg -l > {{ backup_dir }}/packages_before.txt
+      when: ansible_os_family == "Debian"
+      changed_when: false
+    
+    - name: Snapshot installed packages (RedHat)
+      shell: rpm -qa > {{ backup_dir }}/packages_before.txt
+      when: ansible_os_family == "RedHat"
+      changed_when: false
+    
     - name: Update package cache
       apt:
         update_cache: yes
@@ -66,56 +204,142 @@ class PlaybookGenerator:
       when: ansible_os_family == "RedHat"
 
   tasks:
-{% for issue in issues %}
-    - name: Fix {{ issue.cve }} - {{ issue.summary[:50] }}...
+{% for task in plan.package_tasks %}
+    - name: [[ task.name | json ]]
+      block:
+{% if not task.packages %}
+        - name: Upgrade all packages with [[ task.module ]]
+          [[ task.module ]]:
+{% if task.module == "apt" %}
+            upgrade: [[ task.upgrade ]]
+{% else %}
+            name: "*"
+            state: latest
+{% endif %}
+          when: ansible_os_family == "[[ task.os_family ]]"
+        
+{% endif %}
+{% if task.latest %}
+        - name: Upgrade [[ task.latest | length ]] packages with [[ task.module ]]
+          [[ task.module ]]:
+            name: [[ task.latest | json ]]
+            state: latest
+{% if task.module == "apt" %}
+            only_upgrade: yes
+{% endif %}
+          when: ansible_os_family == "[[ task.os_family ]]"
+        
+{% endif %}
+{% if task.pinned %}
+        - name: Install [[ task.pinned | length ]] pinned package versions with [[ task.module ]]
+          [[ task.module ]]:
+            name: [[ task.pinned | json ]]
+            state: present
+          when: ansible_os_family == "[[ task.os_family ]]"
+        
+{% endif %}
+        - name: Log result of [[ task.name | json ]]
+          lineinfile:
+            path: "{{ log_file }}"
+            line: "{{ ansible_date_time.iso8601 }} - [[ task.cves | join(', ') ]]: {{ (ansible_os_family == '[[ task.os_family ]]') | ternary('SUCCESS', 'SKIPPED') }}"
+
+      rescue:
+        - name: Log failure of [[ task.name | json ]]
+          lineinfile:
+            path: "{{ log_file }}"
+            line: "{{ ansible_date_time.iso8601 }} - [[ task.cves | join(', ') ]]: RESCUE - {{ ansible_failed_result.msg | default('failed') }}"
+{% if task.packages %}
+        
+        - name: Retry packages one by one after batch failure
+          [[ task.module ]]:
+            name: "{{ item.name }}"
+            state: "{{ item.state }}"
+{% if task.module == "apt" %}
+            only_upgrade: "{{ item.state == 'latest' }}"
+{% endif %}
+          loop: [[ task.retry_items | json ]]
+          loop_control:
+            label: "{{ item.name }}"
+          register: package_retry_[[ loop.index ]]
+          ignore_errors: yes
+        
+        - name: Log per-package retry results
+          lineinfile:
+            path: "{{ log_file }}"
+            line: "{{ ansible_date_time.iso8601 }} - retry {{ item.item.name }}: {{ (item.failed | default(false)) | ternary('FAILED', 'SUCCESS') }}"
+          loop: "{{ package_retry_[[ loop.index ]].results }}"
+          loop_control:
+            label: "{{ item.item.name }}"
+{% endif %}
+
+{% endfor %}
+{% if plan.autoremove %}
+    - name: Remove unused dependencies
+      apt:
+        autoremove: yes
+      when: ansible_os_family == "Debian"
+      failed_when: false
+
+{% endif %}
+{% for task in plan.command_tasks %}
+    - name: [[ task.name | json ]]
       block:
-        - name: Backup affected packages for {{ issue.cve }}
-          shell: |
-            dpkg -l | grep "{{ issue.package.split(':')[0] }}" > {{ backup_dir }}/{{ issue.cve }}_packages.txt || true
-          when: issue.package != ""
-        
-        - name: Execute fix command for {{ issue.cve }}
-          shell: |
-            {{ issue.command }}
-          register: fix_result_{{ loop.index }}
+        - name: Execute fix command for [[ task.cves | join(', ') ]]
+          shell: [[ task.command | json ]]
+          register: fix_result_[[ loop.index ]]
           failed_when: false
         
-        - name: Log fix result for {{ issue.cve }}
+        - name: Log fix result for [[ task.cves | join(', ') ]]
           lineinfile:
             path: "{{ log_file }}"
-            line: "{{ ansible_date_time.iso8601 }} - {{ issue.cve }}: {{ fix_result_{{ loop.index }}.rc == 0 | ternary('SUCCESS', 'FAILED') }}"
+            line: "{{ ansible_date_time.iso8601 }} - [[ task.cves | join(', ') ]]: {{ (fix_result_[[ loop.index ]].rc == 0) | ternary('SUCCESS', 'FAILED') }}"
+{% if task.verify_command %}
         
-        - name: Verify fix for {{ issue.cve }}
-          shell: |
-            {{ issue.verify_command | default('echo "No verification command"') }}
-          register: verify_result_{{ loop.index }}
+        - name: Verify fix for [[ task.cves | join(', ') ]]
+          shell: [[ task.verify_command | json ]]
+          register: verify_result_[[ loop.index ]]
           failed_when: false
-          when: issue.verify_command is defined
+          changed_when: false
+{% endif %}
 
       rescue:
-        - name: Log fix failure for {{ issue.cve }}
+        - name: Log fix failure for [[ task.cves | join(', ') ]]
           lineinfile:
             path: "{{ log_file }}"
-            line: "{{ ansible_date_time.iso8601 }} - {{ issue.cve }}: RESCUE - {{ ansible_failed_result.msg }}"
-        
-        - name: Continue with next fix
-          debug:
-            msg: "Fix for {{ issue.cve }} failed, continuing with next issue"
+            line: "{{ ansible_date_time.iso8601 }} - [[ task.cves | join(', ') ]]: RESCUE - {{ ansible_failed_result.msg | default('failed') }}"
 
 {% endfor %}
+{% if plan.manual %}
+    - name: Log issues requiring manual review
+      lineinfile:
+        path: "{{ log_file }}"
+        line: "{{ ansible_date_time.iso8601 }} - {{ item }}: MANUAL REVIEW REQUIRED"
+      loop: [[ plan.manual | json ]]
+
+{% endif %}
+    - name: Record fix plan summary
+      debug:
+        msg: "[[ plan.task_count ]] fix tasks planned for [[ issues_count ]] issues"
 
   post_tasks:
     - name: Restart services if needed
       systemd:
         name: "{{ item }}"
         state: restarted
-      loop: {{ services_to_restart }}
+      loop: "{{ services_to_restart }}"
       when: services_to_restart | length > 0
+      failed_when: false
     
     - name: Check if reboot is required
       stat:
         path: /var/run/reboot-required
       register: reboot_required
+{% if plan.reboot %}
+    
+    - name: Reboot host as requested by fix commands
+      reboot:
+        reboot_timeout: 600
+{% endif %}
     
     - name: Log reboot requirement
       lineinfile:
@@ -131,18 +355,22 @@ class PlaybookGenerator:
       debug:
         msg: |
           FixPilot Execution Summary:
-          - Target Host: {{ target_host }}
-          - Issues Processed: {{ issues_count }}
+          - Target Host: [[ target_host ]]
+          - Issues Processed: [[ issues_count ]]
+          - Fix Tasks: [[ plan.task_count ]]
           - Log File: {{ log_file }}
           - Backup Directory: {{ backup_dir }}
           - Reboot Required: {{ reboot_required.stat.exists | default(false) }}
 
 # Rollback playbook (run with --tags rollback)
 - name: Rollback changes
-  hosts: {{ target_host }}
+  hosts: [[ target_host ]]
   become: yes
   tags: rollback
   
+  vars:
+    services_to_restart: [[ services_to_restart | json ]]
+  
   tasks:
     - name: Find backup directory
       find:
@@ -159,7 +387,7 @@ class PlaybookGenerator:
       debug:
         msg: |
           To rollback changes manually:
-          1. Check backup files in: {{ backup_dirs.files | map(attribute='path') | list }}
+          1. Compare package snapshots in: {{ backup_dirs.files | map(attribute='path') | list }} (packages_before.txt)
           2. Review log files: /var/log/fixpilot_*.log
           3. Restore packages if needed
           4. Restart services: {{ services_to_restart }}
@@ -190,6 +418,7 @@ ansible_ssh_common_args='-o StrictHostKeyChecking=no'
         Returns:
             生成的 Playbook YAML 内容
         """
+        start = time.perf_counter()
         try:
             # 处理修复命令，提取服务重启需求
             processed_issues = []
@@ -199,28 +428,27 @@ ansible_ssh_common_args='-o StrictHostKeyChecking=no'
                 processed_issue = {
                     "cve": cmd_info.get("cve", ""),
                     "summary": cmd_info.get("summary", ""),
-                    "command": cmd_info.get("command", ""),
-                    "package": cmd_info.get("package", "")
+                    "command": cmd_info.get("command") or "",
+                    "package": cmd_info.get("package") or "",
+                    "packages": cmd_info.get("packages") or []
                 }
                 
-                # 添加验证命令
-                verify_cmd = self._generate_verify_command(processed_issue)
-                if verify_cmd:
-                    processed_issue["verify_command"] = verify_cmd
-                
                 # 检查是否需要重启服务
                 restart_services = self._extract_service_restarts(processed_issue["command"])
                 services_to_restart.update(restart_services)
                 
                 processed_issues.append(processed_issue)
             
+            # 规划任务：合并包管理器操作、去重剩余命令
+            plan = self.plan_tasks(processed_issues)
+            
             # 渲染模板
             playbook_content = self.main_template.render(
                 timestamp=datetime.now().isoformat(),
                 target_host=target_host,
                 issues_count=len(processed_issues),
-                issues=processed_issues,
-                services_to_restart=list(services_to_restart),
+                plan=plan,
+                services_to_restart=sorted(services_to_restart),
                 **kwargs
             )
             
@@ -231,12 +459,199 @@ ansible_ssh_common_args='-o StrictHostKeyChecking=no'
                 self.logger.error(f"Generated invalid YAML: {e}")
                 raise ValueError(f"Invalid YAML generated: {e}")
             
+            PLAYBOOK_RENDER_SECONDS.observe(time.perf_counter() - start)
+            PLAYBOOK_BYTES.observe(len(playbook_content.encode("utf-8")))
             return playbook_content
             
         except Exception as e:
             self.logger.error(f"Error generating playbook: {e}")
             raise
     
+    def plan_tasks(self, issues: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        渲染前的任务规划
+        
+        把各 CVE 修复命令中的 apt/yum/dnf 升级合并为每个包管理器一个模块任务，
+        缓存刷新和 systemctl restart 交给 pre_tasks/post_tasks 统一处理，
+        其余命令按内容去重，注释（需人工处理）的命令单独记录。
+        
+        Args:
+            issues: 处理后的漏洞列表（含 cve、command）
+            
+        Returns:
+            任务规划，包含 package_tasks、command_tasks、manual、cve_tasks 等
+        """
+        # module -> {"specs": {包名: (写法, 锁定版本或 None)}, "cves": [...], "full": None / "yes" / "dist"}
+        upgrades: Dict[str, Dict[str, Any]] = {}
+        commands: Dict[str, List[str]] = {}
+        manual = []
+        autoremove = False
+        reboot = False
+        
+        for issue in issues:
+            cve = issue.get("cve", "")
+            command = (issue.get("command") or "").strip()
+            
+            if not command or command.startswith("#"):
+                manual.append(cve)
+                continue
+            
+            residual = []
+            for segment in self._split_command(command):
+                action = self._classify_segment(segment)
+                kind = action[0]
+                
+                if kind in ("refresh", "restart"):
+                    continue
+                if kind == "reboot":
+                    reboot = True
+                elif kind == "autoremove":
+                    autoremove = True
+                elif kind == "upgrade":
+                    _, module, packages, mode = action
+                    entry = upgrades.setdefault(module, {"specs": {}, "cves": [], "full": None})
+                    if packages:
+                        for spec in packages:
+                            name, version = self._split_spec(module, spec)
+                            current = entry["specs"].get(name)
+                            # 锁定版本的写法优先；多个 CVE 锁定同一个包时取最高版本，避免降级
+                            if (
+                                current is None
+                                or (version is not None and current[1] is None)
+                                or (version is not None and compare_versions(module, version, current[1]) > 0)
+                            ):
+                                entry["specs"][name] = (spec, version)
+                    elif entry["full"] != "dist":
+                        # 整体升级：apt-get upgrade 对应 upgrade: yes，只有 dist-upgrade/full-upgrade 才用 dist
+                        entry["full"] = mode
+                    if cve not in entry["cves"]:
+                        entry["cves"].append(cve)
+                else:
+                    residual.append(segment)
+            
+            if residual:
+                commands.setdefault(" && ".join(residual), []).append(cve)
+        
+        package_tasks = []
+        for module, entry in upgrades.items():
+            specs = [] if entry["full"] else sorted(entry["specs"].values())
+            package_tasks.append({
+                "name": f"Upgrade packages for {self._cve_label(entry['cves'])} ({module})",
+                "module": module,
+                "os_family": "Debian" if module == "apt" else "RedHat",
+                "upgrade": entry["full"],
+                "packages": [spec for spec, _ in specs],
+                # 不带版本的包升级到最新（state: latest）；锁定版本的包安装指定版本（state: present），
+                # 包管理器模块不接受版本号与 state: latest 同时出现
+                "latest": [spec for spec, version in specs if version is None],
+                "pinned": [spec for spec, version in specs if version is not None],
+                "retry_items": [
+                    {"name": spec, "state": "latest" if version is None else "present"}
+                    for spec, version in specs
+                ],
+                "cves": entry["cves"]
+            })
+        
+        command_tasks = []
+        for command, cves in commands.items():
+            verify_cmd = self._generate_verify_command({"cve": cves[0], "command": command})
+            command_tasks.append({
+                "name": f"Fix {self._cve_label(cves)}",
+                "command": command,
+                "cves": cves,
+                "verify_command": None if verify_cmd.startswith("echo 'Verification needed") else verify_cmd
+            })
+        
+        cve_tasks = [
+            {"cve": cve, "task": task["name"]}
+            for task in package_tasks + command_tasks
+            for cve in task["cves"]
+        ] + [{"cve": cve, "task": "manual review"} for cve in manual]
+        
+        return {
+            "package_tasks": package_tasks,
+            "command_tasks": command_tasks,
+            "manual": manual,
+            "cve_tasks": cve_tasks,
+            "autoremove": autoremove,
+            "reboot": reboot,
+            "task_count": len(package_tasks) + len(command_tasks),
+            "package_cve_count": len({cve for task in package_tasks for cve in task["cves"]})
+        }
+    
+    @staticmethod
+    def _split_command(command: str) -> List[str]:
+        """按 && / ; / 换行拆分命令链"""
+        segments = re.split(r"\s*(?:&&|;|\n)\s*", command)
+        return [segment.strip() for segment in segments if segment.strip()]
+    
+    def _classify_segment(self, segment: str) -> tuple:
+        """
+        识别单条命令
+        
+        Returns:
+            ("refresh",) / ("restart",) / ("reboot",) / ("autoremove",) /
+            ("upgrade", module, [包], 整体升级方式 "yes"/"dist") / ("shell",)
+        """
+        # 含管道、重定向等 shell 语法的命令原样保留
+        if SHELL_META_RE.search(segment):
+            return ("shell",)
+        
+        tokens = segment.split()
+        while tokens and (tokens[0] == "sudo" or "=" in tokens[0]):
+            tokens = tokens[1:]
+        if not tokens:
+            return ("shell",)
+        
+        program = tokens[0]
+        if program in ("reboot",) or (program == "shutdown" and "-r" in tokens):
+            return ("reboot",)
+        if program == "systemctl" and len(tokens) >= 3 and tokens[1] == "restart":
+            return ("restart",)
+        
+        module = PACKAGE_MANAGERS.get(program)
+        if module is None:
+            return ("shell",)
+        
+        options = [token for token in tokens[1:] if token.startswith("-")]
+        if any(option not in PACKAGE_MANAGER_FLAGS for option in options):
+            # -o Dpkg::Options::=...、--enablerepo 等带参数或影响行为的选项无法等价转换为模块参数
+            return ("shell",)
+        args = [token for token in tokens[1:] if not token.startswith("-")]
+        if not args:
+            return ("shell",)
+        
+        subcommand, packages = args[0], args[1:]
+        if (module == "apt" and subcommand == "update") or subcommand in ("makecache", "check-update"):
+            return ("refresh",)
+        if subcommand == "autoremove" and module == "apt":
+            return ("autoremove",)
+        if subcommand in ("upgrade", "install", "update", "dist-upgrade", "full-upgrade"):
+            if subcommand == "install" and not packages:
+                return ("shell",)
+            mode = "dist" if subcommand in ("dist-upgrade", "full-upgrade") else "yes"
+            return ("upgrade", module, packages, mode)
+        
+        return ("shell",)
+    
+    @staticmethod
+    def _split_spec(module: str, spec: str) -> tuple:
+        """拆分包名与锁定版本（apt 的 pkg=ver，yum/dnf 的 pkg-ver），未锁定时版本为 None"""
+        if module == "apt":
+            name, _, version = spec.partition("=")
+            return name, version or None
+        match = RPM_SPEC_RE.match(spec)
+        if match:
+            return match.group(1), match.group(2)
+        return spec, None
+    
+    @staticmethod
+    def _cve_label(cves: List[str], limit: int = 3) -> str:
+        """任务名中的 CVE 列表，过长时截断"""
+        if len(cves) <= limit:
+            return ", ".join(cves)
+        return f"{', '.join(cves[:limit])} (+{len(cves) - limit} more)"
+    
     def _generate_verify_command(self, issue: Dict[str, Any]) -> str:
         """生成验证命令"""
         cve = issue.get("cve", "")
@@ -365,23 +780,26 @@ ansible_ssh_common_args='-o StrictHostKeyChecking=no'
         self.logger.info(f"Inventory saved to {filepath}")
         return filepath
     
-    def validate_playbook(self, playbook_path: str) -> bool:
+    def validate_playbook(self, playbook_path: str, timeout: float = 60) -> bool:
         """
-        验证 Playbook 语法
+        验证 Playbook 语法（同步阻塞；异步代码中使用 playbook_validator.PlaybookValidator）
         
         Args:
             playbook_path: Playbook 文件路径
+            timeout: 超时（秒），超时视为未通过
             
         Returns:
             验证是否通过
         """
+        import subprocess
         try:
             # 使用 ansible-playbook --syntax-check
-            import subprocess
             result = subprocess.run(
                 ["ansible-playbook", "--syntax-check", playbook_path],
                 capture_output=True,
-                text=True
+                stdin=subprocess.DEVNULL,
+                text=True,
+                timeout=timeout
             )
             
             if result.returncode == 0:
@@ -394,6 +812,9 @@ ansible_ssh_common_args='-o StrictHostKeyChecking=no'
         except FileNotFoundError:
             self.logger.warning("ansible-playbook command not found, skipping syntax check")
             return True  # 假设有效，如果 ansible 未安装
+        except subprocess.TimeoutExpired:
+            self.logger.error(f"Playbook syntax check timed out after {timeout}s")
+            return False
         except Exception as e:
             self.logger.error(f"Error validating playbook: {e}")
             return False
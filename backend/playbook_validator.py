@@ -0,0 +1,258 @@
+"""
+Playbook 语法校验服务
+功能：在事件循环外异步运行 ansible-playbook --syntax-check，限制同时运行的 ansible 进程数；
+多个 Playbook 合并为一次 ansible 调用（失败时对半拆分定位出错的文件），结果按内容哈希缓存，
+支持超时，未安装 ansible 时返回 skipped
+"""
+
+import os
+import time
+import shutil
+import asyncio
+import hashlib
+import tempfile
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence
+
+from loguru import logger
+
+from metrics import PLAYBOOK_VALIDATIONS, PLAYBOOK_VALIDATION_SECONDS, PLAYBOOK_VALIDATION_CACHE
+
+
+class ValidationResult:
+    """
+    单个 Playbook 的校验结果
+
+    status: valid / invalid / skipped（未安装 ansible）/ timeout / error
+    """
+
+    __slots__ = ("status", "message", "cached")
+
+    def __init__(self, status: str, message: str = "", cached: bool = False):
+        self.status = status
+        self.message = message
+        self.cached = cached
+
+    @property
+    def valid(self) -> bool:
+        # 与 PlaybookGenerator.validate_playbook 一致：未安装 ansible 时视为通过
+        return self.status in ("valid", "skipped")
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"status": self.status, "valid": self.valid, "message": self.message, "cached": self.cached}
+
+
+def content_hash(content: str) -> str:
+    """
+    缓存键：跳过开头的注释头（含生成时间，不影响语法）后的内容哈希，
+    同一主机重新生成的相同 Playbook 命中缓存
+    """
+    lines = content.splitlines()
+    start = 0
+    while start < len(lines) and (lines[start].startswith("#") or lines[start].strip() in ("", "---")):
+        start += 1
+    return hashlib.sha256("\n".join(lines[start:]).encode("utf-8")).hexdigest()
+
+
+class PlaybookValidator:
+    """
+    异步 Playbook 语法校验
+
+    每次 ansible 调用一次校验最多 batch_size 个文件，摊薄 ansible 的启动开销；
+    批次失败时对半拆分重试，直到定位到单个出错文件。
+    同一内容的并发校验合并为一次，确定的结果（valid/invalid）按内容哈希缓存。
+    """
+
+    def __init__(
+        self,
+        max_workers: int = None,
+        timeout: float = None,
+        batch_size: int = None,
+        cache_size: int = 1024,
+        command: str = "ansible-playbook"
+    ):
+        self.max_workers = max(1, max_workers or int(os.getenv("PLAYBOOK_VALIDATION_WORKERS", "2")))
+        self.timeout = timeout if timeout is not None else float(os.getenv("PLAYBOOK_VALIDATION_TIMEOUT", "60"))
+        self.batch_size = max(1, batch_size or int(os.getenv("PLAYBOOK_VALIDATION_BATCH", "16")))
+        self.cache_size = cache_size
+        self.command = command
+        self.executable = shutil.which(command)
+        if self.executable is None:
+            logger.warning(f"{command} not found, playbook syntax checks will be skipped")
+
+        self._cache: "OrderedDict[str, ValidationResult]" = OrderedDict()
+        self._inflight: Dict[str, "asyncio.Future[ValidationResult]"] = {}
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self.invocations = 0
+        self.cache_hits = 0
+
+    @property
+    def available(self) -> bool:
+        return self.executable is not None
+
+    async def validate(self, content: str) -> ValidationResult:
+        """校验单个 Playbook 内容"""
+        return (await self.validate_many([content]))[0]
+
+    async def validate_many(self, contents: Sequence[str]) -> List[ValidationResult]:
+        """
+        校验多个 Playbook 内容，结果与输入顺序一致
+
+        未命中缓存且不在途的内容按 batch_size 分批，各批并发运行（受 max_workers 限制）。
+        """
+        if not self.available:
+            PLAYBOOK_VALIDATIONS.labels("skipped").inc(len(contents))
+            return [ValidationResult("skipped", f"{self.command} not found") for _ in contents]
+
+        loop = asyncio.get_running_loop()
+        hashes = [content_hash(content) for content in contents]
+        waiting: Dict[str, "asyncio.Future[ValidationResult]"] = {}
+        pending: Dict[str, str] = {}
+        # 命中时立即取出结果：之后的校验或并发调用可能把该条目淘汰出缓存
+        hits: Dict[str, ValidationResult] = {}
+
+        for digest, content in zip(hashes, contents):
+            if digest in waiting or digest in pending or digest in hits:
+                continue
+            cached = self._cache.get(digest)
+            if cached is not None:
+                self._cache.move_to_end(digest)
+                hits[digest] = cached
+                self.cache_hits += 1
+                PLAYBOOK_VALIDATION_CACHE.labels("hit").inc()
+                continue
+            PLAYBOOK_VALIDATION_CACHE.labels("miss").inc()
+            future = self._inflight.get(digest)
+            if future is not None and future.get_loop() is loop:
+                waiting[digest] = future
+            else:
+                pending[digest] = content
+
+        if pending:
+            futures = {digest: loop.create_future() for digest in pending}
+            self._inflight.update(futures)
+            waiting.update(futures)
+            items = list(pending.items())
+            batches = [items[i:i + self.batch_size] for i in range(0, len(items), self.batch_size)]
+            task = asyncio.gather(*(self._check_batch(batch, futures) for batch in batches))
+            try:
+                await asyncio.shield(task)
+            finally:
+                for digest, future in futures.items():
+                    if self._inflight.get(digest) is future:
+                        del self._inflight[digest]
+
+        # 在途与新校验的结果；异常时对应的 future 也已设置结果
+        results = {digest: await asyncio.shield(future) for digest, future in waiting.items()}
+        output = []
+        for digest in hashes:
+            if digest in results:
+                output.append(results[digest])
+            else:
+                cached = hits[digest]
+                output.append(ValidationResult(cached.status, cached.message, cached=True))
+        return output
+
+    async def _check_batch(
+        self,
+        batch: List[tuple],
+        futures: Dict[str, "asyncio.Future[ValidationResult]"],
+        split_on_timeout: bool = True
+    ):
+        """
+        校验一批（[(hash, content)]）；invalid 时对半拆分，直到单个文件
+
+        timeout 只拆分一次（批次可能只是太大），拆分后仍超时的文件直接记为 timeout，
+        避免挂起的文件让每一层拆分都等满超时、长时间占用校验并发名额
+        """
+        try:
+            status, message = await self._run(batch)
+        except Exception as e:
+            logger.error(f"Playbook syntax check failed: {e}")
+            status, message = "error", str(e)
+        if (
+            status in ("valid", "error")
+            or len(batch) == 1
+            or (status == "timeout" and not split_on_timeout)
+        ):
+            # error（ansible 本身无法运行）拆分也无济于事
+            for digest, _ in batch:
+                self._finish(digest, ValidationResult(status, message), futures)
+            return
+
+        split_on_timeout = split_on_timeout and status != "timeout"
+        middle = len(batch) // 2
+        await asyncio.gather(
+            self._check_batch(batch[:middle], futures, split_on_timeout),
+            self._check_batch(batch[middle:], futures, split_on_timeout)
+        )
+
+    async def _run(self, batch: List[tuple]) -> tuple:
+        """一次 ansible 调用校验一批文件，返回 (status, message)"""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_workers)
+
+        async with self._semaphore:
+            started = time.perf_counter()
+            with tempfile.TemporaryDirectory(prefix="fixpilot-syntax-") as work_dir:
+                paths = []
+                for digest, content in batch:
+                    path = os.path.join(work_dir, f"{digest[:16]}.yml")
+                    with open(path, "w", encoding="utf-8") as f:
+                        f.write(content)
+                    paths.append(path)
+
+                self.invocations += 1
+                try:
+                    process = await asyncio.create_subprocess_exec(
+                        self.executable, "--syntax-check", "-i", "localhost,", *paths,
+                        stdin=asyncio.subprocess.DEVNULL,
+                        stdout=asyncio.subprocess.PIPE,
+                        stderr=asyncio.subprocess.PIPE,
+                        cwd=work_dir,
+                        env={**os.environ, "ANSIBLE_NOCOLOR": "1", "ANSIBLE_LOCALHOST_WARNING": "false"}
+                    )
+                except OSError as e:
+                    return "error", f"Failed to start {self.command}: {e}"
+
+                try:
+                    _, stderr = await asyncio.wait_for(process.communicate(), timeout=self.timeout)
+                except asyncio.TimeoutError:
+                    process.kill()
+                    await process.wait()
+                    return "timeout", f"Syntax check timed out after {self.timeout}s"
+                finally:
+                    PLAYBOOK_VALIDATION_SECONDS.observe(time.perf_counter() - started)
+
+        if process.returncode == 0:
+            return "valid", ""
+        return "invalid", self._error_message(stderr.decode("utf-8", errors="replace"), work_dir)
+
+    @staticmethod
+    def _error_message(stderr: str, work_dir: str) -> str:
+        """保留错误部分，去掉临时目录路径"""
+        lines = [line for line in stderr.splitlines() if not line.startswith("[WARNING]")]
+        return "\n".join(lines).replace(work_dir + os.sep, "").strip()[-2000:]
+
+    def _finish(self, digest: str, result: ValidationResult, futures: Dict[str, "asyncio.Future[ValidationResult]"]):
+        PLAYBOOK_VALIDATIONS.labels(result.status).inc()
+        if result.status in ("valid", "invalid"):
+            self._cache[digest] = result
+            self._cache.move_to_end(digest)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        future = futures.get(digest)
+        if future is not None and not future.done():
+            future.set_result(result)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "available": self.available,
+            "max_workers": self.max_workers,
+            "batch_size": self.batch_size,
+            "timeout": self.timeout,
+            "cache_entries": len(self._cache),
+            "cache_hits": self.cache_hits,
+            "inflight": len(self._inflight),
+            "invocations": self.invocations
+        }
@@ -0,0 +1,346 @@
+"""
+请求级性能剖析
+功能：按请求头/查询参数或按采样率对慢接口做 cProfile 或采样剖析，记录 SQL 语句次数与耗时，
+报告保存在有界的磁盘环形缓冲区中，通过管理接口浏览
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import uuid
+import random
+import pstats
+import cProfile
+import asyncio
+import threading
+import functools
+import contextvars
+from collections import Counter as CounterDict
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Sequence
+from loguru import logger
+
+
+PROFILE_HEADER = "x-fixpilot-profile"
+PROFILE_QUERY = "profile"
+
+# 报告中保留的条目数
+TOP_FUNCTIONS = 40
+TOP_STATEMENTS = 20
+TOP_STACKS = 50
+
+
+class ProfileSession:
+    """一次被剖析请求的采集状态"""
+
+    def __init__(self, method: str, path: str, trigger: str, mode: str):
+        self.id = datetime.utcnow().strftime("%Y%m%dT%H%M%S%f") + "-" + uuid.uuid4().hex[:6]
+        self.method = method
+        self.path = path
+        self.trigger = trigger
+        self.mode = mode
+        self.started = time.perf_counter()
+        self.status = None
+        self.duration = 0.0
+
+        # SQL 统计：语句 -> [次数, 总耗时, 最大耗时]
+        self.statements: Dict[str, List[float]] = {}
+        self._lock = threading.Lock()
+
+        self.profile: Optional[cProfile.Profile] = None
+        self.samples: "CounterDict[str]" = CounterDict()
+        self.sample_count = 0
+        self.threads = set()
+
+    def record_statement(self, statement: str, elapsed: float):
+        key = " ".join(statement.split())[:300]
+        with self._lock:
+            stat = self.statements.get(key)
+            if stat is None:
+                self.statements[key] = [1, elapsed, elapsed]
+            else:
+                stat[0] += 1
+                stat[1] += elapsed
+                stat[2] = max(stat[2], elapsed)
+
+    def report(self) -> Dict[str, Any]:
+        statements = sorted(self.statements.items(), key=lambda item: item[1][1], reverse=True)
+        report = {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "status": self.status,
+            "trigger": self.trigger,
+            "mode": self.mode,
+            "created_at": datetime.utcnow().isoformat(),
+            "duration_seconds": round(self.duration, 6),
+            "sql": {
+                "count": int(sum(stat[0] for _, stat in statements)),
+                "total_seconds": round(sum(stat[1] for _, stat in statements), 6),
+                "top": [
+                    {
+                        "statement": statement,
+                        "count": int(stat[0]),
+                        "total_seconds": round(stat[1], 6),
+                        "max_seconds": round(stat[2], 6)
+                    }
+                    for statement, stat in statements[:TOP_STATEMENTS]
+                ]
+            }
+        }
+
+        if self.profile is not None:
+            stream = io.StringIO()
+            stats = pstats.Stats(self.profile, stream=stream)
+            stats.sort_stats("cumulative").print_stats(TOP_FUNCTIONS)
+            report["profile"] = stream.getvalue()
+        if self.mode == "sample":
+            report["samples"] = self.sample_count
+            # 折叠栈格式，可直接输入 flamegraph.pl / speedscope
+            report["stacks"] = [
+                f"{stack} {count}" for stack, count in self.samples.most_common(TOP_STACKS)
+            ]
+        return report
+
+
+_current_session: "contextvars.ContextVar[Optional[ProfileSession]]" = contextvars.ContextVar(
+    "fixpilot_profile_session", default=None
+)
+
+
+class _StackSampler:
+    """采样剖析：后台线程定期抓取会话所在线程的调用栈"""
+
+    def __init__(self, session: ProfileSession, interval: float):
+        self.session = session
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            for thread_id in list(self.session.threads):
+                frame = frames.get(thread_id)
+                if frame is None:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                self.session.samples[";".join(reversed(stack))] += 1
+                self.session.sample_count += 1
+
+
+class RequestProfiler:
+    """
+    请求剖析器
+
+    中间件决定是否剖析当前请求（请求头 X-FixPilot-Profile: 1、查询参数 profile=1，
+    或按 sample_rate 随机抽样），被 profiled 装饰的接口函数在实际执行的线程中开启剖析：
+    同步接口在线程池线程，异步接口在事件循环线程（异步模式下会混入同期其他协程的开销）。
+    """
+
+    def __init__(
+        self,
+        report_dir: str = "./profiles",
+        max_reports: int = 50,
+        sample_rate: float = 0.0,
+        mode: str = "cprofile",
+        sample_interval: float = 0.005,
+        paths: Sequence[str] = ("/scan/parse", "/playbook"),
+        enabled: bool = True
+    ):
+        self.report_dir = report_dir
+        self.max_reports = max(1, max_reports)
+        self.sample_rate = sample_rate
+        self.mode = mode if mode in ("cprofile", "sample") else "cprofile"
+        self.sample_interval = sample_interval
+        self.paths = tuple(paths)
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self.logger = logger
+
+    def should_profile(self, scope) -> Optional[str]:
+        """返回触发方式（header/query/sample），不剖析时返回 None"""
+        if not self.enabled or not scope["path"].startswith(self.paths):
+            return None
+
+        for name, value in scope.get("headers", []):
+            if name == PROFILE_HEADER.encode() and value.strip() in (b"1", b"true", b"yes"):
+                return "header"
+
+        query = scope.get("query_string", b"").decode("latin-1")
+        for pair in query.split("&"):
+            if pair in (f"{PROFILE_QUERY}=1", f"{PROFILE_QUERY}=true"):
+                return "query"
+
+        if self.sample_rate > 0 and random.random() < self.sample_rate:
+            return "sample"
+        return None
+
+    def profiled(self, func: Callable) -> Callable:
+        """接口装饰器：存在剖析会话时，在函数实际执行的线程中开启剖析"""
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                session = _current_session.get()
+                if session is None:
+                    return await func(*args, **kwargs)
+                stop = self._begin(session)
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    stop()
+            return async_wrapper
+
+        @functools.wraps(func)
+        def sync_wrapper(*args, **kwargs):
+            session = _current_session.get()
+            if session is None:
+                return func(*args, **kwargs)
+            stop = self._begin(session)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                stop()
+        return sync_wrapper
+
+    def _begin(self, session: ProfileSession) -> Callable[[], None]:
+        session.threads.add(threading.get_ident())
+
+        if session.mode == "sample":
+            sampler = _StackSampler(session, self.sample_interval)
+            sampler.start()
+            return sampler.stop
+
+        session.profile = cProfile.Profile()
+        try:
+            session.profile.enable()
+        except ValueError:
+            # 同一线程已有其他剖析器在运行（并发的异步请求）
+            session.profile = None
+            return lambda: None
+        return session.profile.disable
+
+    def save(self, session: ProfileSession):
+        """写入报告并淘汰最旧的报告"""
+        report = session.report()
+        os.makedirs(self.report_dir, exist_ok=True)
+
+        path = os.path.join(self.report_dir, f"{session.id}.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        if session.profile is not None:
+            session.profile.dump_stats(os.path.join(self.report_dir, f"{session.id}.prof"))
+
+        with self._lock:
+            reports = sorted(name for name in os.listdir(self.report_dir) if name.endswith(".json"))
+            for name in reports[:-self.max_reports]:
+                report_id = name[:-len(".json")]
+                for suffix in (".json", ".prof"):
+                    try:
+                        os.remove(os.path.join(self.report_dir, report_id + suffix))
+                    except FileNotFoundError:
+                        pass
+
+        self.logger.info(
+            f"Profiled {session.method} {session.path} in {session.duration:.3f}s "
+            f"({report['sql']['count']} SQL statements), report {session.id}"
+        )
+
+    def list_reports(self) -> List[Dict[str, Any]]:
+        """列出报告摘要（新的在前）"""
+        if not os.path.isdir(self.report_dir):
+            return []
+
+        summaries = []
+        for name in sorted(os.listdir(self.report_dir), reverse=True):
+            if not name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(self.report_dir, name), "r", encoding="utf-8") as f:
+                    report = json.load(f)
+            except (OSError, ValueError):
+                continue
+            summaries.append({
+                key: report.get(key)
+                for key in ("id", "method", "path", "status", "trigger", "mode", "created_at", "duration_seconds")
+            } | {"sql_count": report.get("sql", {}).get("count")})
+        return summaries
+
+    def report_path(self, report_id: str, suffix: str = ".json") -> Optional[str]:
+        """报告文件路径（校验 ID，防止路径穿越）"""
+        if not report_id or os.path.basename(report_id) != report_id or report_id.startswith("."):
+            return None
+        path = os.path.join(self.report_dir, report_id + suffix)
+        return path if os.path.exists(path) else None
+
+
+class ProfilingMiddleware:
+    """ASGI 中间件：为需要剖析的请求创建会话，响应结束后写入报告"""
+
+    def __init__(self, app, profiler: RequestProfiler):
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope, receive, send):
+        trigger = self.profiler.should_profile(scope) if scope["type"] == "http" else None
+        if trigger is None:
+            await self.app(scope, receive, send)
+            return
+
+        session = ProfileSession(scope["method"], scope["path"], trigger, self.profiler.mode)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                session.status = message["status"]
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [
+                    (b"x-fixpilot-profile-id", session.id.encode())
+                ]
+            await send(message)
+
+        token = _current_session.set(session)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current_session.reset(token)
+            session.duration = time.perf_counter() - session.started
+            try:
+                await asyncio.get_running_loop().run_in_executor(None, self.profiler.save, session)
+            except Exception as e:
+                self.profiler.logger.error(f"Failed to save profile report: {e}")
+
+
+def track_statements(engine):
+    """为 SQLAlchemy 引擎注册语句统计（仅在存在剖析会话时记录）"""
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        if _current_session.get() is not None:
+            conn.info.setdefault("profile_start_time", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        session = _current_session.get()
+        starts = conn.info.get("profile_start_time")
+        if session is not None and starts:
+            session.record_statement(statement, time.perf_counter() - starts.pop())
+
+    @event.listens_for(engine, "handle_error")
+    def _error(context):
+        conn = context.connection
+        if conn is not None and conn.info.get("profile_start_time"):
+            conn.info["profile_start_time"].pop()
@@ -0,0 +1,253 @@
+"""
+响应编码
+功能：orjson 快速 JSON 序列化（查询结果行直接序列化，不经 Pydantic 模型校验），
+以及按 Accept-Encoding 协商的 gzip/brotli 响应压缩中间件
+"""
+
+import os
+import gzip
+import json
+import time
+import asyncio
+from collections import OrderedDict
+from typing import Any, Iterable, List, Optional, Sequence, Tuple
+
+from fastapi.responses import Response
+
+from metrics import RESPONSE_BYTES, RESPONSE_COMPRESSION_SECONDS
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    BROTLI_AVAILABLE = False
+
+
+def dumps(obj: Any) -> bytes:
+    """
+    序列化为 UTF-8 JSON；datetime 输出与 Pydantic 一致（ISO 8601，naive 不带时区）
+
+    未安装 orjson 时使用标准库 json
+    """
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"), default=_default).encode("utf-8")
+
+
+def _default(value: Any) -> Any:
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def rows_json(result) -> bytes:
+    """把 SQLAlchemy 查询结果（按列选择的行）序列化为对象数组，键为列名"""
+    keys = list(result.keys())
+    return dumps([dict(zip(keys, row)) for row in result])
+
+
+class FastJSONResponse(Response):
+    """
+    JSON 响应：内容为 bytes 时原样输出，否则用 dumps 序列化
+
+    端点直接返回 Response 时 FastAPI 不再按 response_model 校验和重新编码，
+    response_model 仍保留用于 OpenAPI 文档
+    """
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, (bytes, bytearray)):
+            return bytes(content)
+        return dumps(content)
+
+
+# 可压缩的响应类型（图片、Parquet 等已压缩或二进制内容不压缩）
+COMPRESSIBLE_TYPES = ("application/json", "text/", "application/x-yaml", "application/yaml", "application/javascript")
+
+# 超过该大小的响应体在线程池中压缩，避免阻塞事件循环
+THREAD_MIN_SIZE = 256 * 1024
+
+
+def parse_accept_encoding(header: Optional[str]) -> dict:
+    """解析 Accept-Encoding 为 {编码: q 值}"""
+    accepted = {}
+    for part in (header or "").split(","):
+        name, _, params = part.strip().partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        quality = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        accepted[name] = quality
+    return accepted
+
+
+def choose_encoding(header: Optional[str], encodings: Sequence[str]) -> Optional[str]:
+    """按 q 值选择编码，q 值相同时按 encodings 的顺序（服务端偏好）"""
+    accepted = parse_accept_encoding(header)
+    best, best_quality = None, 0.0
+    for encoding in encodings:
+        quality = accepted.get(encoding, accepted.get("*", 0.0))
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+class CompressionMiddleware:
+    """
+    ASGI 中间件：按 Accept-Encoding 对完整响应体做 br/gzip 压缩
+
+    只处理一次性发送的响应（JSON 列表、Playbook 等）；SSE、NDJSON 流式和导出等分块响应原样透传。
+    小于 min_size 的响应不压缩。带强 ETag 的响应（读接口缓存）按 (ETag, 编码) 缓存压缩结果，
+    缓存命中的请求不重复压缩；压缩后 ETag 改为弱校验值。
+    """
+
+    def __init__(
+        self,
+        app,
+        min_size: int = None,
+        gzip_level: int = None,
+        brotli_quality: int = None,
+        enabled: bool = None,
+        cache_entries: int = 256,
+        cache_bytes: int = 32 * 1024 * 1024
+    ):
+        self.app = app
+        self.min_size = min_size if min_size is not None else int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+        self.gzip_level = gzip_level if gzip_level is not None else int(os.getenv("COMPRESSION_GZIP_LEVEL", "4"))
+        self.brotli_quality = (
+            brotli_quality if brotli_quality is not None else int(os.getenv("COMPRESSION_BROTLI_QUALITY", "4"))
+        )
+        self.enabled = enabled if enabled is not None else os.getenv("COMPRESSION_ENABLED", "true").lower() == "true"
+        self.encodings: Tuple[str, ...] = ("br", "gzip") if BROTLI_AVAILABLE else ("gzip",)
+        self.cache_entries = cache_entries
+        self.cache_bytes = cache_bytes
+        self._cache: "OrderedDict[Tuple[str, str], bytes]" = OrderedDict()
+        self._cache_size = 0
+
+    async def __call__(self, scope, receive, send):
+        if not self.enabled or scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = None
+        for name, value in scope["headers"]:
+            if name == b"accept-encoding":
+                encoding = choose_encoding(value.decode("latin-1"), self.encodings)
+                break
+
+        start_message = None
+        passthrough = False
+
+        async def send_wrapper(message):
+            nonlocal start_message, passthrough
+            if passthrough:
+                await send(message)
+                return
+
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            if message.get("more_body", False):
+                # 分块响应：原样透传
+                passthrough = True
+                await send(start_message)
+                await send(message)
+                return
+
+            await self._send_complete(start_message, body, encoding, send)
+
+        await self.app(scope, receive, send_wrapper)
+
+    async def _send_complete(self, start_message: dict, body: bytes, encoding: Optional[str], send):
+        headers = list(start_message.get("headers", []))
+        compressible = self._compressible(start_message["status"], headers, len(body))
+        if compressible:
+            # 响应是否压缩取决于请求头，告知缓存按 Accept-Encoding 区分
+            headers.append((b"vary", b"Accept-Encoding"))
+
+        if not compressible or encoding is None:
+            RESPONSE_BYTES.labels("identity").inc(len(body))
+            await send({**start_message, "headers": headers})
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        etag = _header(headers, b"etag")
+        compressed = await self._compress(body, encoding, etag)
+        RESPONSE_BYTES.labels(encoding).inc(len(compressed))
+
+        replaced = []
+        for name, value in headers:
+            if name == b"content-length":
+                continue
+            if name == b"etag" and not value.startswith(b"W/"):
+                value = b"W/" + value
+            replaced.append((name, value))
+        replaced.append((b"content-encoding", encoding.encode("latin-1")))
+        replaced.append((b"content-length", str(len(compressed)).encode("latin-1")))
+
+        await send({**start_message, "headers": replaced})
+        await send({"type": "http.response.body", "body": compressed})
+
+    def _compressible(self, status: int, headers: List[Tuple[bytes, bytes]], size: int) -> bool:
+        if size < self.min_size or status < 200 or status in (204, 206, 304):
+            return False
+        if _header(headers, b"content-encoding") is not None:
+            return False
+        content_type = (_header(headers, b"content-type") or b"").decode("latin-1").lower()
+        return content_type.startswith(COMPRESSIBLE_TYPES)
+
+    async def _compress(self, body: bytes, encoding: str, etag: Optional[bytes]) -> bytes:
+        key = None
+        if etag is not None and not etag.startswith(b"W/"):
+            key = (etag.decode("latin-1"), encoding)
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                return cached
+
+        started = time.perf_counter()
+        if len(body) >= THREAD_MIN_SIZE:
+            compressed = await asyncio.to_thread(self.compress, body, encoding)
+        else:
+            compressed = self.compress(body, encoding)
+        RESPONSE_COMPRESSION_SECONDS.labels(encoding).observe(time.perf_counter() - started)
+
+        if key is not None and len(compressed) <= self.cache_bytes:
+            self._cache[key] = compressed
+            self._cache_size += len(compressed)
+            while len(self._cache) > self.cache_entries or self._cache_size > self.cache_bytes:
+                _, evicted = self._cache.popitem(last=False)
+                self._cache_size -= len(evicted)
+        return compressed
+
+    def compress(self, body: bytes, encoding: str) -> bytes:
+        if encoding == "br":
+            return brotli.compress(body, mode=brotli.MODE_TEXT, quality=self.brotli_quality)
+        return gzip.compress(body, compresslevel=self.gzip_level, mtime=0)
+
+
+def _header(headers: Iterable[Tuple[bytes, bytes]], name: bytes) -> Optional[bytes]:
+    for key, value in headers:
+        if key == name:
+            return value
+    return None
@@ -0,0 +1,258 @@
+"""
+修复规则引擎
+功能：从配置文件加载模板修复规则，把所有关键词编译为一个多模式匹配器（Aho-Corasick 自动机，
+未安装 pyahocorasick 时为合并正则）一次扫描完成分类，按发行版的包管理器渲染命令；
+支持批量分类，作为修复命令生成的快速第一层
+"""
+
+import os
+import re
+import threading
+from bisect import bisect_right
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import yaml
+from loguru import logger
+
+from advisory import SAFE_TOKEN_RE, package_manager, split_os
+
+try:
+    import ahocorasick
+    AHOCORASICK_AVAILABLE = True
+except ImportError:
+    AHOCORASICK_AVAILABLE = False
+
+
+DEFAULT_RULES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fix_rules.yaml")
+
+# 批量分类时拼接描述用的分隔符（关键词中不会出现）
+SEPARATOR = "\x00"
+
+
+class FixRule:
+    """一条分类规则"""
+
+    __slots__ = ("name", "keywords", "requires_package", "first_tier")
+
+    def __init__(self, name: str, keywords: Sequence[str], requires_package: bool = False, first_tier: bool = False):
+        self.name = name
+        self.keywords = [keyword.lower() for keyword in keywords if keyword]
+        self.requires_package = requires_package
+        self.first_tier = first_tier
+
+
+class Classification:
+    """一条描述的匹配结果：命中的规则序号（升序）和第一个命中的服务"""
+
+    __slots__ = ("rules", "service")
+
+    def __init__(self, rules: Tuple[int, ...], service: Optional[str]):
+        self.rules = rules
+        self.service = service
+
+
+class FixRuleEngine:
+    """
+    数据驱动的模板规则引擎
+
+    规则关键词和服务关键词合并成一个 Aho-Corasick 自动机（或按长度降序的交替正则），
+    每条描述只扫描一次；分类结果按描述做 LRU 缓存（同一 CVE 在多台主机上描述相同）。
+    """
+
+    def __init__(self, config: Dict[str, Any], cache_size: int = 65536):
+        self.rules = [
+            FixRule(
+                rule["name"],
+                rule.get("keywords") or [],
+                requires_package=bool(rule.get("requires_package")),
+                first_tier=bool(rule.get("first_tier"))
+            )
+            for rule in config.get("rules") or []
+        ]
+        self.services = list((config.get("services") or {}).items())
+        self.default_manager = config.get("default_manager", "apt")
+        self.commands: Dict[str, Dict[str, str]] = config.get("commands") or {}
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[str, Classification]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._compile()
+
+    @classmethod
+    def from_file(cls, path: Optional[str] = None) -> "FixRuleEngine":
+        """从 YAML 配置加载（默认 FIX_RULES_PATH 或随代码发布的 fix_rules.yaml）"""
+        path = path or os.getenv("FIX_RULES_PATH") or DEFAULT_RULES_PATH
+        with open(path, "r", encoding="utf-8") as f:
+            config = yaml.safe_load(f) or {}
+        engine = cls(config)
+        logger.info(f"Loaded {len(engine.rules)} fix rules from {path}")
+        return engine
+
+    def _compile(self):
+        # 关键词 -> ("rule", 序号) / ("service", 序号)；同一关键词可同时属于规则和服务
+        self._terms: Dict[str, List[Tuple[str, int]]] = {}
+        for index, rule in enumerate(self.rules):
+            for keyword in rule.keywords:
+                self._terms.setdefault(keyword, []).append(("rule", index))
+        for index, (keyword, _) in enumerate(self.services):
+            self._terms.setdefault(keyword.lower(), []).append(("service", index))
+
+        self._automaton = None
+        self._pattern = None
+        if not self._terms:
+            return
+        if AHOCORASICK_AVAILABLE:
+            # 自动机报告所有（含重叠的）命中，与逐个子串判断的语义一致
+            self._automaton = ahocorasick.Automaton()
+            for term, targets in self._terms.items():
+                self._automaton.add_word(term, targets)
+            self._automaton.make_automaton()
+        else:
+            # 长关键词在前，使 "linux kernel" 先于 "kernel" 匹配
+            alternation = "|".join(re.escape(term) for term in sorted(self._terms, key=len, reverse=True))
+            self._pattern = re.compile(alternation)
+
+    def _scan(self, text: str):
+        """遍历命中：(关键词在文本中的位置, [(类别, 序号)])"""
+        if self._automaton is not None:
+            for end, targets in self._automaton.iter(text):
+                yield end, targets
+        elif self._pattern is not None:
+            terms = self._terms
+            for match in self._pattern.finditer(text):
+                yield match.start(), terms[match.group()]
+
+    # ---------- 分类 ----------
+
+    def classify(self, summary: str) -> Classification:
+        """分类单条描述"""
+        return self.classify_many([summary])[0]
+
+    def classify_many(self, summaries: Sequence[str]) -> List[Classification]:
+        """
+        批量分类
+
+        未缓存的描述拼接成一个字符串只扫描一次，按命中位置归属到各条描述，
+        避免逐条调用的 Python 开销。
+        """
+        # 结果从本地字典取：本次新分类的条目或并发调用都可能把已命中的条目淘汰出缓存
+        results: Dict[str, Classification] = {}
+        pending: Dict[str, None] = {}
+        with self._lock:
+            for summary in summaries:
+                if summary in results or summary in pending:
+                    continue
+                cached = self._cache.get(summary)
+                if cached is None:
+                    pending[summary] = None
+                    continue
+                self._cache.move_to_end(summary)
+                results[summary] = cached
+        if pending:
+            results.update(self._classify_uncached(list(pending)))
+        return [results[summary] for summary in summaries]
+
+    def _classify_uncached(self, summaries: List[str]) -> Dict[str, Classification]:
+        rule_hits: List[set] = [set() for _ in summaries]
+        service_hits: List[Optional[int]] = [None] * len(summaries)
+
+        if self._terms:
+            text = SEPARATOR.join(summaries).lower()
+            starts = []
+            offset = 0
+            for summary in summaries:
+                starts.append(offset)
+                offset += len(summary) + 1
+
+            # 关键词不含分隔符，命中的任一位置都落在所属描述内
+            for position, targets in self._scan(text):
+                owner = bisect_right(starts, position) - 1
+                for kind, index in targets:
+                    if kind == "rule":
+                        rule_hits[owner].add(index)
+                    elif service_hits[owner] is None or index < service_hits[owner]:
+                        service_hits[owner] = index
+
+        classified = {}
+        for n, summary in enumerate(summaries):
+            service = self.services[service_hits[n]][1] if service_hits[n] is not None else None
+            classified[summary] = Classification(tuple(sorted(rule_hits[n])), service)
+
+        with self._lock:
+            for summary, classification in classified.items():
+                self._cache[summary] = classification
+                self._cache.move_to_end(summary)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return classified
+
+    # ---------- 渲染 ----------
+
+    def match(self, classification: Classification, package: str = "") -> Optional[FixRule]:
+        """按优先级取第一条适用的规则"""
+        for index in classification.rules:
+            rule = self.rules[index]
+            if rule.requires_package and not package:
+                continue
+            return rule
+        return None
+
+    def render(self, cve: str, summary: str, package: str = "", os_info: Optional[str] = None,
+               classification: Optional[Classification] = None, first_tier_only: bool = False) -> Optional[str]:
+        """
+        生成修复命令
+
+        Args:
+            cve: CVE 编号
+            summary: 漏洞描述
+            package: 受影响包（Issue.package，取第一个包名）
+            os_info: 主机操作系统，决定包管理器
+            classification: 已有的分类结果（批量模式）
+            first_tier_only: 只返回 first_tier 规则的命令，其余返回 None
+
+        Returns:
+            修复命令；first_tier_only 且未命中第一层规则时为 None
+        """
+        package = self._package_name(package)
+        classification = classification or self.classify(summary)
+        rule = self.match(classification, package)
+        if first_tier_only and (rule is None or not rule.first_tier):
+            return None
+
+        manager = package_manager(*split_os(os_info)) or self.default_manager
+        if rule is None:
+            return self._template(manager, "default").format(cve=cve, summary=summary[:100])
+        return self._template(manager, rule.name).format(
+            package=package,
+            service=package or classification.service or "unknown-service",
+            cve=cve,
+            summary=summary[:100]
+        )
+
+    def render_many(self, items: Sequence[Dict[str, Any]], os_info: Optional[str] = None,
+                    first_tier_only: bool = False) -> Dict[str, str]:
+        """批量生成：{cve: command}，first_tier_only 时只包含第一层规则命中的 CVE"""
+        classifications = self.classify_many([item.get("summary") or "" for item in items])
+        commands = {}
+        for item, classification in zip(items, classifications):
+            command = self.render(
+                item["cve"], item.get("summary") or "", item.get("package") or "", os_info,
+                classification=classification, first_tier_only=first_tier_only
+            )
+            if command is not None:
+                commands[item["cve"]] = command
+        return commands
+
+    def _template(self, manager: str, name: str) -> str:
+        template = (self.commands.get(manager) or {}).get(name) or (self.commands.get("common") or {}).get(name)
+        if template is None:
+            template = (self.commands.get(self.default_manager) or {}).get(name)
+        if template is None:
+            raise KeyError(f"No command template {name!r} for {manager}")
+        return template
+
+    @staticmethod
+    def _package_name(package: str) -> str:
+        """Issue.package 形如 "openssl:1.1.1f, libssl1.1:1.1.1f"，取第一个包名"""
+        name = (package or "").split(",", 1)[0].split(":", 1)[0].strip()
+        return name if name and SAFE_TOKEN_RE.match(name) else ""
@@ -0,0 +1,228 @@
+"""
+漏洞全文检索
+功能：基于 SQLite FTS5（PostgreSQL 下为 tsvector 表达式索引）检索 CVE、描述和包名，并返回分面统计；
+issues.package 只是截断的展示字段，包名另外按 issue_packages.name 索引匹配（覆盖全部受影响包）
+"""
+
+import re
+from typing import Dict, Any, List, Optional
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+from loguru import logger
+
+
+# 严重程度分桶（与前端 getRiskLevel 一致）
+SEVERITY_CASE = """
+    CASE
+        WHEN i.cvss >= 9.0 THEN 'critical'
+        WHEN i.cvss >= 7.0 THEN 'high'
+        WHEN i.cvss >= 4.0 THEN 'medium'
+        ELSE 'low'
+    END
+"""
+
+FACET_COLUMNS = {
+    "status": "i.status",
+    "os": "h.os",
+    "severity": SEVERITY_CASE
+}
+
+# SQLite: 外部内容 FTS5 表 + 触发器，随 issues 表增删改自动增量维护
+SQLITE_SCHEMA = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS issues_fts USING fts5(
+        cve, summary, package,
+        content='issues', content_rowid='id'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS issues_fts_ai AFTER INSERT ON issues BEGIN
+        INSERT INTO issues_fts(rowid, cve, summary, package)
+        VALUES (new.id, new.cve, new.summary, new.package);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS issues_fts_ad AFTER DELETE ON issues BEGIN
+        INSERT INTO issues_fts(issues_fts, rowid, cve, summary, package)
+        VALUES ('delete', old.id, old.cve, old.summary, old.package);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS issues_fts_au AFTER UPDATE OF cve, summary, package ON issues BEGIN
+        INSERT INTO issues_fts(issues_fts, rowid, cve, summary, package)
+        VALUES ('delete', old.id, old.cve, old.summary, old.package);
+        INSERT INTO issues_fts(rowid, cve, summary, package)
+        VALUES (new.id, new.cve, new.summary, new.package);
+    END
+    """,
+    # 状态筛选 + 按 cvss 排序/分桶
+    "CREATE INDEX IF NOT EXISTS ix_issues_status_cvss ON issues (status, cvss)",
+    "CREATE INDEX IF NOT EXISTS ix_issues_host_id ON issues (host_id)"
+]
+
+POSTGRES_TSVECTOR = (
+    "to_tsvector('simple', coalesce(i.cve, '') || ' ' || "
+    "coalesce(i.summary, '') || ' ' || coalesce(i.package, ''))"
+)
+
+POSTGRES_SCHEMA = [
+    "CREATE INDEX IF NOT EXISTS ix_issues_fts ON issues USING gin (" +
+    POSTGRES_TSVECTOR.replace("i.", "") + ")",
+    "CREATE INDEX IF NOT EXISTS ix_issues_status_cvss ON issues (status, cvss)",
+    "CREATE INDEX IF NOT EXISTS ix_issues_host_id ON issues (host_id)"
+]
+
+ISSUE_COLUMNS = """
+    i.id, i.host_id, i.cve, i.summary, i.cvss, i.package,
+    i.patchable, i.status, i.fix_command, i.created_at
+"""
+
+
+class IssueSearchIndex:
+    """漏洞全文检索索引"""
+
+    def __init__(self, engine: Engine):
+        self.engine = engine
+        self.dialect = engine.dialect.name
+        self.logger = logger
+
+    def ensure(self):
+        """创建检索索引（幂等），首次创建时从 issues 表回填"""
+        with self.engine.begin() as conn:
+            if self.dialect == "sqlite":
+                exists = conn.execute(text(
+                    "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'issues_fts'"
+                )).first()
+                for statement in SQLITE_SCHEMA:
+                    conn.execute(text(statement))
+                if not exists:
+                    conn.execute(text("INSERT INTO issues_fts(issues_fts) VALUES ('rebuild')"))
+                    self.logger.info("Built issues full-text index")
+            elif self.dialect == "postgresql":
+                for statement in POSTGRES_SCHEMA:
+                    conn.execute(text(statement))
+            else:
+                self.logger.warning(f"Full-text search not supported on {self.dialect}, using LIKE")
+
+    def search(
+        self,
+        db: Session,
+        q: Optional[str] = None,
+        host_id: Optional[int] = None,
+        status: Optional[str] = None,
+        os: Optional[str] = None,
+        severity: Optional[str] = None,
+        limit: int = 50,
+        offset: int = 0
+    ) -> Dict[str, Any]:
+        """
+        检索漏洞
+
+        Args:
+            db: 数据库会话
+            q: 检索词（CVE 编号、描述或包名）
+            host_id: 主机 ID
+            status: 状态筛选
+            os: 操作系统筛选
+            severity: 严重程度筛选 (critical/high/medium/low)
+            limit: 返回条数
+            offset: 偏移量
+
+        Returns:
+            {"total", "items", "facets"}，分面统计不受自身维度的筛选影响
+        """
+        match_sql, params = self._match_clause(q)
+        filters = {"status": status, "os": os, "severity": severity}
+
+        base = ["1 = 1"]
+        if match_sql:
+            base.append(match_sql)
+        if host_id:
+            base.append("i.host_id = :host_id")
+            params["host_id"] = host_id
+
+        def where(exclude: Optional[str] = None) -> str:
+            clauses = list(base)
+            for name, value in filters.items():
+                if value and name != exclude:
+                    clauses.append(f"{FACET_COLUMNS[name]} = :f_{name}")
+                    params[f"f_{name}"] = value
+            return " AND ".join(clauses)
+
+        from_sql = "FROM issues i LEFT JOIN hosts h ON h.id = i.host_id"
+        order_sql = self._order_clause(q)
+
+        total = db.execute(
+            text(f"SELECT count(*) {from_sql} WHERE {where()}"), params
+        ).scalar()
+
+        rows = db.execute(
+            text(
+                f"SELECT {ISSUE_COLUMNS} {from_sql} WHERE {where()} "
+                f"ORDER BY {order_sql} LIMIT :limit OFFSET :offset"
+            ),
+            {**params, "limit": limit, "offset": offset}
+        ).mappings().all()
+
+        facets = {}
+        for name, column in FACET_COLUMNS.items():
+            facet_rows = db.execute(
+                text(
+                    f"SELECT {column} AS value, count(*) AS n {from_sql} "
+                    f"WHERE {where(exclude=name)} GROUP BY value ORDER BY n DESC"
+                ),
+                params
+            ).all()
+            facets[name] = {str(value or "unknown"): n for value, n in facet_rows}
+
+        return {"total": total, "items": [dict(row) for row in rows], "facets": facets}
+
+    def _match_clause(self, q: Optional[str]):
+        """
+        构建全文匹配条件：每个词须命中 CVE/描述/包名（全文索引）或任一受影响包名（issue_packages），
+        最后一个词做前缀匹配
+        """
+        terms = self._tokenize(q)
+        if not terms:
+            return None, {}
+
+        clauses = []
+        params: Dict[str, Any] = {}
+        if self.dialect == "postgresql":
+            # ts_rank 排序使用整句
+            params["q"] = " ".join(terms)
+        for n, term in enumerate(terms):
+            last = n == len(terms) - 1
+            if self.dialect == "sqlite":
+                # 加引号避免 FTS5 语法注入
+                params[f"q{n}"] = '"' + term.replace('"', '""') + '"' + ("*" if last else "")
+                text_match = f"i.id IN (SELECT rowid FROM issues_fts WHERE issues_fts MATCH :q{n})"
+            elif self.dialect == "postgresql":
+                params[f"q{n}"] = term
+                text_match = f"{POSTGRES_TSVECTOR} @@ plainto_tsquery('simple', :q{n})"
+            else:
+                params[f"q{n}"] = f"%{term}%"
+                text_match = f"(i.cve LIKE :q{n} OR i.summary LIKE :q{n} OR i.package LIKE :q{n})"
+            clauses.append(f"({text_match} OR {self._package_match(n, term.lower(), last, params)})")
+        return " AND ".join(clauses), params
+
+    @staticmethod
+    def _package_match(n: int, term: str, prefix: bool, params: Dict[str, Any]) -> str:
+        """按包名匹配（走 issue_packages 的 name 索引；前缀匹配用范围条件而非 LIKE）"""
+        params[f"p{n}"] = term
+        if not prefix:
+            return f"i.id IN (SELECT issue_id FROM issue_packages WHERE name = :p{n})"
+        params[f"p{n}_end"] = term[:-1] + chr(ord(term[-1]) + 1)
+        return f"i.id IN (SELECT issue_id FROM issue_packages WHERE name >= :p{n} AND name < :p{n}_end)"
+
+    def _order_clause(self, q: Optional[str]) -> str:
+        if self._tokenize(q) and self.dialect == "postgresql":
+            return f"ts_rank({POSTGRES_TSVECTOR}, plainto_tsquery('simple', :q)) DESC, i.cvss DESC"
+        return "i.cvss DESC, i.id"
+
+    @staticmethod
+    def _tokenize(q: Optional[str]) -> List[str]:
+        if not q:
+            return []
+        return [term for term in re.split(r"\s+", q.strip()) if term]
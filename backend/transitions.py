@@ -0,0 +1,139 @@
+"""
+漏洞状态批量流转
+功能：按 ID 列表或筛选条件一次性变更漏洞状态。每个允许的源状态一条集合式 UPDATE，
+WHERE 中带源状态做乐观检查（并发改过状态的行不会被覆盖），变更记录在同一事务中追加到状态历史表
+"""
+
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence
+
+from sqlalchemy import func, insert, select, update
+from sqlalchemy.orm import Session
+
+from models import ISSUE_STATUSES, Issue, IssueStatusHistory
+
+# 允许的流转：源状态 -> 目标状态
+ALLOWED_TRANSITIONS = {
+    "open": ("fixing", "fixed"),
+    "fixing": ("fixed", "failed", "open"),
+    "failed": ("fixing", "fixed", "open"),
+    "fixed": ("open",),
+}
+
+# 按 ID 变更时每条 UPDATE 的 ID 数（SQLite 单条语句的参数个数有上限）
+ID_CHUNK_SIZE = 1000
+
+
+class TransitionError(ValueError):
+    """不允许的状态流转或缺少筛选条件"""
+
+
+def allowed_sources(to_status: str) -> List[str]:
+    """可以流转到 to_status 的源状态"""
+    return [source for source, targets in ALLOWED_TRANSITIONS.items() if to_status in targets]
+
+
+def transition_issues(
+    db: Session,
+    to_status: str,
+    from_status: Optional[Sequence[str]] = None,
+    ids: Optional[Sequence[int]] = None,
+    host_id: Optional[int] = None,
+    cve: Optional[str] = None,
+    cvss_min: Optional[float] = None,
+    note: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    批量变更漏洞状态并写入历史（调用方提交事务）
+
+    Args:
+        db: 数据库会话
+        to_status: 目标状态
+        from_status: 只变更处于这些状态的漏洞，默认所有允许流转到 to_status 的状态
+        ids: 漏洞 ID 列表
+        host_id, cve, cvss_min: 筛选条件（与 ids 同时给出时取交集）
+        note: 写入历史的备注（如 Playbook 文件名）
+
+    Returns:
+        {"batch_id", "to_status", "matched", "updated", "skipped", "by_from_status",
+         "hosts": {host_id: {"updated", "max_cvss"}}}；matched 为符合 ID/筛选条件的漏洞数（不论状态）
+
+    Raises:
+        TransitionError: 目标状态未知、源状态不允许流转到目标状态，或未给出任何 ID/筛选条件
+    """
+    if to_status not in ISSUE_STATUSES:
+        raise TransitionError(f"Unknown status: {to_status}")
+    sources = allowed_sources(to_status)
+    if from_status is not None:
+        invalid = [status for status in from_status if status not in sources]
+        if invalid:
+            raise TransitionError(f"Transition not allowed: {', '.join(invalid)} -> {to_status}")
+        sources = [status for status in sources if status in from_status]
+    if ids is None and host_id is None and not cve and cvss_min is None:
+        raise TransitionError("Specify ids or at least one filter (host_id, cve, cvss_min)")
+
+    conditions = []
+    if host_id is not None:
+        conditions.append(Issue.host_id == host_id)
+    if cve:
+        conditions.append(Issue.cve == cve)
+    if cvss_min is not None:
+        conditions.append(Issue.cvss >= cvss_min)
+    if ids is not None:
+        unique_ids = sorted(set(ids))
+        id_groups = [
+            [Issue.id.in_(unique_ids[i:i + ID_CHUNK_SIZE])]
+            for i in range(0, len(unique_ids), ID_CHUNK_SIZE)
+        ]
+    else:
+        id_groups = [[]]
+
+    batch_id = uuid.uuid4().hex
+    changed_at = datetime.utcnow()
+    matched = 0
+    by_from_status = {status: 0 for status in sources}
+    hosts: Dict[int, Dict[str, Any]] = {}
+    history = []
+
+    for id_condition in id_groups:
+        where = conditions + id_condition
+        matched += db.execute(select(func.count()).select_from(Issue).where(*where)).scalar()
+        for source in sources:
+            # 源状态写在 WHERE 里：读取和更新之间被其他请求改过状态的行自然不匹配
+            statement = (
+                update(Issue)
+                .where(*where, Issue.status == source)
+                .values(status=to_status)
+                .returning(Issue.id, Issue.host_id, Issue.cvss)
+                .execution_options(synchronize_session=False)
+            )
+            for issue_id, issue_host_id, cvss in db.execute(statement):
+                by_from_status[source] += 1
+                history.append({
+                    "issue_id": issue_id,
+                    "host_id": issue_host_id,
+                    "from_status": source,
+                    "to_status": to_status,
+                    "batch_id": batch_id,
+                    "note": note,
+                    "changed_at": changed_at
+                })
+                host = hosts.setdefault(issue_host_id, {"updated": 0, "max_cvss": None})
+                host["updated"] += 1
+                if cvss is not None and (host["max_cvss"] is None or cvss > host["max_cvss"]):
+                    host["max_cvss"] = cvss
+
+    if history:
+        db.execute(insert(IssueStatusHistory), history)
+
+    updated = len(history)
+    return {
+        "batch_id": batch_id,
+        "to_status": to_status,
+        "matched": matched,
+        "updated": updated,
+        "skipped": matched - updated,
+        "by_from_status": by_from_status,
+        "hosts": hosts
+    }
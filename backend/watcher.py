@@ -0,0 +1,279 @@
+"""
+扫描结果目录监听器
+功能：监听 Vuls 结果目录，文件写入完成后立即交给解析和入库流程
+"""
+
+import os
+import time
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+from loguru import logger
+
+try:
+    import fcntl
+    FCNTL_AVAILABLE = True
+except ImportError:
+    FCNTL_AVAILABLE = False
+
+try:
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+    WATCHDOG_AVAILABLE = True
+except ImportError:
+    WATCHDOG_AVAILABLE = False
+    FileSystemEventHandler = object
+    logger.warning("Watchdog library not available, results watcher will use polling")
+
+
+class _ResultsEventHandler(FileSystemEventHandler):
+    """将 inotify 事件转发给监听器"""
+
+    def __init__(self, watcher: "ResultsWatcher"):
+        self.watcher = watcher
+
+    def on_created(self, event):
+        if not event.is_directory:
+            self.watcher.touch(event.src_path)
+
+    def on_modified(self, event):
+        if not event.is_directory:
+            self.watcher.touch(event.src_path)
+
+    def on_moved(self, event):
+        if not event.is_directory:
+            self.watcher.touch(event.dest_path)
+
+
+class ResultsWatcher:
+    """
+    Vuls 结果目录监听器
+
+    优先使用 watchdog（inotify），不可用时退化为定时轮询。
+    文件在 settle_seconds 内大小和修改时间都不再变化、且内容以完整 JSON 结尾时，
+    才认为写入完成并回调 callback(file_path)。回调在同一个后台线程中串行执行，
+    同时就绪的文件按修改时间从旧到新分发，使较新的扫描结果最后写入主机记录。
+    回调抛出异常的文件按指数退避重新排队，连续失败 max_retries 次后放弃（文件再次变化时重试）。
+
+    指定 lock_path 时启动前先对该文件加非阻塞排他锁（flock），多个 worker 进程中只有
+    拿到锁的一个进程监听，其余进程 start() 返回 False；锁随进程退出自动释放。
+    """
+
+    def __init__(
+        self,
+        results_dir: str,
+        callback: Callable[[str], None],
+        settle_seconds: float = 2.0,
+        poll_interval: float = 5.0,
+        max_wait_seconds: float = 300.0,
+        use_inotify: bool = True,
+        ingest_existing: bool = False,
+        lock_path: Optional[str] = None,
+        retry_seconds: float = 10.0,
+        max_retries: int = 5
+    ):
+        self.results_dir = results_dir
+        self.callback = callback
+        self.settle_seconds = settle_seconds
+        self.poll_interval = poll_interval
+        self.max_wait_seconds = max_wait_seconds
+        self.use_inotify = use_inotify and WATCHDOG_AVAILABLE
+        self.ingest_existing = ingest_existing
+        self.lock_path = lock_path
+        self.retry_seconds = retry_seconds
+        self.max_retries = max_retries
+        self.logger = logger
+        self._lock_file = None
+
+        # path -> (首次发现时间, 最近变化时间, (size, mtime))
+        self._pending: Dict[str, Tuple[float, float, Optional[Tuple[int, float]]]] = {}
+        # 已成功入库（或已放弃）文件的指纹，避免重复入库
+        self._dispatched: Dict[str, Tuple[int, float]] = {}
+        # 回调连续失败次数
+        self._failures: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._threads = []
+        self._observer = None
+
+    @property
+    def mode(self) -> str:
+        return "inotify" if self.use_inotify else "polling"
+
+    def start(self) -> bool:
+        """启动监听；监听锁被其他进程持有时不启动并返回 False"""
+        os.makedirs(self.results_dir, exist_ok=True)
+        if not self._acquire_lock():
+            self.logger.info(f"Results watcher lock {self.lock_path} held by another process, not watching")
+            return False
+        self._stop_event.clear()
+
+        # 记录已有文件，默认不重复入库；补录时按修改时间从旧到新排队
+        existing = sorted(self._scan_files().items(), key=lambda item: item[1][1])
+        for path, fingerprint in existing:
+            if self.ingest_existing:
+                self.touch(path)
+            else:
+                self._dispatched[path] = fingerprint
+
+        if self.use_inotify:
+            self._observer = Observer()
+            self._observer.schedule(_ResultsEventHandler(self), self.results_dir, recursive=True)
+            self._observer.start()
+        else:
+            self._start_thread(self._poll_loop, "results-watcher-poll")
+
+        self._start_thread(self._settle_loop, "results-watcher-settle")
+        self.logger.info(f"Watching {self.results_dir} for scan results ({self.mode})")
+        return True
+
+    def _acquire_lock(self) -> bool:
+        if self.lock_path is None:
+            return True
+        if not FCNTL_AVAILABLE:
+            self.logger.warning("fcntl not available, results watcher lock disabled")
+            return True
+        lock_file = open(self.lock_path, "a")
+        try:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self._lock_file = lock_file
+        return True
+
+    def stop(self):
+        """停止监听"""
+        self._stop_event.set()
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer.join(timeout=5)
+            self._observer = None
+        for thread in self._threads:
+            thread.join(timeout=5)
+        self._threads = []
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+
+    def touch(self, path: str):
+        """记录一次文件变化（由 inotify 事件或轮询触发）"""
+        if not path.endswith('.json'):
+            return
+
+        now = time.monotonic()
+        with self._lock:
+            first_seen = self._pending.get(path, (now, now, None))[0]
+            self._pending[path] = (first_seen, now, self._stat(path))
+
+    def _start_thread(self, target: Callable, name: str):
+        thread = threading.Thread(target=target, name=name, daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def _poll_loop(self):
+        """轮询模式：比较文件指纹发现新文件或变化"""
+        while not self._stop_event.wait(self.poll_interval):
+            for path, fingerprint in self._scan_files().items():
+                if self._dispatched.get(path) != fingerprint:
+                    with self._lock:
+                        known = self._pending.get(path)
+                    if not known or known[2] != fingerprint:
+                        self.touch(path)
+
+    def _settle_loop(self):
+        """去抖：文件稳定后分发给回调"""
+        interval = min(self.settle_seconds / 2, 0.5) or 0.1
+        while not self._stop_event.wait(interval):
+            for path, fingerprint in self._ready_files():
+                try:
+                    self.callback(path)
+                except Exception as e:
+                    self._retry_later(path, fingerprint, e)
+                else:
+                    with self._lock:
+                        self._dispatched[path] = fingerprint
+                        self._failures.pop(path, None)
+
+    def _retry_later(self, path: str, fingerprint: Tuple[int, float], error: Exception):
+        """回调失败：按指数退避重新排队，超过重试次数后放弃直到文件再次变化"""
+        with self._lock:
+            failures = self._failures.get(path, 0) + 1
+            if failures > self.max_retries:
+                self.logger.error(f"Error ingesting {path}, giving up after {self.max_retries} retries: {error}")
+                self._failures.pop(path, None)
+                self._dispatched[path] = fingerprint
+                return
+            self._failures[path] = failures
+            delay = self.retry_seconds * 2 ** (failures - 1)
+            self.logger.error(f"Error ingesting {path}, retry {failures}/{self.max_retries} in {delay:.1f}s: {error}")
+            # 最近变化时间推后 delay，settle 循环在退避结束后再分发
+            now = time.monotonic()
+            known = self._pending.get(path)
+            if known is None or known[2] == fingerprint:
+                self._pending[path] = (now, now + delay, fingerprint)
+
+    def _ready_files(self) -> List[Tuple[str, Tuple[int, float]]]:
+        """返回已写入完成的 (文件, 指纹)，按修改时间从旧到新，并更新待处理状态"""
+        now = time.monotonic()
+        ready = []
+
+        with self._lock:
+            for path, (first_seen, last_change, fingerprint) in list(self._pending.items()):
+                current = self._stat(path)
+                if current is None:
+                    # 文件已被删除或移走
+                    del self._pending[path]
+                    continue
+                if current != fingerprint:
+                    self._pending[path] = (first_seen, now, current)
+                    continue
+                if now - last_change < self.settle_seconds:
+                    continue
+
+                if self._dispatched.get(path) == current:
+                    del self._pending[path]
+                elif self._is_complete_json(path):
+                    del self._pending[path]
+                    ready.append((path, current))
+                elif now - first_seen > self.max_wait_seconds:
+                    self.logger.warning(f"Giving up on incomplete result file: {path}")
+                    del self._pending[path]
+                    self._dispatched[path] = current
+
+        ready.sort(key=lambda item: item[1][1])
+        return ready
+
+    def _scan_files(self) -> Dict[str, Tuple[int, float]]:
+        """遍历结果目录（不跟随 current 等符号链接目录）"""
+        files = {}
+        for root, _, filenames in os.walk(self.results_dir):
+            for filename in filenames:
+                if filename.endswith('.json'):
+                    path = os.path.join(root, filename)
+                    fingerprint = self._stat(path)
+                    if fingerprint:
+                        files[path] = fingerprint
+        return files
+
+    @staticmethod
+    def _stat(path: str) -> Optional[Tuple[int, float]]:
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return st.st_size, st.st_mtime
+
+    @staticmethod
+    def _is_complete_json(path: str) -> bool:
+        """粗略判断 JSON 是否写完：文件以 } 或 ] 结尾"""
+        try:
+            with open(path, 'rb') as f:
+                f.seek(0, os.SEEK_END)
+                size = f.tell()
+                if size == 0:
+                    return False
+                f.seek(max(0, size - 64))
+                tail = f.read().rstrip()
+        except OSError:
+            return False
+        return tail.endswith(b'}') or tail.endswith(b']')
@@ -76,9 +76,15 @@ api.interceptors.response.use(
 // API 方法定义
 export const hostAPI = {
   /**
-   * 获取所有主机列表
+   * 获取主机列表（含按状态、严重程度的漏洞数）
+   * @param {Object} params - 查询参数，ids 为逗号分隔的主机 ID（只返回这些主机）
    */
-  getHosts: () => api.get('/hosts'),
+  getHosts: (params = {}) => api.get('/hosts', { params }),
+  
+  /**
+   * 获取每台主机的漏洞计数及全体合计（不含主机信息）
+   */
+  getHostsSummary: () => api.get('/hosts/summary'),
   
   /**
    * 获取指定主机信息
@@ -104,6 +110,18 @@ export const issueAPI = {
    */
   getIssues: (params = {}) => api.get('/issues', { params }),
   
+  /**
+   * 全文检索漏洞（含分面统计）
+   * @param {object} params - 查询参数
+   * @param {string} params.q - 检索词（CVE 编号、描述、包名）
+   * @param {string} params.status - 状态筛选
+   * @param {string} params.os - 操作系统筛选
+   * @param {string} params.severity - 严重程度 (critical/high/medium/low)
+   * @param {number} params.limit - 返回条数
+   * @param {number} params.offset - 偏移量
+   */
+  searchIssues: (params = {}) => api.get('/issues/search', { params }),
+  
   /**
    * 获取指定漏洞详情
    * @param {number} issueId - 漏洞 ID
@@ -115,7 +133,35 @@ export const issueAPI = {
    * @param {number} issueId - 漏洞 ID
    * @param {object} data - 更新数据
    */
-  updateIssue: (issueId, data) => api.patch(`/issues/${issueId}`, data)
+  updateIssue: (issueId, data) => api.patch(`/issues/${issueId}`, data),
+  
+  /**
+   * 批量变更漏洞状态
+   * @param {object} data - 变更参数
+   * @param {string} data.to_status - 目标状态 (open/fixing/fixed/failed)
+   * @param {string[]} data.from_status - 只变更处于这些状态的漏洞
+   * @param {number[]} data.ids - 漏洞 ID 列表
+   * @param {number} data.host_id - 主机 ID 筛选
+   * @param {string} data.cve - CVE 编号筛选
+   * @param {string} data.note - 历史备注
+   */
+  transitionIssues: (data) => api.post('/issues/transitions', data),
+  
+  /**
+   * 获取漏洞状态变更历史
+   * @param {number} issueId - 漏洞 ID
+   */
+  getIssueHistory: (issueId) => api.get(`/issues/${issueId}/history`)
+}
+
+export const packageAPI = {
+  /**
+   * 查询受指定包影响的主机及 CVE
+   * @param {string} name - 包名
+   * @param {object} params - 查询参数
+   * @param {string} params.status - 漏洞状态筛选
+   */
+  getPackageHosts: (name, params = {}) => api.get(`/packages/${encodeURIComponent(name)}/hosts`, { params })
 }
 
 export const playbookAPI = {
@@ -173,6 +219,27 @@ export const statsAPI = {
   getFixTrends: (params = {}) => api.get('/stats/fix-trends', { params })
 }
 
+export const eventsAPI = {
+  /**
+   * 订阅变更事件 (SSE)，断线后浏览器自动携带 Last-Event-ID 续传
+   * @param {object} handlers - 事件处理函数，键为事件类型 (host.updated/issue.fix_generated/playbook.generated/reset)
+   * @param {object} params - 过滤参数
+   * @param {number} params.host_id - 只接收指定主机的事件
+   * @param {string} params.severity - 最低严重程度 (low/medium/high/critical)
+   * @returns {EventSource} 调用 close() 取消订阅
+   */
+  subscribe: (handlers = {}, params = {}) => {
+    const query = new URLSearchParams(
+      Object.entries(params).filter(([, value]) => value !== undefined && value !== null && value !== '')
+    ).toString()
+    const source = new EventSource(`${api.defaults.baseURL}/events${query ? `?${query}` : ''}`)
+    Object.entries(handlers).forEach(([type, handler]) => {
+      source.addEventListener(type, (event) => handler(JSON.parse(event.data), event))
+    })
+    return source
+  }
+}
+
 // 工具函数
 export const utils = {
   /**